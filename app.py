@@ -1,4 +1,5 @@
 # Standard library imports
+import inspect
 import os
 
 # Third party imports
@@ -29,6 +30,16 @@ def is_ffmpeg_installed():
     return bool(which("ffmpeg"))
 
 
+def context_key(ctx):
+    """Hashable key identifying a Context by its project, entity, step and task."""
+
+    data = ctx.to_dict()
+    return tuple(
+        (data.get(field) or {}).get("id")
+        for field in ["project", "entity", "step", "task"]
+    )
+
+
 class AEQueueApplication(sgtk.platform.Application):
     def init_app(self):
         # Perform additional validation before registering
@@ -44,6 +55,7 @@ class AEQueueApplication(sgtk.platform.Application):
 
         # Set initial values
         self._reset_on_context_change = True
+        self._project_ctx_cache = {}
 
     def ensure_ffmpeg_installed(self):
         if not is_ffmpeg_installed():
@@ -88,6 +100,66 @@ class AEQueueApplication(sgtk.platform.Application):
     def get_async_render(self):
         return self.get_setting("async_render")
 
+    def get_skip_unchanged(self):
+        """Default for skipping comps that are unchanged since their last render."""
+
+        return self.get_setting("skip_unchanged")
+
+    def get_batch_render(self):
+        """Should all comps be rendered in a single renderAsync pass?"""
+
+        return self.get_setting("batch_render")
+
+    def get_bg_snapshots_to_keep(self):
+        """Number of background render project snapshots to keep per project."""
+
+        return self.get_setting("bg_snapshots_to_keep")
+
+    def get_upload_threads(self):
+        """Number of media uploads allowed to run at the same time."""
+
+        return max(1, self.get_setting("upload_threads"))
+
+    def get_upload_bandwidth_limit(self):
+        """Upload bandwidth limit per render in bytes per second. 0 is unlimited."""
+
+        return self.get_setting("upload_bandwidth_limit") * 125000
+
+    def get_machine_upload_bandwidth_limit(self):
+        """Upload bandwidth limit for all renders in bytes per second."""
+
+        return self.get_setting("machine_upload_bandwidth_limit") * 125000
+
+    def get_media_hash_field(self):
+        """Version field storing a hash of uploaded media, or None when disabled."""
+
+        return self.get_setting("media_hash_field") or None
+
+    def get_sg_spool(self):
+        """Should ShotGrid uploads and publishes be spooled and sent in background?"""
+
+        return self.get_setting("sg_spool")
+
+    def get_spool_path(self):
+        """Path to the database storing spooled ShotGrid jobs."""
+
+        return normalize(self.cache_location, "sg_spool.db")
+
+    def get_history_path(self):
+        """Path to the database storing the durations of finished renders."""
+
+        return normalize(self.cache_location, "history.db")
+
+    def get_artifact_cache_size(self):
+        """Size budget of the cache of encoded media in bytes. 0 disables the cache."""
+
+        return int(self.get_setting("artifact_cache_size") * 1024**3)
+
+    def get_artifact_cache_path(self):
+        """Directory storing the cache of encoded media."""
+
+        return normalize(self.cache_location, "artifacts")
+
     def get_default_mp4_quality(self):
         return self.get_setting("default_mp4_quality")
 
@@ -171,21 +243,47 @@ class AEQueueApplication(sgtk.platform.Application):
 
         return self.execute_hook_method("send_report_hook", "send_on_error")
 
-    def send_report(self, ctx, runner, report, html_report):
-        """Send an error report using the send_report_hook's send method."""
+    def send_report(self, ctx, runner, report, html_report, attachments=None):
+        """Send an error report using the send_report_hook's send method.
+
+        The report and html_report are short summaries of the render. The full
+        reports are gzipped files in attachments. Custom hooks written before
+        attachments were added are called without them.
+        """
 
         if not self.send_is_available():
             raise RuntimeError("Can't send report: send_report_hook is unavailable...")
 
-        return self.execute_hook_method(
-            "send_report_hook",
-            "send",
+        kwargs = dict(
             ctx=ctx,
             runner=runner,
             report=report,
             html_report=html_report,
             settings=self.get_setting("send_report_settings") or {},
         )
+        if self.send_report_accepts_attachments():
+            kwargs["attachments"] = attachments or []
+        else:
+            self.log_warning(
+                "send_report_hook doesn't accept attachments, sending summary only."
+            )
+        return self.execute_hook_method("send_report_hook", "send", **kwargs)
+
+    def send_report_accepts_attachments(self):
+        """Does the send method of the send_report_hook accept attachments?"""
+
+        hook = self.create_hook_instance(self.get_setting("send_report_hook"))
+        parameters = inspect.signature(hook.send).parameters.values()
+        return any(
+            parameter.name == "attachments"
+            or parameter.kind == inspect.Parameter.VAR_KEYWORD
+            for parameter in parameters
+        )
+
+    def get_context_key(self, ctx):
+        """Hashable key identifying a Context, used to cache data per Context."""
+
+        return context_key(ctx)
 
     def ensure_context_optimal(self, reset=False):
         """Make sure the current context is up to date with your project context."""
@@ -196,35 +294,42 @@ class AEQueueApplication(sgtk.platform.Application):
         else:
             current_task_name = None
 
-        try:
-            project_ctx = self.engine.sgtk.context_from_path(
-                self.engine.project_path,
-                current_ctx,
-            )
-        except Exception:
-            return False, "Can't find Context for AEP."
-
-        # Ensure our new project_ctx has a Task.
-        if project_ctx.step and not project_ctx.task:
-            # Lookup tasks
-            tasks = self.shotgun.find(
-                "Task",
-                filters=[
-                    ["entity", "is", project_ctx.entity],
-                    ["step", "is", project_ctx.step],
-                ],
-                fields=["content"],
-            )
-            if not tasks:
-                return False, "Can't find Task for AEP."
-
-            for task in tasks:
-                if task["content"] == current_task_name:
-                    break
-            else:
-                task = tasks[0]
-
-            project_ctx = self.engine.sgtk.context_from_entity("Task", task["id"])
+        # Resolving the project context requires a path lookup and possibly a SG
+        # query, so the result is cached by project path and current context.
+        cache_key = (self.engine.project_path, context_key(current_ctx))
+        project_ctx = self._project_ctx_cache.get(cache_key)
+        if project_ctx is None:
+            try:
+                project_ctx = self.engine.sgtk.context_from_path(
+                    self.engine.project_path,
+                    current_ctx,
+                )
+            except Exception:
+                return False, "Can't find Context for AEP."
+
+            # Ensure our new project_ctx has a Task.
+            if project_ctx.step and not project_ctx.task:
+                # Lookup tasks
+                tasks = self.shotgun.find(
+                    "Task",
+                    filters=[
+                        ["entity", "is", project_ctx.entity],
+                        ["step", "is", project_ctx.step],
+                    ],
+                    fields=["content"],
+                )
+                if not tasks:
+                    return False, "Can't find Task for AEP."
+
+                for task in tasks:
+                    if task["content"] == current_task_name:
+                        break
+                else:
+                    task = tasks[0]
+
+                project_ctx = self.engine.sgtk.context_from_entity("Task", task["id"])
+
+            self._project_ctx_cache[cache_key] = project_ctx
 
         # Compare project_ctx to current_ctx
         pctx = project_ctx.to_dict()
@@ -281,6 +386,9 @@ class AEQueueApplication(sgtk.platform.Application):
         if not self.aequeue:
             return
 
+        # Stop sending spooled jobs. Unsent jobs are sent next session.
+        self.aequeue.stop_spool()
+
         # Hide and mark ui for deletion.
         self.aequeue.ui.hide()
         self.aequeue.ui.setParent(None)
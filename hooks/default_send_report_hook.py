@@ -17,16 +17,23 @@ class DefaultSendReportHook(sgtk.get_hook_baseclass()):
 
         return False
 
-    def send(self, ctx, runner, report, html_report):
+    def send(self, ctx, runner, report, html_report, attachments, settings):
         '''Called to by application to send a report.
 
+        Send is called from a background thread. Use engine.execute_in_main_thread to
+        access After Effects.
+
         Arguments:
             ctx (Context): ShotGrid context that the Runner was executed in.
             runner (Runner): The finished Runner including Flows for each comp that was
                 in the Queue. The Runner was responsible for executing all Flows and
                 their associated Tasks.
-            report (str): A plaintext report generated from the Runners log records.
-            html_report (str): An html report generated from the Runners log records.
+            report (str): A short plaintext summary of the Runner, listing the final
+                step of each comp and its errors.
+            html_report (str): The summary as html.
+            attachments (list): Paths to the full plaintext and html reports generated
+                from the Runners log records, gzipped. Removed when send returns.
+            settings (dict): The send_report_settings of the app.
 
         Return:
             None
@@ -40,25 +40,34 @@ class TicketSendReportHook(sgtk.get_hook_baseclass()):
 
         return False
 
-    def send(self, ctx, runner, report, html_report, settings):
+    def send(self, ctx, runner, report, html_report, attachments, settings):
         '''Called to by application to send a report.
 
+        Send is called from a background thread. Use engine.execute_in_main_thread to
+        access After Effects.
+
         Arguments:
             ctx (Context): ShotGrid context that the Runner was executed in.
             runner (Runner): The finished Runner including Flows for each comp that was
                 in the Queue. The Runner was responsible for executing all Flows and
                 their associated Tasks.
-            report (str): A plaintext report generated from the Runners log records.
-            html_report (str): An html report generated from the Runners log records.
+            report (str): A short plaintext summary of the Runner, listing the final
+                step of each comp and its errors.
+            html_report (str): The summary as html.
+            attachments (list): Paths to the full plaintext and html reports generated
+                from the Runners log records, gzipped. Removed when send returns.
+            settings (dict): The send_report_settings of the app.
 
         Return:
             None
         '''
 
-        self.create_ticket({
+        engine = self.parent.engine
+        project_path = engine.execute_in_main_thread(lambda: engine.project_path)
+        ticket = self.create_ticket({
             'title': TITLE_TEMPLATE.format(
                 user=ctx.user['name'],
-                project=os.path.basename(self.parent.engine.project_path),
+                project=os.path.basename(project_path),
             ),
             'description': DESCRIPTION_TEMPLATE.format(
                 report=report,
@@ -67,6 +76,8 @@ class TicketSendReportHook(sgtk.get_hook_baseclass()):
             'project': ctx.project,
             'addressings_to': [settings['default_assignee']],
         })
+        for path in attachments:
+            self.attach_file(ticket, path)
 
     def create_ticket(self, data):
         '''Create a Ticket in ShotGrid.'''
@@ -74,6 +85,12 @@ class TicketSendReportHook(sgtk.get_hook_baseclass()):
         self.parent.logger.debug('Creating new Ticket: %s' % data.get('title', ''))
         return self.parent.shotgun.create('Ticket', data=data)
 
+    def attach_file(self, ticket, path):
+        '''Upload a file to a Ticket as an Attachment.'''
+
+        self.parent.logger.debug('Attaching %s to Ticket %s' % (path, ticket['id']))
+        return self.parent.shotgun.upload('Ticket', ticket['id'], path)
+
     def format_ctx(self, ctx):
         '''Format a context dict to be used in the Ticket "context" field.'''
 
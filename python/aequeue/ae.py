@@ -6,6 +6,8 @@ import threading
 import xml.etree.ElementTree as xmlElementTree
 from contextlib import contextmanager
 
+from . import files
+
 
 class AfterEffectsEngineWrapper(object):
     """Wraps tk-aftereffects engine providing convenient api methods."""
@@ -49,12 +51,9 @@ class AfterEffectsEngineWrapper(object):
         original_path = self.engine.project_path
         self.save()
 
-        # Save copy
-        os.makedirs(os.path.dirname(copy_path), exist_ok=True)
-        self.save(copy_path)
-
-        # Restore original project
-        self.open(original_path)
+        # Copy the saved project on disk. Saving as the copy would require
+        # reopening the original project afterwards.
+        files.copy_file(original_path, copy_path)
 
     def has_dynamic_links(self, mimeData):
         return mimeData.hasFormat(self.ae_mime_format)
@@ -156,6 +155,25 @@ class AfterEffectsEngineWrapper(object):
             if item.name == name:
                 return item
 
+    def get_render_frame_range(self, comp, render_settings):
+        """Get the first and last frame numbers rendered by a render settings template.
+
+        Arguments:
+            comp (Comp): AE Comp Object.
+            render_settings (str): Render settings template name.
+
+        Returns:
+            tuple: First and last frame numbers.
+        """
+
+        with self.TempEnqueue(comp) as rq_item:
+            rq_item.applyTemplate(render_settings)
+            start = rq_item.timeSpanStart
+            duration = rq_item.timeSpanDuration
+
+        first = int(comp.displayStartFrame) + int(round(start / comp.frameDuration))
+        return first, first + int(round(duration / comp.frameDuration)) - 1
+
     def enqueue_comp(self, comp):
         """Adds a comp to the Render Queue.
 
@@ -407,6 +425,14 @@ class AfterEffectsEngineWrapper(object):
         with self.suppress_dialogs():
             return self._render_queue_item_async(rq_item)
 
+    def render_queue_items_async(self, rq_items, on_status_changed=None, is_revoked=None):
+        with self.suppress_dialogs():
+            return self._render_queue_items_async(
+                rq_items,
+                on_status_changed,
+                is_revoked,
+            )
+
     def _render_queue_item_async(self, queue_item):
         """
         renders a given queue_item, by disabling all other queued items
@@ -419,28 +445,91 @@ class AfterEffectsEngineWrapper(object):
         :rtype: bool
         """
 
+        statuses = self._render_queue_items_async([queue_item])
+        return statuses[0] == self.adobe.RQItemStatus.DONE
+
+    def _render_queue_items_async(
+        self,
+        queue_items,
+        on_status_changed=None,
+        is_revoked=None,
+    ):
+        """
+        renders all of the given queue_items in a single renderAsync pass, by
+        disabling all other queued items and only enabling the given items. After
+        rendering the state of the render-queue is reverted.
+
+        AE renders items in queue order, so only the first unfinished item is
+        polled while waiting. Once the render queue stops rendering, the status of
+        any remaining items is read one last time.
+
+        :param queue_items: The render queue items to be rendered
+        :type queue_items: list of `adobe.RenderQueueItemObject`_
+        :param on_status_changed: Called with (index, status) each time the
+            status of one of the queue_items changes.
+        :param is_revoked: Called with (index) while waiting. Items that are
+            revoked before they start rendering are skipped.
+        :returns: The final RQItemStatus of each of the queue_items
+        :rtype: list
+        """
+
+        render_queue = self.adobe.app.project.renderQueue
+        RQItemStatus = self.adobe.RQItemStatus
+        rendering_states = [
+            RQItemStatus.RENDERING,
+            RQItemStatus.WILL_CONTINUE,
+        ]
+        waiting_states = rendering_states + [RQItemStatus.QUEUED]
+
+        statuses = [None] * len(queue_items)
+        pending = list(range(len(queue_items)))
+        revoked = set()
+
+        def update_status(index):
+            status = queue_items[index].status
+            if status != statuses[index]:
+                statuses[index] = status
+                if on_status_changed:
+                    on_status_changed(index, status)
+            return status
+
         # save the queue state for all unrendered items
-        queue_item_state_cache = [(queue_item, queue_item.render)]
-        for item in self.iter_collection(self.adobe.app.project.renderQueue.items):
+        queue_item_state_cache = [(item, item.render) for item in queue_items]
+        for item in self.iter_collection(render_queue.items):
             # one cannot change the status on
-            if item.status != self.adobe.RQItemStatus.QUEUED:
+            if item.status != RQItemStatus.QUEUED:
                 continue
             queue_item_state_cache.append((item, item.render))
             item.render = False
 
-        success = False
-        queue_item.render = True
-        self.logger.debug("Start rendering..")
+        for queue_item in queue_items:
+            queue_item.render = True
+
+        self.logger.debug("Start rendering %d items..", len(queue_items))
         try:
-            self.adobe.app.project.renderQueue.renderAsync()
-
-            # Wait for render queue to achieve finished state
-            while True:
-                rendering_states = [
-                    self.adobe.RQItemStatus.RENDERING,
-                    self.adobe.RQItemStatus.WILL_CONTINUE,
-                ]
-                if queue_item.status not in rendering_states:
+            render_queue.renderAsync()
+
+            # Wait for the render queue to finish each item in order
+            while pending:
+                if is_revoked:
+                    for index in pending:
+                        if index in revoked or statuses[index] in rendering_states:
+                            continue
+                        if is_revoked(index):
+                            try:
+                                queue_items[index].render = False
+                                revoked.add(index)
+                            except Exception:
+                                # Already started rendering.
+                                pass
+
+                index = pending[0]
+                status = update_status(index)
+                if status not in waiting_states or index in revoked:
+                    pending.pop(0)
+                    continue
+
+                if status not in rendering_states and not render_queue.rendering:
                     break
 
                 # Process UI events while we wait for render to finish.
@@ -451,13 +540,21 @@ class AfterEffectsEngineWrapper(object):
             # Which may return various different errors. This situation never
             # occured during development.
             self.logger.error(
-                ("Skipping item due to an error " "while rendering: {}").format(e)
+                ("Skipping items due to an error " "while rendering: {}").format(e)
             )
         finally:
+            # The render queue is no longer rendering our items, read the final
+            # status of any item we did not see finish.
+            for index in pending:
+                try:
+                    update_status(index)
+                except Exception:
+                    pass
+
             acceptable_states = [
-                self.adobe.RQItemStatus.DONE,
-                self.adobe.RQItemStatus.ERR_STOPPED,
-                self.adobe.RQItemStatus.RENDERING,
+                RQItemStatus.DONE,
+                RQItemStatus.ERR_STOPPED,
+                RQItemStatus.RENDERING,
             ]
             # reverting the original queued state for all
             # unprocessed items
@@ -466,7 +563,4 @@ class AfterEffectsEngineWrapper(object):
                 if item.status not in acceptable_states:
                     item.render = status
 
-        # we check for success if the render queue item status
-        # has changed to DONE
-        success = queue_item.status == self.adobe.RQItemStatus.DONE
-        return success
+        return statuses
@@ -1,29 +1,41 @@
 # Standard library imports
+import logging
 import os
+import re
+import shutil
 import subprocess
 import sys
+import tempfile
+import time
 import webbrowser
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from queue import Queue
 
 # Local imports
-from . import ae, const, paths, resources
+from . import ae, const, files, fingerprint, journal, paths, resources, shotgun, spool
+from .cache import ArtifactCache
+from .history import History, get_machine_info
 from .options import RenderOptions
+from .report import LiveReport, ReportSender, ReportWriter
 from .render import AERenderPopupMonitor
-from .tasks.aerender import AERenderComp, BackgroundAERenderComp
-from .tasks.copy import Copy
-from .tasks.core import (
-    Flow,
-    LogFormatter,
-    Runner,
-    generate_html_report,
-    generate_report,
+from .tasks.aerender import (
+    AERenderBatch,
+    AERenderComp,
+    BackgroundAERenderComp,
+    BatchAERenderComp,
 )
+from .tasks.copy import Copy
+from .tasks.core import Flow, LogFormatter, Runner, call_in_background
 from .tasks.delete import Delete
 from .tasks.encode import EncodeGIF, EncodeMP4
+from .tasks.fingerprint import RecordFingerprint, SkipRender
 from .tasks.move import Move
 from .tasks.sgpublish import SGPublish
-from .tasks.sgupload import SGUploadVersion
+from .tasks.sgupload import (
+    SGUploadVersion,
+    SGVersionBatch,
+    get_version_return_fields,
+)
 from .vendor.qtpy import QtCore, QtGui, QtWidgets
 from .widgets import Menu, Window
 
@@ -34,7 +46,19 @@ class Application(QtCore.QObject):
 
         self.items = []
         self.runner = None
+        self.spool = None
+        self.journal = None
+        self.history = None
+        self._run = None
+        self._log_formatter = LogFormatter()
         self._aerender_popup_monitor = None
+        self._spool_drainer = None
+        self._render_started = None
+        self._live_report = None
+        self._report_writer = None
+        self._report_sender = None
+        self._history_runner = None
+        self._upload_executor = None
 
         # Create UI
         self.ui = Window(parent)
@@ -45,7 +69,10 @@ class Application(QtCore.QObject):
         self.ui.queue.drag.connect(self.drag_queue)
         self.ui.queue.drop.connect(self.drop_queue)
         self.ui.render_button.clicked.connect(self.render)
+        self.ui.resume_button.clicked.connect(self.resume)
+        self.ui.retry_button.clicked.connect(self.retry_failed)
         self.ui.send_button.clicked.connect(self.send_report)
+        self.ui.report.save_requested.connect(self.save_report)
         self.ui.cancel_button.clicked.connect(self.cancel)
         self.ui.closeEvent = self.closeEvent
 
@@ -55,6 +82,10 @@ class Application(QtCore.QObject):
         # Track whether default options have been loaded
         self._defaults_loaded = False
 
+        # Send spooled ShotGrid jobs, including those left by previous sessions.
+        if self.tk_app.get_sg_spool():
+            self.start_spool()
+
     def closeEvent(self, event):
         if self.runner and self.runner.status == const.Running:
             self.ui.show_error("Can't close while rendering.")
@@ -70,6 +101,8 @@ class Application(QtCore.QObject):
         )
         if should_reset:
             self.reset_queue()
+        elif not self.runner:
+            self.update_resume_button()
 
         self.ui.show()
         if self.ui.windowState() == QtCore.Qt.WindowMinimized:
@@ -87,6 +120,21 @@ class Application(QtCore.QObject):
         self.engine = ae.AfterEffectsEngineWrapper(tk_app.engine)
         self.host_version = self.tk_app.engine.host_info["version"]
         self.delay = DelayedQueue(self.log, self)
+        # Templates may differ between tk_apps, so start with a fresh cache.
+        self._render_paths_cache = {}
+        self.artifact_cache = None
+        if tk_app.get_artifact_cache_size():
+            self.artifact_cache = ArtifactCache(
+                tk_app.get_artifact_cache_path(),
+                tk_app.get_artifact_cache_size(),
+            )
+        if self.history:
+            self.history.close()
+        try:
+            self.history = History(tk_app.get_history_path())
+        except Exception:
+            self.log.exception("Failed to open render history.")
+            self.history = None
         if self.ui:
             self.ui.setWindowTitle(tk_app.get_window_title())
 
@@ -135,6 +183,9 @@ class Application(QtCore.QObject):
             async_render = self.tk_app.get_async_render()
             self.ui.options.async_render.setChecked(async_render)
 
+            skip_unchanged = self.tk_app.get_skip_unchanged()
+            self.ui.options.skip_unchanged.setChecked(skip_unchanged)
+
             # Update flag so we don't update them next time we load options.
             self._defaults_loaded = True
         else:
@@ -149,6 +200,7 @@ class Application(QtCore.QObject):
         self.items[:] = []
         self.runner = None
         self.set_render_status(const.Waiting)
+        self.update_resume_button()
 
     def drag_queue(self, event):
         if self.engine.has_dynamic_links(event.mimeData()):
@@ -195,19 +247,199 @@ class Application(QtCore.QObject):
                 self.ui.queue.add_item(item["name"])
 
     def on_runner_emit_record(self, record):
-        formatter = LogFormatter()
-        self.log.debug(formatter.format(record))
+        # Called from worker threads. Only format records when they are logged.
+        if self.log.isEnabledFor(logging.DEBUG):
+            message = self._log_formatter.format(record)
+            if record.exc_text:
+                message += "\n" + record.exc_text
+            self.log.debug(message)
+
+    def start_spool(self):
+        self.log.debug("Starting ShotGrid Spool...")
+        self.spool = spool.Spool(self.tk_app.get_spool_path())
+        self.spool.purge()
+        self._spool_drainer = spool.SpoolDrainer(
+            self.spool,
+            tk=self.tk_app.sgtk,
+            log=self.log,
+        )
+        self._spool_drainer.job_changed.connect(self.on_spool_job_changed)
+        self._spool_drainer.start()
+
+    def stop_spool(self):
+        if not self._spool_drainer:
+            return
+
+        self.log.debug("Stopping ShotGrid Spool...")
+        self._spool_drainer.stop()
+        self._spool_drainer.wait()
+        self._spool_drainer = None
+        self.spool.close()
+        self.spool = None
+
+    def on_spool_job_changed(self, job):
+        if self.runner and self.runner.status in const.DoneList:
+            self.ui.report.append_html(spool.format_html_job(job))
+
+    def start_live_report(self, runner):
+        self.ui.report.clear()
+        self._live_report = LiveReport(self.ui.report, parent=self)
+        runner.add_listener(self._live_report.append)
+        self._live_report.start()
+
+    def stop_live_report(self):
+        if not self._live_report:
+            return
+
+        self._live_report.stop()
+        self._live_report = None
+        if self.spool:
+            report = spool.generate_html_report(self.spool, self._render_started)
+            if report:
+                self.ui.report.append_html(report)
+
+    def save_report(self):
+        """Write the full report of the last render to a file in the background."""
+
+        if not self.runner or self.runner.status not in const.DoneList:
+            self.ui.show_error("Reports can be saved when a render is finished.")
+            return
+        if self._report_writer and self._report_writer.isRunning():
+            return
+
+        path = self.get_report_path() or ""
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self.ui,
+            "Save Report",
+            path,
+            "HTML (*.html)",
+        )
+        if not path:
+            return
+
+        self._report_writer = ReportWriter(
+            path,
+            self.runner,
+            self.spool,
+            self._render_started,
+            parent=self,
+        )
+        self._report_writer.written.connect(self.on_report_written)
+        self._report_writer.failed.connect(self.on_report_failed)
+        self._report_writer.start()
+
+    def on_report_written(self, path):
+        self.log.debug("Report saved to %s", path)
+        self.ui.show_info("Report saved!")
+
+    def on_report_failed(self, message):
+        self.log.error("Failed to save report: %s", message)
+        self.ui.show_error("Failed to save report.")
 
     def on_flow_step_changed(self, event):
         self.ui.queue.update_item(
             label=event["flow"],
             status=event["step"],
             percent=event["progress"],
+            eta=event.get("eta"),
         )
 
+    def get_report_path(self):
+        project_path = self.engine.project_path
+        if project_path:
+            return self.generate_report_path(project_path)
+
+    def get_journal_path(self):
+        project_path = self.engine.project_path
+        if project_path:
+            return self.generate_journal_path(project_path)
+
+    def read_journal(self):
+        journal_path = self.get_journal_path()
+        if journal_path:
+            return journal.read_journal(journal_path)
+
+    def update_resume_button(self):
+        try:
+            resumable = journal.is_resumable(self.read_journal())
+        except Exception:
+            self.log.exception("Failed to read render journal.")
+            resumable = False
+        self.ui.resume_button.setVisible(resumable)
+
+    def start_journal(self, runner, run, resume_state=None):
+        """Journal the state of the runner, so it can be resumed after a crash."""
+
+        try:
+            if resume_state:
+                restored = journal.restore(runner, resume_state)
+                self.log.debug("Restored %d tasks from render journal.", restored)
+            self.journal = journal.Journal(self.get_journal_path())
+            self.journal.start(runner, run)
+            runner.journal = self.journal
+        except Exception:
+            self.log.exception("Failed to start render journal.")
+            self.journal = None
+
+    def start_event_spill(self, runner):
+        """Spill log records that don't fit in memory next to the project.
+
+        Only the records of the latest render are kept.
+        """
+
+        project_path = self.engine.project_path
+        if not project_path:
+            return
+
+        folder = self.generate_events_path(project_path)
+        shutil.rmtree(folder, ignore_errors=True)
+        runner.set_spill_folder(os.path.join(folder, runner.id))
+
+    def write_trace(self):
+        """Write the timeline of the last render as Chrome trace event JSON."""
+
+        project_path = self.engine.project_path
+        if not self.runner or not project_path:
+            return
+
+        try:
+            path = self.runner.tracer.write(self.generate_trace_path(project_path))
+            self.log.debug("Wrote render trace to %s", path)
+        except Exception:
+            self.log.exception("Failed to write render trace.")
+
+    def record_history(self):
+        """Record the durations of the finished render in the render history."""
+
+        if not self.history or not self.runner or self._history_runner is self.runner:
+            return
+
+        self._history_runner = self.runner
+        try:
+            self.history.record_run(
+                self.runner,
+                project=self.engine.project_path,
+                options=self._run["options"] if self._run else None,
+                started=self._render_started,
+                machine=get_machine_info(self.host_version),
+            )
+        except Exception:
+            self.log.exception("Failed to record render history.")
+
+    def stop_journal(self):
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+
     def set_render_status(self, status):
         if status in const.DoneList:
-            self.ui.report.setText(generate_html_report(self.runner))
+            self.stop_live_report()
+            self.stop_journal()
+            self.write_trace()
+            self.record_history()
+            if self._upload_executor:
+                self._upload_executor.shutdown(wait=False)
+                self._upload_executor = None
 
             # Stop the AERenderPopupMonitor
             if self._aerender_popup_monitor:
@@ -215,6 +447,8 @@ class Application(QtCore.QObject):
                 self._aerender_popup_monitor.stop()
 
         self.ui.set_status(status)
+        if status in const.DoneList:
+            self.ui.retry_button.setVisible(bool(self.get_retry_flows()))
 
         # Update Send button state and send report if needed.
         if status == const.Failed:
@@ -226,18 +460,42 @@ class Application(QtCore.QObject):
         return self.tk_app.send_is_available() and not self.tk_app.send_on_error()
 
     def send_report(self):
-        try:
-            self.tk_app.send_report(
-                self.engine.context,
-                self.runner,
-                generate_report(self.runner),
-                generate_html_report(self.runner),
-            )
-            if not self.tk_app.send_on_error():
-                self.ui.show_info("Error report sent!")
-        except Exception:
-            self.log.exception("Failed to send error report.")
-            self.ui.show_error("Failed to send error report.")
+        """Send the report of the last render in the background."""
+
+        if self._report_sender and self._report_sender.isRunning():
+            return
+
+        ctx = self.engine.context
+        runner = self.runner
+
+        def send(report, html_report, attachments):
+            self.tk_app.send_report(ctx, runner, report, html_report, attachments)
+
+        project_path = self.engine.project_path or "render.aep"
+        name = os.path.splitext(os.path.basename(project_path))[0] + "_report"
+        self._report_sender = ReportSender(
+            send,
+            tempfile.mkdtemp(prefix="aeq_report_"),
+            name,
+            runner,
+            self.spool,
+            self._render_started,
+            parent=self,
+        )
+        self._report_sender.sent.connect(self.on_report_sent)
+        self._report_sender.failed.connect(self.on_report_send_failed)
+        self.ui.send_button.setEnabled(False)
+        self._report_sender.start()
+
+    def on_report_sent(self):
+        self.ui.send_button.setEnabled(True)
+        if not self.tk_app.send_on_error():
+            self.ui.show_info("Error report sent!")
+
+    def on_report_send_failed(self, message):
+        self.ui.send_button.setEnabled(True)
+        self.log.error("Failed to send error report.\n%s", message)
+        self.ui.show_error("Failed to send error report.")
 
     def cancel(self):
         self.runner.request(const.Cancelled)
@@ -247,6 +505,75 @@ class Application(QtCore.QObject):
             self.ui.show_error("Add items to the queue first!")
             return
 
+        options = RenderOptions(**self.ui.options.get())
+        self.start_render(options)
+
+    def resume(self):
+        """Resume the render recorded in the journal of the current project.
+
+        Rebuilds the flows of the journaled render, skipping tasks that already
+        succeeded and keeping the frames of partially rendered sequences.
+        """
+
+        state = self.read_journal()
+        if not journal.is_resumable(state):
+            self.ui.show_error("Nothing to resume.")
+            self.ui.resume_button.setVisible(False)
+            return
+
+        items = []
+        for name in state["items"]:
+            comp_item = self.engine.get_comp(name)
+            if not comp_item:
+                self.ui.show_error("Comp not found: %s" % name)
+                return
+            items.append(comp_item)
+
+        self.reset_queue()
+        self.items[:] = items
+        for item in self.items:
+            self.ui.queue.add_item(item["name"])
+
+        # Options missing from older journals fall back to the current options.
+        options = self.ui.options.get()
+        options.update(
+            {k: v for k, v in state["options"].items() if k in RenderOptions._fields}
+        )
+        options = RenderOptions(**options)
+        self.ui.options.set(**options.dict())
+        self.start_render(options, state)
+
+    def get_retry_flows(self):
+        """Get the flows of the finished Runner that did not succeed."""
+
+        if not self.runner or self.runner.status not in const.DoneList:
+            return []
+
+        return [flow for flow in self.runner.flows if flow.status != const.Success]
+
+    def retry_failed(self):
+        """Render the flows of the finished Runner that did not succeed again.
+
+        Failed, Revoked and Cancelled flows are retried. Tasks that succeeded keep
+        their results, so a flow whose upload failed is not rendered again.
+        """
+
+        names = [flow.name for flow in self.get_retry_flows()]
+        items = [item for item in self.items if item["name"] in names]
+        if not items:
+            self.ui.show_error("Nothing to retry.")
+            return
+
+        state = dict(
+            self._run,
+            status=self.runner.status,
+            tasks=journal.get_tasks(self.runner),
+        )
+        options = RenderOptions(**state["options"])
+        self.start_render(options, state, items)
+
+    def start_render(self, options, resume_state=None, items=None):
+        items = items or self.items
         ready_to_run, message = self.tk_app.ensure_context_optimal()
         if not ready_to_run:
             self.ui.show_error(message)
@@ -255,15 +582,16 @@ class Application(QtCore.QObject):
         # Set status to Running manually - makes the UI feel more responsive
         # as the first status change from Waiting -> Running make take a moment.
         self.set_render_status(const.Running)
+        self._render_started = time.time()
 
         self.log.debug("Constructing Render Flows...")
         with Runner("Render and Review", parent=self) as runner:
-            # Get the user options and project path
-            options = RenderOptions(**self.ui.options.get())
+            # Get the project path
             project = self.engine.project_path
 
             # Setup bg rendering
             render_pool = None
+            project_digest = None
             if options.bg:
                 # Create a pool just for background render tasks.
                 render_pool = QtCore.QThreadPool()
@@ -271,29 +599,90 @@ class Application(QtCore.QObject):
 
                 # Save a copy of the project to render in background.
                 # Prevents modifications from affecting background renders.
-                project = self.generate_bg_project_path(
-                    render_id=runner.id[:8],
-                    project_path=project,
-                )
-                self.engine.save_copy(project)
+                if resume_state and os.path.isfile(resume_state["render_project"]):
+                    project = resume_state["render_project"]
+                else:
+                    project, project_digest = self.snapshot_bg_project(project)
+
+            # Setup batch rendering
+            render_batch = None
+            if options.async_render and not options.bg and self.tk_app.get_batch_render():
+                # Render all comps in a single renderAsync pass. Render tasks only
+                # wait for their comp to finish, so give them a pool of their own.
+                render_batch = AERenderBatch()
+                render_pool = QtCore.QThreadPool()
+                render_pool.setMaxThreadCount(len(items))
+
+            # Fingerprints of each comp include a hash of the saved project, so
+            # comps are only skipped when the project is unchanged.
+            if resume_state:
+                project_digest = resume_state["project_digest"]
+            elif not options.skip_unchanged:
+                project_digest = None
+            elif not options.bg:
+                self.engine.save()
+                project_digest = call_in_background(files.hash_file, project)
 
             # Generate a path template by creating a temporary render queue item
             # with the output module specified in options.
             path_template = self.generate_path_template(options.module)
             self.log.debug("PATH TEMPLATE: %s", path_template)
 
+            # Create or update the Versions of flows reaching the upload step at
+            # the same time together, unless they are spooled and sent in the
+            # background.
+            version_batch = None
+            upload_executor = None
+            upload_bandwidth = None
+            if options.sg:
+                if not self.spool:
+                    version_batch = SGVersionBatch(
+                        return_fields=get_version_return_fields(
+                            self.tk_app.get_media_hash_field()
+                        ),
+                    )
+
+                # Upload media in an executor of its own, so the number of uploads
+                # is limited without holding back Version creation and encoding.
+                upload_executor = ThreadPoolExecutor(
+                    self.tk_app.get_upload_threads(),
+                    thread_name_prefix="aeq_upload",
+                )
+                self._upload_executor = upload_executor
+                upload_bandwidth = shotgun.TokenBucket(
+                    self.tk_app.get_upload_bandwidth_limit()
+                )
+                shotgun.machine_bandwidth.set_rate(
+                    self.tk_app.get_machine_upload_bandwidth_limit()
+                )
+
             # Create flow for each item
             try:
                 prev_flow = None
-                for item in self.items:
+                for item in items:
+                    # Keep the frames of renders interrupted by a crash. Background
+                    # renders find and render their missing frames themselves.
+                    skip_existing = bool(
+                        resume_state
+                        and not options.bg
+                        and journal.was_started(
+                            resume_state, item["name"], const.Rendering
+                        )
+                    )
                     flow = self.new_render_flow(
                         project,
                         item["name"],
                         options,
                         path_template,
                         render_pool,
+                        render_batch,
+                        version_batch,
+                        upload_executor,
+                        upload_bandwidth,
+                        project_digest,
+                        skip_existing,
                     )
-                    if prev_flow and not options.bg:
+                    if prev_flow and not options.bg and not render_batch:
                         flow.depends_on(prev_flow.tasks[0])
                     prev_flow = flow
             except Exception:
@@ -301,11 +690,25 @@ class Application(QtCore.QObject):
                 self.set_render_status(const.Failed)
                 return
 
+        self._run = {
+            "project": self.engine.project_path,
+            "render_project": project,
+            "project_digest": project_digest,
+            "items": [item["name"] for item in items],
+            "options": options.dict(),
+        }
+        self.start_journal(runner, self._run, resume_state)
+        self.start_event_spill(runner)
+        if self.history:
+            runner.estimate_durations(self.history)
+
         self.log.debug("Starting Render Flows...")
         self.runner = runner
         self.runner.step_changed.connect(self.on_flow_step_changed)
+        self.runner.eta_changed.connect(self.ui.set_eta)
         self.runner.status_changed.connect(self.set_render_status)
-        self.runner.log.emit_record.connect(self.on_runner_emit_record)
+        self.runner.add_listener(self.on_runner_emit_record)
+        self.start_live_report(self.runner)
         self.runner.start()
 
         if options.bg:
@@ -313,14 +716,27 @@ class Application(QtCore.QObject):
             self._aerender_popup_monitor = AERenderPopupMonitor()
             self._aerender_popup_monitor.start()
 
-    def new_render_flow(self, project, item, options, path_template, render_pool):
+    def new_render_flow(
+        self,
+        project,
+        item,
+        options,
+        path_template,
+        render_pool,
+        render_batch=None,
+        version_batch=None,
+        upload_executor=None,
+        upload_bandwidth=None,
+        project_digest=None,
+        skip_existing=False,
+    ):
         # Get required flow data...
         sg_ctx = self.engine.context
         comp_item = self.engine.get_comp(item)
-
-        # Extract template fields from work file template...
-        work_template = self.tk_app.get_work_template()
-        sg_fields = sg_ctx.as_template_fields(work_template)
+        render_paths = self.get_render_paths(self.engine.project_path, sg_ctx)
+        sg_fields = render_paths["sg_fields"]
+        render_folder = render_paths["render_folder"]
+        review_folder = render_paths["review_folder"]
 
         # Get the rest of the required flow data...
         publish_on_upload = (
@@ -328,11 +744,39 @@ class Application(QtCore.QObject):
         )
         copy_to_review = self.tk_app.get_copy_to_review()
         move_to_review = self.tk_app.get_move_to_review()
-        render_folder = self.tk_app.get_render_template().apply_fields(sg_fields)
-        review_folder = self.tk_app.get_review_template().apply_fields(sg_fields)
         output_path = path_template.format(folder=render_folder, name=item)
         output_resolution = comp_item.width, comp_item.height
         framerate = 1.0 / comp_item.frameDuration
+        frames = int(round(comp_item.workAreaDuration * framerate))
+        # Numbered like get_render_frame_range, from the comp's display start frame.
+        start_frame = int(comp_item.displayStartFrame) + int(
+            round(comp_item.workAreaStart / comp_item.frameDuration)
+        )
+
+        # Skip rendering comps whose fingerprint and output are unchanged
+        render_fingerprint = None
+        skip_render = False
+        if project_digest:
+            manifest_path = fingerprint.get_manifest_path(output_path, item)
+            render_fingerprint = fingerprint.generate_fingerprint(
+                {
+                    "project": project_digest,
+                    "comp": item,
+                    "render_settings": options.settings,
+                    "output_module": options.module,
+                    "output_path": output_path,
+                    "resolution": output_resolution,
+                    "frame_duration": comp_item.frameDuration,
+                    "duration": comp_item.duration,
+                    "work_area_start": comp_item.workAreaStart,
+                    "work_area_duration": comp_item.workAreaDuration,
+                }
+            )
+            skip_render = fingerprint.is_up_to_date(
+                manifest_path,
+                render_fingerprint,
+                output_path,
+            )
 
         # Build the flow context...
         flow_ctx = {
@@ -346,26 +790,50 @@ class Application(QtCore.QObject):
             "output_path": output_path,
             "output_resolution": output_resolution,
             "framerate": framerate,
+            "frames": frames,
+            "start_frame": start_frame,
             "project": project,
             "host": "AfterFX",
             "host_version": self.host_version,
+            "cache": self.artifact_cache,
         }
 
         with Flow(item) as flow:
             # Add main render task
-            RenderComp = (AERenderComp, BackgroundAERenderComp)[options.bg]
-            extra_render_kwargs = {}
-            if not options.bg:
-                extra_render_kwargs["async_render"] = options.async_render
-            render_comp = RenderComp(
-                project=project,
-                comp=item,
-                output_module=options.module,
-                render_settings=options.settings,
-                output_path=output_path,
-                **extra_render_kwargs,
-            )
-            render_comp.pool = render_pool
+            if skip_render:
+                SkipRender(output_path=output_path)
+            else:
+                RenderComp = (AERenderComp, BackgroundAERenderComp)[options.bg]
+                extra_render_kwargs = {}
+                if render_batch:
+                    RenderComp = BatchAERenderComp
+                    extra_render_kwargs["batch"] = render_batch
+                elif not options.bg:
+                    extra_render_kwargs["async_render"] = options.async_render
+                elif files.is_sequence(output_path):
+                    extra_render_kwargs["frame_range"] = self.get_frame_range(
+                        comp_item,
+                        options.settings,
+                    )
+                if skip_existing:
+                    journal.discard_partial_frame(output_path)
+                    extra_render_kwargs["skip_existing"] = True
+                render_comp = RenderComp(
+                    project=project,
+                    comp=item,
+                    output_module=options.module,
+                    render_settings=options.settings,
+                    output_path=output_path,
+                    **extra_render_kwargs,
+                )
+                render_comp.pool = render_pool
+
+                if render_fingerprint:
+                    RecordFingerprint(
+                        output_path=output_path,
+                        manifest_path=manifest_path,
+                        fingerprint=render_fingerprint,
+                    )
 
             # Poison pill for debugging and testing purposes
             # ErrorTask(step=const.Rendering)
@@ -433,6 +901,11 @@ class Application(QtCore.QObject):
                     src_file=(output_path, mp4_upload_path)[options.mp4],
                     sg_ctx=sg_ctx,
                     comment=options.sg_comment,
+                    version_batch=version_batch,
+                    hash_field=self.tk_app.get_media_hash_field(),
+                    bandwidth=upload_bandwidth,
+                    upload_executor=upload_executor,
+                    spool=self.spool,
                 )
 
                 # Register a publish
@@ -442,6 +915,7 @@ class Application(QtCore.QObject):
                         thumbnail_src_file=(None, mp4_upload_path)[options.mp4],
                         sg_ctx=sg_ctx,
                         version_task=version_task,
+                        spool=self.spool,
                     )
 
             if not options.keep_original:
@@ -451,6 +925,41 @@ class Application(QtCore.QObject):
 
         return flow
 
+    def get_frame_range(self, comp_item, render_settings):
+        """Get the frame range a background render of an image sequence renders.
+
+        Used to render only the missing frames of a previous render. Returns None
+        when the frame range can not be determined.
+        """
+
+        try:
+            return self.engine.get_render_frame_range(comp_item, render_settings)
+        except Exception:
+            self.log.exception("Failed to get frame range of %s.", comp_item.name)
+
+    def get_render_paths(self, project_path, sg_ctx):
+        """Get the template fields and render and review folders for a context.
+
+        These are the same for every comp in a render, so they are resolved once and
+        cached by project path and context.
+        """
+
+        key = (project_path,) + self.tk_app.get_context_key(sg_ctx)
+        if key not in self._render_paths_cache:
+            # Extract template fields from work file template...
+            work_template = self.tk_app.get_work_template()
+            sg_fields = sg_ctx.as_template_fields(work_template)
+            self._render_paths_cache[key] = {
+                "sg_fields": sg_fields,
+                "render_folder": self.tk_app.get_render_template().apply_fields(
+                    sg_fields
+                ),
+                "review_folder": self.tk_app.get_review_template().apply_fields(
+                    sg_fields
+                ),
+            }
+        return self._render_paths_cache[key]
+
     def generate_path_template(self, output_module):
         token = "__NAME__"
         with self.engine.TempComp(token) as comp:
@@ -480,11 +989,115 @@ class Application(QtCore.QObject):
                     output_path = paths.normalize("{folder}", f"{token}.{extension}")
         return output_path.replace(token, "{name}")
 
-    def generate_bg_project_path(self, render_id, project_path):
+    def generate_bg_project_path(self, digest, project_path):
+        dirname, basename = os.path.split(project_path)
+        filename, extension = os.path.splitext(basename)
+        return os.path.join(dirname, "aeq", f"{filename}_{digest[:12]}{extension}")
+
+    def generate_report_path(self, project_path):
         dirname, basename = os.path.split(project_path)
         filename, extension = os.path.splitext(basename)
-        stamp = f"{render_id}_{datetime.now().strftime('%Y-%m-%d_%H-%M')}"
-        return os.path.join(dirname, "aeq", f"{filename}_{stamp}{extension}")
+        return os.path.join(dirname, "aeq", f"{filename}_report.html")
+
+    def generate_trace_path(self, project_path):
+        dirname, basename = os.path.split(project_path)
+        filename, extension = os.path.splitext(basename)
+        return os.path.join(dirname, "aeq", f"{filename}_trace.json")
+
+    def generate_events_path(self, project_path):
+        dirname, basename = os.path.split(project_path)
+        filename, extension = os.path.splitext(basename)
+        return os.path.join(dirname, "aeq", f"{filename}_events")
+
+    def generate_journal_path(self, project_path):
+        dirname, basename = os.path.split(project_path)
+        filename, extension = os.path.splitext(basename)
+        return os.path.join(dirname, "aeq", f"{filename}_journal.jsonl")
+
+    def snapshot_bg_project(self, project_path):
+        """Save the project and snapshot it for background rendering.
+
+        Snapshots are named by the content hash of the project, so rendering an
+        unchanged project reuses the snapshot made by a previous render. The project
+        is hashed and copied in a worker thread, keeping the UI responsive.
+
+        Returns:
+            tuple: Path to the snapshot and the content hash of the project.
+        """
+
+        self.engine.save()
+        digest = call_in_background(files.hash_file, project_path)
+        snapshot_path = self.generate_bg_project_path(digest, project_path)
+        if os.path.isfile(snapshot_path):
+            self.log.debug("Reusing project snapshot: %s", snapshot_path)
+            try:
+                os.utime(snapshot_path)
+            except OSError:
+                pass
+        else:
+            self.log.debug("Saving project snapshot: %s", snapshot_path)
+            call_in_background(files.copy_file, project_path, snapshot_path)
+
+        self.collect_bg_projects(
+            project_path,
+            self.tk_app.get_bg_snapshots_to_keep(),
+            in_use=[snapshot_path],
+        )
+        return snapshot_path, digest
+
+    def get_bg_projects_in_use(self):
+        """Get the snapshots rendered by the current render or needed to resume one."""
+
+        in_use = []
+        if self._run and self.runner and self.runner.status == const.Running:
+            in_use.append(self._run["render_project"])
+        try:
+            state = self.read_journal()
+        except Exception:
+            self.log.exception("Failed to read render journal.")
+            state = None
+        if journal.is_resumable(state):
+            in_use.append(state.get("render_project"))
+        return {os.path.normcase(os.path.abspath(path)) for path in in_use if path}
+
+    def collect_bg_projects(self, project_path, keep, in_use=None):
+        """Remove all but the most recent <keep> snapshots of a project.
+
+        Snapshots still used by a running render or a resumable journal are kept,
+        along with the snapshots in in_use, like the one about to be rendered.
+        """
+
+        dirname, basename = os.path.split(project_path)
+        filename, extension = os.path.splitext(basename)
+        snapshot_folder = os.path.join(dirname, "aeq")
+        if not os.path.isdir(snapshot_folder):
+            return
+
+        pattern = re.compile(
+            re.escape(filename)
+            + r"_([0-9a-f]{12}|[0-9a-f]{8}_\d{4}-\d\d-\d\d_\d\d-\d\d)"
+            + re.escape(extension)
+            + r"(\.tmp)?$"
+        )
+        snapshots = [
+            entry
+            for entry in os.scandir(snapshot_folder)
+            if entry.is_file() and pattern.match(entry.name)
+        ]
+        snapshots.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        in_use = self.get_bg_projects_in_use() | {
+            os.path.normcase(os.path.abspath(path)) for path in in_use or []
+        }
+        for entry in snapshots[keep:]:
+            if os.path.normcase(os.path.abspath(entry.path)) in in_use:
+                self.log.debug("Snapshot needed by a render, kept: %s", entry.path)
+                continue
+            self.log.debug("Removing old project snapshot: %s", entry.path)
+            try:
+                os.remove(entry.path)
+            except OSError:
+                # Probably still in use by a background render.
+                self.log.debug("Snapshot in use, skipped: %s", entry.path)
 
     def show_context_menu(self, point):
         # Get selected item
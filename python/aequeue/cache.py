@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from . import files
+
+
+class ArtifactCache(object):
+    """Cache of derived media like mp4s, gifs and thumbnails.
+
+    Artifacts are keyed by the path, size and mtime of their source media and the
+    parameters used to create them, so unchanged sources are never encoded twice.
+    Artifacts are written to a temporary file and moved into place, so a partially
+    written artifact is never used. The least recently used artifacts are removed
+    when the cache grows larger than max_size.
+
+    The size of the cache is scanned once and then kept as a running total, which
+    is only rescanned when it goes over max_size. Artifacts are never evicted while
+    they are in use, even when a single artifact is larger than max_size.
+
+    Arguments:
+        root (str): Directory to store artifacts in.
+        max_size (int): Size budget in bytes.
+    """
+
+    def __init__(self, root, max_size):
+        self.root = root
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.locks = defaultdict(threading.Lock)
+        self.in_use = defaultdict(int)
+        self.size = None
+
+    def key(self, source, params):
+        """Get the key of an artifact created from source media with params."""
+
+        data = json.dumps([files.stat_media(source), params], sort_keys=True)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def path(self, key, ext):
+        return os.path.join(self.root, key[:2], key + ext)
+
+    def get(self, key, ext):
+        """Get the path to a cached artifact or None."""
+
+        path = self.path(key, ext)
+        try:
+            # Mark the artifact as recently used.
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    @contextmanager
+    def create(self, key, ext):
+        """Context yielding a temporary path to write an artifact to.
+
+        The artifact is moved into the cache when the context exits without error.
+        """
+
+        path = self.path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = os.path.join(
+            os.path.dirname(path),
+            ".%s.%s%s" % (key, uuid.uuid4().hex, ext),
+        )
+        try:
+            yield tmp
+            size = os.path.getsize(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        with self.lock:
+            if self.size is not None:
+                self.size += size
+            over_budget = self.size is None or self.size > self.max_size
+        if over_budget:
+            self.evict()
+
+    @contextmanager
+    def get_or_create(self, source, params, ext, create):
+        """Context yielding the path to a cached artifact, creating it if necessary.
+
+        The artifact is not evicted until the context exits, so copy or consume it
+        inside the context.
+
+        Arguments:
+            source (str): Path to the source media or image sequence.
+            params (dict): Parameters used to create the artifact.
+            ext (str): Extension of the artifact.
+            create (callable): Called with a path to write the artifact to.
+        """
+
+        key = self.key(source, params)
+        path = self.path(key, ext)
+        with self.lock:
+            key_lock = self.locks[key]
+            self.in_use[path] += 1
+
+        try:
+            with key_lock:
+                if not self.get(key, ext):
+                    with self.create(key, ext) as tmp:
+                        create(tmp)
+            yield path
+        finally:
+            with self.lock:
+                self.in_use[path] -= 1
+                if not self.in_use[path]:
+                    del self.in_use[path]
+
+    def evict(self):
+        """Remove least recently used artifacts until the cache fits max_size.
+
+        Scans the cache, so the running total includes artifacts added by other
+        sessions sharing the cache. Artifacts in use are skipped.
+        """
+
+        artifacts = []
+        total = 0
+        for root, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.startswith("."):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                artifacts.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        artifacts.sort()
+        for _, size, path in artifacts:
+            if total <= self.max_size:
+                break
+            with self.lock:
+                if path in self.in_use:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+        with self.lock:
+            self.size = total
@@ -0,0 +1,264 @@
+import glob
+import hashlib
+import os
+import re
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+
+# Linux ioctl used to clone a file on filesystems supporting reflinks (btrfs, xfs).
+FICLONE = 0x40049409
+
+# Matches the frame padding of an image sequence path like %04d or [####].
+SEQUENCE_PADDING = re.compile(r"%0(\d+)d|\[(#+)\]")
+
+# Trailing bytes of complete files, used to detect truncated frames.
+FILE_TRAILERS = {
+    ".png": b"IEND\xaeB`\x82",
+    ".jpg": b"\xff\xd9",
+    ".jpeg": b"\xff\xd9",
+}
+
+# Digests of recently hashed files by path, size and modification time.
+_hash_cache = OrderedDict()
+_hash_cache_lock = threading.Lock()
+_hash_cache_size = 20000
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Compute the sha1 hex digest of a file.
+
+    Reads the file in chunks, so memory usage stays flat for large files. Digests of
+    the most recently hashed files are cached by path, size and modification time.
+    """
+
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _hash_cache_lock:
+        if key in _hash_cache:
+            _hash_cache.move_to_end(key)
+            return _hash_cache[key]
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+
+    with _hash_cache_lock:
+        _hash_cache[key] = digest.hexdigest()
+        while len(_hash_cache) > _hash_cache_size:
+            _hash_cache.popitem(last=False)
+    return digest.hexdigest()
+
+
+def hash_files(paths):
+    """Compute a combined sha1 hex digest of many files, like the frames of a sequence.
+
+    Combines the name and digest of each file, so renamed frames change the digest.
+    """
+
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        digest.update(hash_file(path).encode("ascii"))
+    return digest.hexdigest()
+
+
+def is_sequence(path):
+    return bool(SEQUENCE_PADDING.search(path))
+
+
+def find_frames(path):
+    """Get the sorted paths of the existing frames of an image sequence.
+
+    Image sequence paths use %04d or [####] style frame padding.
+    """
+
+    match = SEQUENCE_PADDING.search(path)
+    padding = int(match.group(1)) if match.group(1) else len(match.group(2))
+    pattern = (
+        glob.escape(path[: match.start()])
+        + "[0-9]" * padding
+        + glob.escape(path[match.end() :])
+    )
+    return sorted(glob.glob(pattern))
+
+
+def get_frames(path):
+    """Get the paths of the existing frames of an image sequence by frame number."""
+
+    match = SEQUENCE_PADDING.search(path)
+    padding = int(match.group(1)) if match.group(1) else len(match.group(2))
+    start = len(path[: match.start()])
+    return {int(frame[start : start + padding]): frame for frame in find_frames(path)}
+
+
+def is_truncated(path):
+    """Check if a file is empty, or missing the trailing bytes of its format."""
+
+    size = os.path.getsize(path)
+    if not size:
+        return True
+
+    trailer = FILE_TRAILERS.get(os.path.splitext(path)[1].lower())
+    if trailer:
+        with open(path, "rb") as f:
+            f.seek(max(size - len(trailer), 0))
+            return f.read() != trailer
+    return False
+
+
+def find_missing_frames(path, first, last, since=None):
+    """Get the frame numbers of an image sequence that need to be rendered.
+
+    Frames are missing when they do not exist, are truncated, or were modified
+    before <since>. When frames are missing, the most recently written frame is
+    included too, as it may have been interrupted while being written.
+
+    Returns:
+        list: Missing frame numbers, or None when existing frames fall outside of
+            the range <first> to <last>.
+    """
+
+    frames = get_frames(path)
+    if any(number < first or number > last for number in frames):
+        return None
+
+    missing = []
+    mtimes = {}
+    for number in range(first, last + 1):
+        frame = frames.get(number)
+        if frame:
+            mtimes[number] = os.path.getmtime(frame)
+        if not frame or is_truncated(frame) or (since and mtimes[number] < since):
+            missing.append(number)
+
+    complete = [number for number in mtimes if number not in missing]
+    if missing and complete:
+        missing.append(max(complete, key=mtimes.get))
+    return sorted(missing)
+
+
+def get_frame_ranges(numbers):
+    """Group frame numbers into a list of contiguous (first, last) ranges."""
+
+    ranges = []
+    for number in sorted(numbers):
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], number)
+        else:
+            ranges.append((number, number))
+    return ranges
+
+
+def hash_media(path):
+    """Compute the sha1 hex digest of a media file or image sequence.
+
+    Image sequence paths use %04d or [####] style frame padding, and are hashed
+    using all of their frames.
+    """
+
+    if not is_sequence(path):
+        return hash_file(path)
+
+    frames = find_frames(path)
+    if not frames:
+        raise FileNotFoundError("No frames found for sequence: %s" % path)
+    return hash_files(frames)
+
+
+def stat_media(path):
+    """Compute a sha1 hex digest of the path, size and mtime of a media file.
+
+    Image sequences use the name, size and mtime of all of their frames. Much cheaper
+    than hash_media, and changes whenever a file is rewritten.
+    """
+
+    if is_sequence(path):
+        paths = find_frames(path)
+        if not paths:
+            raise FileNotFoundError("No frames found for sequence: %s" % path)
+    else:
+        paths = [path]
+
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf-8"))
+    for frame in paths:
+        stat = os.stat(frame)
+        entry = "%s:%d:%d;" % (os.path.basename(frame), stat.st_size, stat.st_mtime_ns)
+        digest.update(entry.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def copy_file(src, dst):
+    """Copy src to dst as cheaply as the platform allows.
+
+    Tries a copy-on-write clone first, then copy_file_range, then falls back to
+    shutil.copyfile. The copy is written to a temporary file and moved into place,
+    so dst is never left partially written.
+    """
+
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = dst + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    try:
+        if not _clone_file(src, tmp):
+            if not _copy_file_range(src, tmp):
+                shutil.copyfile(src, tmp)
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    return dst
+
+
+def _clone_file(src, dst):
+    """Clone src to dst using a reflink. Returns False when unsupported."""
+
+    if sys.platform == "darwin":
+        try:
+            import ctypes
+
+            libc = ctypes.CDLL(None, use_errno=True)
+            return libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0
+        except Exception:
+            return False
+
+    if sys.platform.startswith("linux"):
+        try:
+            import fcntl
+
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return True
+        except Exception:
+            if os.path.exists(dst):
+                os.remove(dst)
+            return False
+
+    return False
+
+
+def _copy_file_range(src, dst):
+    """Copy src to dst in the kernel. Returns False when unsupported."""
+
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        return remaining <= 0
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+
+from . import files
+
+# Bump to invalidate all existing fingerprints.
+FINGERPRINT_VERSION = 1
+
+
+def generate_fingerprint(data):
+    """Generate a fingerprint from a dict of everything determining a render."""
+
+    data = dict(data, fingerprint_version=FINGERPRINT_VERSION)
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_manifest_path(output_path, comp):
+    """Get the path to the manifest stored next to the output of a comp."""
+
+    return os.path.join(os.path.dirname(output_path), ".aeq_%s.json" % comp)
+
+
+def get_render_state_path(output_path, comp):
+    """Get the path to the state of a background render of a comp."""
+
+    return os.path.join(os.path.dirname(output_path), ".aeq_%s.render.json" % comp)
+
+
+def list_outputs(output_path):
+    """Get the size of each file rendered to output_path by name.
+
+    Image sequence paths use [####] style frame padding.
+    """
+
+    if files.is_sequence(output_path):
+        paths = files.find_frames(output_path)
+    else:
+        paths = [output_path] if os.path.isfile(output_path) else []
+    return {os.path.basename(path): os.path.getsize(path) for path in paths}
+
+
+def read_manifest(manifest_path):
+    return read_json(manifest_path)
+
+
+def read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(manifest_path, fingerprint, output_path):
+    """Record the fingerprint and rendered files of a comp next to its output."""
+
+    manifest = {
+        "fingerprint": fingerprint,
+        "output_path": output_path,
+        "outputs": list_outputs(output_path),
+    }
+    write_json(manifest_path, manifest)
+    return manifest
+
+
+def write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def is_up_to_date(manifest_path, fingerprint, output_path):
+    """Check that a comp was rendered with the same fingerprint, and that all of
+    the files it rendered still exist at their rendered size.
+    """
+
+    manifest = read_manifest(manifest_path)
+    if not manifest or manifest.get("fingerprint") != fingerprint:
+        return False
+    if manifest.get("output_path") != output_path or not manifest.get("outputs"):
+        return False
+
+    outputs = list_outputs(output_path)
+    for name, size in manifest["outputs"].items():
+        if outputs.get(name) != size:
+            return False
+    return True
@@ -0,0 +1,311 @@
+import json
+import os
+import platform
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from . import const
+from .tasks.core import percentile
+
+# Columns of the tasks table that Task.get_stats may fill in, and their types.
+TASK_STATS = {
+    "seconds": "REAL",
+    "frames": "INTEGER",
+    "output_size": "INTEGER",
+    "output_module": "TEXT",
+    "render_settings": "TEXT",
+    "quality": "TEXT",
+    "resolution": "TEXT",
+    "preset": "TEXT",
+    "frame_p50": "REAL",
+    "frame_p95": "REAL",
+    "frame_max": "REAL",
+    "frame_histogram": "TEXT",
+    "slowest_frames": "TEXT",
+}
+
+# Stats stored as JSON.
+JSON_STATS = ["frame_histogram", "slowest_frames"]
+
+
+def get_machine_info(host_version=None):
+    """Get info about this machine to store with each run."""
+
+    return {
+        "node": platform.node(),
+        "system": platform.system(),
+        "release": platform.release(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "host_version": host_version,
+    }
+
+
+class History(object):
+    """Durations and throughput of finished renders stored in a SQLite database.
+
+    Each finished Runner is recorded as a run, with a row per Task holding its
+    duration and the stats returned by its get_stats method. Query methods return
+    medians over the recorded tasks, so the app can estimate how long renders and
+    encodes will take.
+
+    Arguments:
+        path (str): Path to the SQLite database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    project TEXT,
+                    status TEXT NOT NULL,
+                    started REAL,
+                    finished REAL NOT NULL,
+                    options TEXT,
+                    machine TEXT
+                )
+                """
+            )
+            self.db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id INTEGER NOT NULL REFERENCES runs(id),
+                    flow TEXT NOT NULL,
+                    task TEXT NOT NULL,
+                    step TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    duration REAL NOT NULL
+                )
+                """
+            )
+            # Add stats columns missing from databases of previous versions.
+            existing = [row[1] for row in self.db.execute("PRAGMA table_info(tasks)")]
+            for column, type in TASK_STATS.items():
+                if column not in existing:
+                    self.db.execute(
+                        "ALTER TABLE tasks ADD COLUMN %s %s" % (column, type)
+                    )
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS tasks_by_task ON tasks (task, status)"
+            )
+
+    def record_run(
+        self,
+        runner,
+        project=None,
+        options=None,
+        started=None,
+        machine=None,
+    ):
+        """Record the tasks of a finished Runner.
+
+        Tasks that never ran, like tasks restored from a journal, are skipped.
+
+        Returns:
+            int: The id of the run.
+        """
+
+        columns = ["run_id", "flow", "task", "step", "status", "attempts", "duration"]
+        columns += list(TASK_STATS)
+        rows = []
+        for flow in runner.flows:
+            for task in flow.tasks:
+                if task.duration is None:
+                    continue
+                stats = task.stats or {}
+                rows.append(
+                    [
+                        flow.name,
+                        task.__class__.__name__,
+                        task.step,
+                        task.status,
+                        task.attempt,
+                        task.duration,
+                    ]
+                    + [
+                        json.dumps(stats[column])
+                        if column in JSON_STATS and stats.get(column) is not None
+                        else stats.get(column)
+                        for column in TASK_STATS
+                    ]
+                )
+
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                cursor = self.db.execute(
+                    "INSERT INTO runs "
+                    "(name, project, status, started, finished, options, machine) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        runner.name,
+                        project,
+                        runner.status,
+                        started,
+                        time.time(),
+                        json.dumps(options or {}, default=str),
+                        json.dumps(machine or {}, default=str),
+                    ),
+                )
+                run_id = cursor.lastrowid
+                self.db.executemany(
+                    "INSERT INTO tasks (%s) VALUES (%s)"
+                    % (", ".join(columns), ", ".join("?" * len(columns))),
+                    [[run_id] + row for row in rows],
+                )
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return run_id
+
+    def runs(self, limit=20):
+        """Get the most recent runs."""
+
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT * FROM runs ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        runs = []
+        for row in rows:
+            run = dict(row)
+            run["options"] = json.loads(run["options"] or "{}")
+            run["machine"] = json.loads(run["machine"] or "{}")
+            runs.append(run)
+        return runs
+
+    def tasks(self, task=None, status=const.Success, limit=1000, **filters):
+        """Get the most recent successful tasks, filtered by class and columns."""
+
+        where = ["status = ?"]
+        values = [status]
+        if task:
+            where.append("task = ?")
+            values.append(task)
+        for column, value in filters.items():
+            if column not in TASK_STATS and column not in ("flow", "step"):
+                raise ValueError("Can't filter tasks by %s" % column)
+            where.append("%s = ?" % column)
+            values.append(value)
+
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT * FROM tasks WHERE %s ORDER BY id DESC LIMIT ?"
+                % " AND ".join(where),
+                values + [limit],
+            ).fetchall()
+        tasks = []
+        for row in rows:
+            task = dict(row)
+            for column in JSON_STATS:
+                if task[column]:
+                    task[column] = json.loads(task[column])
+            tasks.append(task)
+        return tasks
+
+    def median_duration(self, task, column="duration", **filters):
+        """Get the median seconds a task class took, or None without history.
+
+        Uses the duration of tasks, or another column of seconds like the seconds
+        a render spent rendering. Tasks missing the column are ignored.
+        """
+
+        durations = [
+            row[column]
+            for row in self.tasks(task, **filters)
+            if row[column] is not None
+        ]
+        if not durations:
+            return None
+        return percentile(durations, 50)
+
+    def seconds_per_frame(self, task=None, group_by="output_module", **filters):
+        """Get the median render seconds per frame, grouped by a column.
+
+        Returns:
+            dict: Median seconds per frame by the values of the group_by column.
+        """
+
+        groups = defaultdict(list)
+        for row in self.tasks(task, step=const.Rendering, **filters):
+            if row["frames"] and row["seconds"]:
+                groups[row[group_by]].append(row["seconds"] / row["frames"])
+        return {key: percentile(values, 50) for key, values in groups.items()}
+
+    def encode_fps(self, task="EncodeMP4", group_by="preset", **filters):
+        """Get the median frames encoded per second, grouped by a column.
+
+        Returns:
+            dict: Median frames per second by the values of the group_by column.
+        """
+
+        groups = defaultdict(list)
+        for row in self.tasks(task, **filters):
+            if row["frames"] and row["seconds"]:
+                groups[row[group_by]].append(row["frames"] / row["seconds"])
+        return {key: percentile(values, 50) for key, values in groups.items()}
+
+    def slowest_frames(self, task="BackgroundAERenderComp", limit=20, **filters):
+        """Get the recent renders with the slowest frames, slowest first.
+
+        Returns:
+            list: Tasks with frame times, sorted by their frame_p95.
+        """
+
+        tasks = [row for row in self.tasks(task, **filters) if row["frame_p95"]]
+        tasks.sort(key=lambda row: row["frame_p95"], reverse=True)
+        return tasks[:limit]
+
+    def cached(self):
+        """Get a CachedHistory to estimate many Tasks with."""
+
+        return CachedHistory(self)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class CachedHistory(object):
+    """View of a History that runs each query only once.
+
+    The Tasks of a render mostly share a few task classes and output modules, so
+    estimating every Task of a large render asks for the same medians many times.
+
+    Arguments:
+        history (History): History to query.
+    """
+
+    def __init__(self, history):
+        self.history = history
+        self.results = {}
+
+    def query(self, method, *args, **kwargs):
+        key = (method, args, tuple(sorted(kwargs.items())))
+        if key not in self.results:
+            self.results[key] = getattr(self.history, method)(*args, **kwargs)
+        return self.results[key]
+
+    def median_duration(self, *args, **kwargs):
+        return self.query("median_duration", *args, **kwargs)
+
+    def seconds_per_frame(self, *args, **kwargs):
+        return self.query("seconds_per_frame", *args, **kwargs)
+
+    def encode_fps(self, *args, **kwargs):
+        return self.query("encode_fps", *args, **kwargs)
@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+import time
+
+from . import const, files
+
+
+class Journal(object):
+    """Durable record of the state of a render, used to resume it after a crash.
+
+    Entries are appended to a JSON lines file and flushed to disk as they are
+    written. A "run" entry holds everything needed to rebuild the Runner's flows,
+    followed by "task" entries for each task state transition and "runner" entries
+    for each Runner status change.
+
+    Arguments:
+        path (str): Path to the journal file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+
+    def start(self, runner, run):
+        """Start a new journal for a Runner, replacing any previous journal.
+
+        Tasks restored from a previous journal are recorded again, so the new
+        journal alone is enough to resume the render.
+        """
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        entries = [dict(run, type="run", runner=runner.name, time=time.time())]
+        for flow in runner.flows:
+            for task in flow.tasks:
+                if task.status == const.Success:
+                    entries.append(task_entry(flow, task))
+
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=str) + "\n")
+        os.replace(tmp, self.path)
+
+        with self.lock:
+            self.file = open(self.path, "a")
+
+    def write(self, entry):
+        with self.lock:
+            if not self.file:
+                return
+            self.file.write(json.dumps(entry, default=str) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def record_task(self, flow, task, status=None):
+        self.write(task_entry(flow, task, status))
+
+    def record_runner(self, runner):
+        self.write({"type": "runner", "status": runner.status, "time": time.time()})
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+
+def task_entry(flow, task, status=None):
+    return {
+        "type": "task",
+        "flow": flow.name,
+        "index": flow.tasks.index(task),
+        "task": task.__class__.__name__,
+        "step": task.step,
+        "status": status or task.status,
+        "attempts": task.attempt,
+        "result": task.result,
+        "time": time.time(),
+    }
+
+
+def get_tasks(runner):
+    """Get the state of the tasks of a Runner, like read_journal."""
+
+    return {
+        (flow.name, index): task_entry(flow, task)
+        for flow in runner.flows
+        for index, task in enumerate(flow.tasks)
+    }
+
+
+def read_journal(path):
+    """Read the state of a render from a journal.
+
+    Returns:
+        dict: The run entry with "status" and "tasks" keys added. Tasks are keyed by
+            flow name and task index. None when the journal does not exist.
+    """
+
+    try:
+        with open(path, "r") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    state = None
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # The last entry may be incomplete when a crash interrupted a write.
+            continue
+
+        if entry["type"] == "run":
+            state = dict(entry, status=const.Waiting, tasks={})
+        elif state is None:
+            continue
+        elif entry["type"] == "task":
+            state["tasks"][(entry["flow"], entry["index"])] = entry
+        elif entry["type"] == "runner":
+            state["status"] = entry["status"]
+    return state
+
+
+def is_resumable(state):
+    return bool(state) and state["status"] != const.Success
+
+
+def was_started(state, flow_name, step):
+    """Check if a flow started a step without finishing it successfully."""
+
+    for (flow, index), entry in state["tasks"].items():
+        if flow == flow_name and entry["step"] == step:
+            if entry["status"] not in [const.Waiting, const.Success]:
+                return True
+    return False
+
+
+def restore(runner, state):
+    """Restore the results of tasks that succeeded in a journaled or finished render.
+
+    Restored tasks are marked Success and skipped by their Flow. Tasks only match
+    when their flow, index, class and step are unchanged.
+
+    Returns:
+        int: Number of restored tasks.
+    """
+
+    count = 0
+    for flow in runner.flows:
+        for index, task in enumerate(flow.tasks):
+            entry = state["tasks"].get((flow.name, index))
+            if not entry or entry["status"] != const.Success:
+                continue
+            if entry["task"] != task.__class__.__name__ or entry["step"] != task.step:
+                continue
+            task.status = const.Success
+            task.progress = 100
+            task.result = entry["result"]
+            count += 1
+    return count
+
+
+def discard_partial_frame(output_path):
+    """Remove the last written frame of a sequence interrupted by a crash.
+
+    The frame being written when After Effects crashed may be incomplete, so it is
+    rendered again along with the rest of the missing frames.
+
+    Returns:
+        list: Paths of the remaining frames.
+    """
+
+    if not files.is_sequence(output_path):
+        return []
+
+    frames = files.find_frames(output_path)
+    if frames:
+        last = max(frames, key=os.path.getmtime)
+        os.remove(last)
+        frames.remove(last)
+    return frames
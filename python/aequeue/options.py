@@ -17,6 +17,7 @@ RenderOptionsType = namedtuple(
         "bg",
         "bg_threads",
         "async_render",
+        "skip_unchanged",
     ],
 )
 
@@ -15,7 +15,7 @@ AERENDER_PATTERNS = {
     "duration": re.compile(r"PROGRESS:  Duration: (\d[:;]\d\d[:;]\d\d[:;]\d\d)"),
     "framerate": re.compile(r"PROGRESS:  Frame Rate: (\d+.\d+)"),
     "progress": re.compile(
-        r"PROGRESS:  (\d[:;]\d\d[:;]\d\d[:;]\d\d) \((\d+)\): \d+ Seconds"
+        r"PROGRESS:  (\d[:;]\d\d[:;]\d\d[:;]\d\d) \((\d+)\): (\d+) Seconds"
     ),
     "error": re.compile(r"aerender ERROR:\s*(.*)$", re.IGNORECASE),
     "finished": re.compile(r"PROGRESS:  Total Time Elapsed"),
@@ -114,6 +114,9 @@ class AERenderProcess(QtCore.QProcess):
                     {
                         "progress": progress,
                         "message": f"Frame {frame_number} of {frame_duration}.",
+                        "frame": frame_number,
+                        "frames": frame_duration,
+                        "seconds": int(match.group(3)),
                     }
                 )
                 self.render_state["progress"] = progress
@@ -203,6 +206,8 @@ class AERenderSubprocess:
         rstemplate,
         output,
         version=None,
+        start=None,
+        end=None,
     ):
         # Process start arguments
         self.project = os.path.normpath(project)
@@ -211,8 +216,18 @@ class AERenderSubprocess:
         self.rstemplate = rstemplate
         self.output = os.path.normpath(output)
         self.version = version
+        self.start_frame = start
+        self.end_frame = end
         self.executable = get_executable(version)
-        self.arguments = get_arguments(project, comp, omtemplate, rstemplate, output)
+        self.arguments = get_arguments(
+            project,
+            comp,
+            omtemplate,
+            rstemplate,
+            output,
+            start,
+            end,
+        )
 
         self.signals = AERenderSignals()
         self.status_changed = self.signals.status_changed
@@ -270,6 +285,9 @@ class AERenderSubprocess:
                     {
                         "progress": progress,
                         "message": f"Frame {frame_number} of {frame_duration}.",
+                        "frame": frame_number,
+                        "frames": frame_duration,
+                        "seconds": int(match.group(3)),
                     }
                 )
                 self.render_state["progress"] = progress
@@ -388,8 +406,16 @@ def get_executable(version=None):
     raise RuntimeError("Could not find path to aerender executable...")
 
 
-def get_arguments(project, comp, omtemplate, rstemplate, output):
-    return [
+def get_arguments(
+    project,
+    comp,
+    omtemplate,
+    rstemplate,
+    output,
+    start=None,
+    end=None,
+):
+    arguments = [
         # '-mem_usage', '50', '50',
         "-continueOnMissingFootage",
         "-project",
@@ -403,6 +429,11 @@ def get_arguments(project, comp, omtemplate, rstemplate, output):
         "-output",
         output,
     ]
+    if start is not None:
+        arguments.extend(["-s", str(start)])
+    if end is not None:
+        arguments.extend(["-e", str(end)])
+    return arguments
 
 
 class AERenderPopupMonitor(QtCore.QThread):
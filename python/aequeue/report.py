@@ -0,0 +1,208 @@
+import gzip
+import html
+import os
+import shutil
+import threading
+import traceback
+from collections import deque
+
+from .spool import generate_html_report as generate_spool_html_report
+from .spool import generate_report as generate_spool_report
+from .tasks.core import (
+    format_live_html_record,
+    generate_summary,
+    iter_html_report,
+    iter_report,
+)
+from .vendor.qtpy import QtCore
+
+
+class LiveReport(QtCore.QObject):
+    """Streams the Records of a Runner into a LogReport as they are logged.
+
+    Records are buffered as they arrive from worker threads, and formatted and
+    appended to the view in batches at a fixed rate in the MainThread. Only the
+    Records the view can hold are kept, so bursts of Records never back up.
+
+    Arguments:
+        view (LogReport): View to append Records to.
+        interval (int): Milliseconds between batches.
+    """
+
+    def __init__(self, view, interval=250, parent=None):
+        super(LiveReport, self).__init__(parent)
+        self.view = view
+        self.lock = threading.Lock()
+        self.pending = deque(maxlen=view.max_blocks)
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+
+    def append(self, record):
+        """Buffer a Record. Called from worker threads."""
+
+        if record.type not in ("flow", "task"):
+            return
+        with self.lock:
+            self.pending.append(record)
+
+    def flush(self):
+        with self.lock:
+            records = list(self.pending)
+            self.pending.clear()
+        if not records:
+            return
+
+        lines = []
+        for record in records:
+            lines.extend(format_live_html_record(record))
+        self.view.append_html("\n".join(lines))
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+        self.flush()
+
+
+def write_lines(path, lines):
+    """Write lines to a file as they are generated, replacing it when done."""
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line)
+                f.write("\n")
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+def write_report(path, runner, spool=None, since=None):
+    """Write the plain text report of a Runner, and the jobs of a Spool, to path."""
+
+    def lines():
+        yield from iter_report(runner)
+        if spool:
+            yield generate_spool_report(spool, since)
+
+    return write_lines(path, lines())
+
+
+def write_html_report(path, runner, spool=None, since=None):
+    """Write the html report of a Runner, and the jobs of a Spool, to path."""
+
+    def lines():
+        yield '<html><body style="background: #222222;">'
+        yield from iter_html_report(runner)
+        if spool:
+            yield generate_spool_html_report(spool, since)
+        yield "</body></html>"
+
+    return write_lines(path, lines())
+
+
+def compress(path):
+    """Gzip a file next to itself and remove the original."""
+
+    gz_path = path + ".gz"
+    with open(path, "rb") as src, gzip.open(gz_path, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
+    return gz_path
+
+
+class ReportWriter(QtCore.QThread):
+    """Writes the full html report of a Runner to a file.
+
+    The report is grouped by Flow, and includes the jobs of a Spool when given.
+
+    Arguments:
+        path (str): Path to write the report to.
+        runner (Runner): Runner to report.
+        spool (Spool): Optional Spool to report jobs of.
+        since (float): Only report Spool jobs added since this time.
+    """
+
+    written = QtCore.Signal(str)
+    failed = QtCore.Signal(str)
+
+    def __init__(self, path, runner, spool=None, since=None, parent=None):
+        super(ReportWriter, self).__init__(parent)
+        self.path = path
+        self.runner = runner
+        self.spool = spool
+        self.since = since
+
+    def run(self):
+        try:
+            write_html_report(self.path, self.runner, self.spool, self.since)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.written.emit(self.path)
+
+
+class ReportSender(QtCore.QThread):
+    """Sends the report of a Runner in the background.
+
+    The full plain text and html reports are written to directory and gzipped.
+    Then send is called with a short summary of the Runner, in plain text and
+    html, and the paths to the gzipped reports. The directory is removed once
+    send returns.
+
+    Arguments:
+        send (callable): Called with summary, html_summary and attachments.
+        directory (str): Directory to write the reports to.
+        name (str): Name of the report files.
+        runner (Runner): Runner to report.
+        spool (Spool): Optional Spool to report jobs of.
+        since (float): Only report Spool jobs added since this time.
+    """
+
+    sent = QtCore.Signal()
+    failed = QtCore.Signal(str)
+
+    def __init__(
+        self,
+        send,
+        directory,
+        name,
+        runner,
+        spool=None,
+        since=None,
+        parent=None,
+    ):
+        super(ReportSender, self).__init__(parent)
+        self.send = send
+        self.directory = directory
+        self.name = name
+        self.runner = runner
+        self.spool = spool
+        self.since = since
+
+    def run(self):
+        path = os.path.join(self.directory, self.name)
+        try:
+            attachments = [
+                compress(
+                    write_report(path + ".txt", self.runner, self.spool, self.since)
+                ),
+                compress(
+                    write_html_report(path + ".html", self.runner, self.spool, self.since)
+                ),
+            ]
+            summary = generate_summary(self.runner)
+            html_summary = "<pre>%s</pre>" % html.escape(summary)
+            self.send(summary, html_summary, attachments)
+        except Exception:
+            self.failed.emit(traceback.format_exc())
+            return
+        finally:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        self.sent.emit()
@@ -0,0 +1,240 @@
+import http.client
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+
+def create_connection():
+    """Create a new authenticated ShotGrid connection."""
+
+    from sgtk.util.shotgun import create_sg_connection
+
+    return create_sg_connection()
+
+
+def get_network_errors():
+    errors = [OSError, http.client.HTTPException]
+    for module in ["tank_vendor.shotgun_api3", "shotgun_api3"]:
+        try:
+            errors.append(importlib.import_module(module).ProtocolError)
+            break
+        except ImportError:
+            continue
+    return tuple(errors)
+
+
+# Exceptions raised by transient failures communicating with ShotGrid.
+NETWORK_ERRORS = get_network_errors()
+
+
+class ConnectionPool(object):
+    """Reusable ShotGrid connections shared by all tasks and runs.
+
+    A ShotGrid connection is not thread safe, so a connection is only used by one
+    thread at a time. Released connections are handed back to the thread that last
+    used them, so each worker thread keeps reusing a single connection instead of
+    authenticating and handshaking for every task.
+
+    Connections that have been idle longer than health_check_interval, or that were
+    in use when an exception was raised, are checked before they are reused.
+
+    Arguments:
+        factory (callable): Returns a new connection. Defaults to create_connection.
+        health_check_interval (float): Seconds a connection may be idle before it
+            must pass a health check to be reused.
+    """
+
+    def __init__(self, factory=None, health_check_interval=60):
+        self.factory = factory or create_connection
+        self.health_check_interval = health_check_interval
+        self.lock = threading.Lock()
+        self.idle = []
+        self.connections_created = 0
+
+    def connect(self):
+        with self.lock:
+            self.connections_created += 1
+        return {
+            "sg": self.factory(),
+            "thread": None,
+            "last_used": time.time(),
+            "healthy": True,
+        }
+
+    def is_healthy(self, entry):
+        if entry["healthy"] and (
+            time.time() - entry["last_used"] < self.health_check_interval
+        ):
+            return True
+
+        try:
+            entry["sg"].info()
+            return True
+        except Exception:
+            return False
+
+    def discard(self, entry):
+        try:
+            entry["sg"].close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """Get a connection for the current thread."""
+
+        thread = threading.get_ident()
+        entry = None
+        with self.lock:
+            for i, idle_entry in enumerate(self.idle):
+                if idle_entry["thread"] == thread:
+                    entry = self.idle.pop(i)
+                    break
+            else:
+                if self.idle:
+                    entry = self.idle.pop()
+
+        if entry and not self.is_healthy(entry):
+            self.discard(entry)
+            entry = None
+
+        if not entry:
+            entry = self.connect()
+
+        entry["thread"] = thread
+        return entry
+
+    def release(self, entry, healthy=True):
+        """Return a connection to the pool."""
+
+        entry["last_used"] = time.time()
+        entry["healthy"] = healthy
+        with self.lock:
+            self.idle.append(entry)
+
+    @contextmanager
+    def connection(self):
+        """Context yielding a ShotGrid connection for the current thread."""
+
+        entry = self.acquire()
+        healthy = True
+        try:
+            yield entry["sg"]
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            self.release(entry, healthy)
+
+    def clear(self):
+        """Close all idle connections."""
+
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for entry in idle:
+            self.discard(entry)
+
+
+pool = ConnectionPool()
+
+
+def connection():
+    """Context yielding a pooled ShotGrid connection for the current thread."""
+
+    return pool.connection()
+
+
+class TokenBucket(object):
+    """Limits throughput to <rate> bytes per second.
+
+    Consumers may overdraw the bucket, and then sleep until it refills. Shared by
+    many threads, they are limited to <rate> bytes per second between them.
+
+    Arguments:
+        rate (float): Bytes per second. A rate of 0 disables the limit.
+        burst (float): Seconds worth of bytes allowed to be consumed at once.
+    """
+
+    def __init__(self, rate=0, burst=0.1):
+        self.lock = threading.Lock()
+        self.burst = burst
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.rate = rate
+            self.capacity = rate * self.burst
+            self.tokens = self.capacity
+            self.timestamp = time.monotonic()
+
+    def consume(self, amount):
+        if not self.rate:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.timestamp) * self.rate,
+            )
+            self.timestamp = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate
+
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ThrottledReader(object):
+    """Wraps a file object, limiting reads by a list of TokenBuckets.
+
+    Arguments:
+        fileobj (file): Binary file object to read from.
+        buckets (list): TokenBuckets to consume read bytes from.
+        on_read (callable): Called with the number of bytes read after each read.
+    """
+
+    def __init__(self, fileobj, buckets, on_read=None):
+        self.fileobj = fileobj
+        self.buckets = buckets
+        self.on_read = on_read
+
+    def __getattr__(self, attr):
+        return getattr(self.fileobj, attr)
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        for bucket in self.buckets:
+            bucket.consume(len(data))
+        if self.on_read:
+            self.on_read(len(data))
+        return data
+
+
+@contextmanager
+def throttled_uploads(sg, buckets, on_read=None):
+    """Context limiting the bandwidth of uploads made with a ShotGrid connection.
+
+    Applies to uploads sent directly to cloud storage, which includes all uploads to
+    hosted ShotGrid sites. Every chunk of data sent is read through a ThrottledReader.
+    """
+
+    upload_data_to_storage = sg._upload_data_to_storage
+
+    def throttled_upload_data_to_storage(data, content_type, size, storage_url):
+        return upload_data_to_storage(
+            ThrottledReader(data, buckets, on_read),
+            content_type,
+            size,
+            storage_url,
+        )
+
+    sg._upload_data_to_storage = throttled_upload_data_to_storage
+    try:
+        yield sg
+    finally:
+        del sg._upload_data_to_storage
+
+
+# Upload bandwidth shared by all renders on this machine.
+machine_bandwidth = TokenBucket()
@@ -0,0 +1,410 @@
+import html
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+from . import const, files, shotgun
+from .vendor.qtpy import QtCore
+
+handlers = {}
+
+
+def handler(kind):
+    """Register a function used by the SpoolDrainer to process jobs of <kind>.
+
+    Handlers are called with the SpoolDrainer, a ShotGrid connection and the job.
+    They return a json serializable result that is stored with the job.
+    """
+
+    def register(fn):
+        handlers[kind] = fn
+        return fn
+
+    return register
+
+
+class Deferred(Exception):
+    """Raised by a handler when a job is waiting on another job."""
+
+
+class Spool(object):
+    """Durable queue of ShotGrid jobs stored in a SQLite database.
+
+    Tasks put jobs in the Spool instead of waiting on ShotGrid, so a render finishes
+    at full speed even when ShotGrid is slow or unreachable. A SpoolDrainer replays
+    jobs in the order they were added. Failed jobs are retried with exponential
+    backoff until max_attempts is reached.
+
+    Files a job needs, like the media of an upload, are copied into the spool with
+    keep_file, so they are still there when the job runs even if the render that made
+    them deletes them. They are removed when the job succeeds.
+
+    The database is shared by every AE session using the same cache location. A
+    claimed job is leased to the Spool that claimed it, and only returns to the queue
+    when its lease expires without being renewed, like when AE crashes mid upload.
+
+    Arguments:
+        path (str): Path to the SQLite database.
+        max_attempts (int): Number of attempts before a job is marked Failed.
+        backoff (float): Seconds to wait before the first retry. Doubles per attempt.
+        max_backoff (float): Maximum seconds to wait between attempts.
+        lease (float): Seconds a claimed job is held without being renewed.
+    """
+
+    def __init__(self, path, max_attempts=8, backoff=5, max_backoff=600, lease=120):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self.media_root = os.path.join(os.path.dirname(path), "spool_media")
+        self.lock = threading.Lock()
+        self.added = threading.Event()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    label TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+                """
+            )
+            columns = [
+                row["name"] for row in self.db.execute("PRAGMA table_info(jobs)")
+            ]
+            new_columns = [("files", "TEXT"), ("owner", "TEXT"), ("lease", "REAL")]
+            for column, kind in new_columns:
+                if column not in columns:
+                    self.db.execute(
+                        "ALTER TABLE jobs ADD COLUMN %s %s" % (column, kind)
+                    )
+
+    def keep_file(self, path):
+        """Copy a file into the spool and return the path of the copy.
+
+        Pass the copy to put in files, so it is removed when the job succeeds.
+        """
+
+        dst = os.path.join(self.media_root, uuid.uuid4().hex, os.path.basename(path))
+        return files.copy_file(path, dst)
+
+    def remove_files(self, paths):
+        """Remove files kept with keep_file."""
+
+        for path in paths:
+            folder = os.path.dirname(path)
+            if os.path.dirname(folder) == self.media_root:
+                shutil.rmtree(folder, ignore_errors=True)
+
+    def put(self, kind, label, payload, files=None):
+        """Add a job to the spool and return its id.
+
+        Arguments:
+            kind (str): Kind of job, used to look up its handler.
+            label (str): Label of the job shown in reports.
+            payload (dict): Json serializable data passed to the handler.
+            files (list): Files kept with keep_file, removed when the job succeeds.
+        """
+
+        now = time.time()
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT INTO jobs "
+                "(kind, label, payload, status, next_attempt, created, updated, files) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    kind,
+                    label,
+                    json.dumps(payload),
+                    const.Waiting,
+                    now,
+                    now,
+                    now,
+                    json.dumps(files or []),
+                ),
+            )
+        self.added.set()
+        return cursor.lastrowid
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self.to_job(row) if row else None
+
+    def claim(self):
+        """Get the next job that is due, mark it Running and lease it to this Spool.
+
+        Jobs left Running by a Spool whose lease expired are returned to the queue
+        first. The claim is a single write transaction, so two AE sessions sharing
+        the database never claim the same job.
+        """
+
+        now = time.time()
+        with self.lock:
+            try:
+                self.db.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                # Another session is writing to the spool, try again later.
+                return None
+            try:
+                self.db.execute(
+                    "UPDATE jobs SET status = ?, owner = NULL, lease = NULL "
+                    "WHERE status = ? AND (lease IS NULL OR lease < ?)",
+                    (const.Waiting, const.Running, now),
+                )
+                row = self.db.execute(
+                    "SELECT * FROM jobs WHERE status = ? AND next_attempt <= ? "
+                    "ORDER BY next_attempt, id LIMIT 1",
+                    (const.Waiting, now),
+                ).fetchone()
+                if row:
+                    self.db.execute(
+                        "UPDATE jobs SET status = ?, owner = ?, lease = ?, updated = ? "
+                        "WHERE id = ?",
+                        (const.Running, self.owner, now + self.lease, now, row["id"]),
+                    )
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        if not row:
+            return None
+        job = self.to_job(row)
+        job.update(status=const.Running, owner=self.owner, lease=now + self.lease)
+        return job
+
+    def renew(self, job_id):
+        """Extend the lease of a job claimed by this Spool.
+
+        Returns False when the job is no longer leased to this Spool.
+        """
+
+        with self.lock:
+            cursor = self.db.execute(
+                "UPDATE jobs SET lease = ? WHERE id = ? AND status = ? AND owner = ?",
+                (time.time() + self.lease, job_id, const.Running, self.owner),
+            )
+        return cursor.rowcount > 0
+
+    def complete(self, job_id, result):
+        with self.lock:
+            self.db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, updated = ?, "
+                "owner = NULL, lease = NULL WHERE id = ?",
+                (const.Success, json.dumps(result, default=str), time.time(), job_id),
+            )
+            row = self.db.execute(
+                "SELECT files FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        self.remove_files(json.loads(row["files"] or "[]") if row else [])
+
+    def retry(self, job_id, error=None, delay=None):
+        """Schedule a job to run again.
+
+        When delay is None, the attempt counts towards max_attempts and the job is
+        delayed by the exponential backoff.
+        """
+
+        now = time.time()
+        with self.lock:
+            attempts = self.db.execute(
+                "SELECT attempts FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()["attempts"]
+            status = const.Waiting
+            if delay is None:
+                attempts += 1
+                delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+                if attempts >= self.max_attempts:
+                    status = const.Failed
+            self.db.execute(
+                "UPDATE jobs SET status = ?, attempts = ?, next_attempt = ?, "
+                "error = COALESCE(?, error), updated = ?, owner = NULL, lease = NULL "
+                "WHERE id = ?",
+                (status, attempts, now + delay, error, now, job_id),
+            )
+        return status
+
+    def requeue(self, job_id):
+        """Reset a Failed job so it is attempted again."""
+
+        with self.lock:
+            self.db.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, next_attempt = ?, "
+                "owner = NULL, lease = NULL WHERE id = ?",
+                (const.Waiting, time.time(), job_id),
+            )
+
+    def jobs(self, since=None):
+        """Get unfinished jobs and jobs added since the given time."""
+
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT * FROM jobs WHERE status != ? OR created >= ? ORDER BY id",
+                (const.Success, since or time.time()),
+            ).fetchall()
+        return [self.to_job(row) for row in rows]
+
+    def purge(self, older_than=7 * 24 * 60 * 60):
+        """Remove successful jobs older than <older_than> seconds."""
+
+        with self.lock:
+            self.db.execute(
+                "DELETE FROM jobs WHERE status = ? AND updated < ?",
+                (const.Success, time.time() - older_than),
+            )
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def to_job(self, row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["files"] = json.loads(job["files"]) if job["files"] else []
+        return job
+
+
+class SpoolDrainer(QtCore.QThread):
+    """Processes the jobs in a Spool in the background.
+
+    Arguments:
+        spool (Spool): The Spool to drain.
+        tk (sgtk.Sgtk): Toolkit API instance passed to job handlers.
+        log (logging.Logger): Logger used to report job failures.
+        interval (float): Seconds to wait when no job is due.
+    """
+
+    job_changed = QtCore.Signal(dict)
+
+    def __init__(self, spool, tk=None, log=None, interval=2, *args, **kwargs):
+        super(SpoolDrainer, self).__init__(*args, **kwargs)
+        self.spool = spool
+        self.tk = tk
+        self.log = log or logging.getLogger(__name__)
+        self._interval = interval
+        self._stopRequested = False
+
+    def stop(self):
+        self._stopRequested = True
+        self.spool.added.set()
+
+    def run(self):
+        while not self._stopRequested:
+            job = self.spool.claim()
+            if not job:
+                self.spool.added.wait(self._interval)
+                self.spool.added.clear()
+                continue
+            self.job_changed.emit(job)
+            self.process(job)
+            self.job_changed.emit(self.spool.get(job["id"]))
+
+    def process(self, job):
+        # Keep the job leased while it runs, so other AE sessions sharing the
+        # spool don't claim it during a long upload.
+        processed = threading.Event()
+
+        def renew_lease():
+            while not processed.wait(self.spool.lease / 3):
+                self.spool.renew(job["id"])
+
+        threading.Thread(target=renew_lease, daemon=True).start()
+        try:
+            fn = handlers[job["kind"]]
+            with shotgun.connection() as sg:
+                result = fn(self, sg, job)
+        except Deferred:
+            self.spool.retry(job["id"], delay=self._interval)
+        except Exception:
+            self.log.exception("Spooled %s job failed: %s", job["kind"], job["label"])
+            status = self.spool.retry(job["id"], traceback.format_exc())
+            if status == const.Failed:
+                self.log.error("Giving up on %s job: %s", job["kind"], job["label"])
+        else:
+            self.spool.complete(job["id"], result)
+        finally:
+            processed.set()
+
+
+def describe_job(job):
+    """Get a short description of the state of a job."""
+
+    if job["status"] == const.Waiting:
+        wait = job["next_attempt"] - time.time()
+        if job["attempts"] and wait > 0:
+            return "retry %d in %ds" % (job["attempts"] + 1, wait)
+        return "queued"
+    if job["status"] == const.Failed:
+        return "gave up after %d attempts" % job["attempts"]
+    return ""
+
+
+def generate_report(spool, since=None):
+    """Generate a plain text report of the jobs in a Spool."""
+
+    report = []
+    for job in spool.jobs(since):
+        report.append(
+            "  %s %s - %s %s"
+            % (job["kind"], job["label"], job["status"], describe_job(job))
+        )
+        if job["status"] == const.Failed and job["error"]:
+            report.append(job["error"])
+    if report:
+        report.insert(0, "ShotGrid Spool")
+    return "\n".join(report)
+
+
+def format_html_job(job):
+    """Format a spooled job as an html line."""
+
+    color = {const.Failed: "#EB5757", const.Success: "#AFAFAF"}.get(
+        job["status"], "#CFCFCF"
+    )
+    return (
+        '<pre style="margin: 0px;">   %s <em style="color: %s;">%s</em> %s %s</pre>'
+        % (
+            html.escape(job["kind"]),
+            color,
+            job["status"],
+            html.escape(job["label"]),
+            describe_job(job),
+        )
+    )
+
+
+def generate_html_report(spool, since=None):
+    """Generate an html report of the jobs in a Spool."""
+
+    report = [format_html_job(job) for job in spool.jobs(since)]
+    if report:
+        report.insert(
+            0,
+            '<pre style="font-family: Roboto; font-size: 14px;color: #DDDDDD;">'
+            "  ShotGrid Spool</pre>",
+        )
+    return "\n".join(report)
@@ -1,8 +1,12 @@
 import os
+import sys
+import threading
+import time
 
-from .. import const
+from .. import const, files, fingerprint
 from ..render import AERenderSubprocess
-from .core import SyncTask, Task, fit
+from .core import SyncTask, Task, fit, post_in_main
+from .events import FrameTimes
 
 
 class AERenderFailed(Exception):
@@ -11,6 +15,7 @@ class AERenderFailed(Exception):
 
 class AERenderComp(SyncTask):
     step = const.Rendering
+    default_estimate = 60.0
 
     def __init__(
         self,
@@ -23,6 +28,7 @@ class AERenderComp(SyncTask):
         **kwargs,
     ):
         self.async_render = kwargs.pop("async_render", False)
+        self.skip_existing = kwargs.pop("skip_existing", False)
         self.project = project
         self.comp = comp
         self.output_module = output_module
@@ -50,15 +56,19 @@ class AERenderComp(SyncTask):
                 "Failed to create output folder %s" % self.output_folder
             ) from e
 
-        # Apply render setting template
-        self.log.debug("Applying Render Setting [%s]", self.render_settings)
-        rq_item.applyTemplate(self.render_settings)
-        self.set_status(const.Running, 20)
+        with self.trace("applyTemplate"):
+            # Apply render setting template
+            self.log.debug("Applying Render Setting [%s]", self.render_settings)
+            rq_item.applyTemplate(self.render_settings)
+            if self.skip_existing:
+                self.log.debug("Skipping existing frames...")
+                rq_item.setSetting("Skip Existing Files", True)
+            self.set_status(const.Running, 20)
 
-        # Apply output module template
-        self.log.debug("Applying Output Module [%s]", self.output_module)
-        om.applyTemplate(self.output_module)
-        self.set_status(const.Running, 40)
+            # Apply output module template
+            self.log.debug("Applying Output Module [%s]", self.output_module)
+            om.applyTemplate(self.output_module)
+            self.set_status(const.Running, 40)
 
         # Apply output path
         self.log.debug("Setting Full Flat Path: %s" % self.output_path)
@@ -70,10 +80,11 @@ class AERenderComp(SyncTask):
         if self.status_request == const.Cancelled:
             return self.accept(const.Cancelled)
 
-        if self.async_render:
-            success = app.engine.render_queue_item_async(rq_item)
-        else:
-            success = app.engine.render_queue_item(rq_item)
+        with self.trace("render"):
+            if self.async_render:
+                success = app.engine.render_queue_item_async(rq_item)
+            else:
+                success = app.engine.render_queue_item(rq_item)
 
         if not success:
             raise AERenderFailed("Failed to render queue item: %s" % self.comp)
@@ -81,9 +92,255 @@ class AERenderComp(SyncTask):
         self.set_status(const.Running, 100)
         return self.output_path
 
+    def get_stats(self):
+        return get_render_stats(self, seconds=self.duration)
+
+    def estimate_duration(self, history):
+        return estimate_render_duration(self, history)
+
+
+class AERenderBatch(object):
+    """Renders the comps of many BatchAERenderComp tasks in one renderAsync pass.
+
+    All comps are enqueued and configured up front in the MainThread. Each item is
+    released as soon as AE finishes rendering it, allowing its Flow to continue on to
+    encoding while the rest of the batch renders.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = []
+        self.items_by_comp = {}
+        self.started = False
+        self.finished = False
+
+    def add(
+        self,
+        comp,
+        output_module,
+        render_settings,
+        output_path,
+        skip_existing=False,
+    ):
+        item = {
+            "comp": comp,
+            "output_module": output_module,
+            "render_settings": render_settings,
+            "output_path": output_path,
+            "skip_existing": skip_existing,
+            "status": const.Waiting,
+            "cancelled": False,
+            "error": None,
+            "done": threading.Event(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        self.items.append(item)
+        self.items_by_comp[comp] = item
+        return item
+
+    def get(self, comp):
+        return self.items_by_comp[comp]
+
+    def start(self, app):
+        """Start rendering the batch. Only the first call has any effect."""
+
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        post_in_main(self.render, app)
+
+    def cancel(self, comp):
+        """Skip rendering a comp. Returns False if the comp is already rendering."""
+
+        item = self.items_by_comp[comp]
+        with self.lock:
+            if item["status"] != const.Waiting:
+                return False
+            item["cancelled"] = True
+            self.set_item_status(item, const.Cancelled)
+        return True
+
+    def set_item_status(self, item, status, error=None):
+        item["status"] = status
+        item["error"] = error or item["error"]
+        if status == const.Running and item["started_at"] is None:
+            item["started_at"] = time.monotonic()
+        if status in const.DoneList:
+            item["finished_at"] = time.monotonic()
+            item["done"].set()
+
+    def configure(self, app, item):
+        """Enqueue and configure a comp. Runs in the MainThread."""
+
+        os.makedirs(os.path.dirname(item["output_path"]), exist_ok=True)
+        comp_item = app.engine.get_comp(item["comp"])
+        rq_item = app.engine.enqueue_comp(comp_item)
+        rq_item.applyTemplate(item["render_settings"])
+        if item["skip_existing"]:
+            rq_item.setSetting("Skip Existing Files", True)
+        om = rq_item.outputModule(1)
+        om.applyTemplate(item["output_module"])
+        app.engine.set_file_info(om, {"Full Flat Path": item["output_path"]})
+        return rq_item
+
+    def render(self, app):
+        """Configure and render all items. Runs in the MainThread."""
+
+        RQItemStatus = app.engine.adobe.RQItemStatus
+        try:
+            items = []
+            rq_items = []
+            for item in self.items:
+                if item["cancelled"]:
+                    continue
+                try:
+                    rq_items.append(self.configure(app, item))
+                    items.append(item)
+                except Exception:
+                    self.set_item_status(item, const.Failed, sys.exc_info())
+
+            def on_status_changed(index, status):
+                item = items[index]
+                if item["cancelled"]:
+                    return
+                with self.lock:
+                    if status == RQItemStatus.DONE:
+                        self.set_item_status(item, const.Success)
+                    elif status in [
+                        RQItemStatus.RENDERING,
+                        RQItemStatus.WILL_CONTINUE,
+                    ]:
+                        self.set_item_status(item, const.Running)
+                    elif status != RQItemStatus.QUEUED:
+                        self.set_item_status(item, const.Failed)
+
+            def is_revoked(index):
+                return items[index]["cancelled"]
+
+            if rq_items:
+                app.engine.render_queue_items_async(
+                    rq_items,
+                    on_status_changed=on_status_changed,
+                    is_revoked=is_revoked,
+                )
+        except Exception:
+            error = sys.exc_info()
+            for item in self.items:
+                if item["status"] not in const.DoneList:
+                    self.set_item_status(item, const.Failed, error)
+        finally:
+            # Anything left unfinished was never rendered by AE.
+            for item in self.items:
+                if item["status"] not in const.DoneList:
+                    self.set_item_status(item, const.Failed)
+            self.finished = True
+
+
+class BatchAERenderComp(Task):
+    """Waits for a comp to be rendered by an AERenderBatch."""
+
+    step = const.Rendering
+    default_estimate = 60.0
+
+    def __init__(
+        self,
+        project,
+        comp,
+        output_module,
+        render_settings,
+        output_path,
+        batch,
+        *args,
+        **kwargs,
+    ):
+        self.project = project
+        self.comp = comp
+        self.output_module = output_module
+        self.render_settings = render_settings
+        self.output_path = output_path
+        self.output_folder = os.path.dirname(output_path)
+        self.batch = batch
+        self.item = self.batch.add(
+            comp,
+            output_module,
+            render_settings,
+            output_path,
+            skip_existing=kwargs.pop("skip_existing", False),
+        )
+        self.item["task"] = self
+        super(BatchAERenderComp, self).__init__(*args, **kwargs)
+
+    def predecessor(self):
+        # AE renders the comps of a batch one at a time, in order.
+        index = self.batch.items.index(self.item)
+        return self.batch.items[index - 1].get("task") if index else None
+
+    def remaining(self):
+        # Time the render from when AE started rendering this comp, not from when
+        # the task started waiting on the batch.
+        if self.status in const.DoneList:
+            return 0.0
+        estimate = self.estimate or self.default_estimate
+        if self.item["started_at"] is None:
+            return estimate
+        return max(estimate - (time.monotonic() - self.item["started_at"]), 0.0)
+
+    def execute(self):
+        # Get required context data
+        app = self.context["app"]
+        item = self.batch.get(self.comp)
+
+        # Check for cancelled before rendering - once started we can't cancel.
+        if self.status_request == const.Cancelled and self.batch.cancel(self.comp):
+            return self.accept(const.Cancelled)
+
+        self.log.debug("Starting batch render...")
+        self.batch.start(app)
+        self.set_status(const.Running, 10)
+
+        while not item["done"].wait(1):
+            if self.status_request == const.Cancelled and self.batch.cancel(self.comp):
+                return self.accept(const.Cancelled)
+            if item["status"] == const.Running and self.progress < 50:
+                self.log.debug("Rendering...")
+                self.mark("rendering")
+                self.set_status(const.Running, 50)
+
+        if item["status"] == const.Cancelled:
+            return self.accept(const.Cancelled)
+
+        if item["status"] != const.Success:
+            error = item["error"]
+            if error:
+                raise AERenderFailed(
+                    "Failed to render queue item: %s" % self.comp
+                ) from error[1]
+            raise AERenderFailed("Failed to render queue item: %s" % self.comp)
+
+        self.set_status(const.Running, 100)
+        return self.output_path
+
+    def get_render_seconds(self):
+        """Seconds AE spent rendering the comp, excluding the wait for earlier comps
+        of the batch, or None when AE never reported it rendering."""
+
+        item = self.batch.get(self.comp)
+        if item["started_at"] is None or item["finished_at"] is None:
+            return None
+        return item["finished_at"] - item["started_at"]
+
+    def get_stats(self):
+        return get_render_stats(self, seconds=self.get_render_seconds())
+
+    def estimate_duration(self, history):
+        return estimate_render_duration(self, history)
+
 
 class BackgroundAERenderComp(Task):
     step = const.Rendering
+    default_estimate = 60.0
 
     def __init__(
         self,
@@ -101,13 +358,115 @@ class BackgroundAERenderComp(Task):
         self.render_settings = render_settings
         self.output_path = output_path
         self.output_folder = os.path.dirname(output_path)
+        self.frame_range = kwargs.pop("frame_range", None)
+        self.state_path = None
+        self.render = None
+        self.render_progress = (20, 100)
+        self.render_started = None
+        self.rendered_frames = None
+        self.reset_frames()
         super(BackgroundAERenderComp, self).__init__(*args, **kwargs)
 
+    def reset_frames(self):
+        self.frames_total = None
+        self.frames_done = 0
+        self.frame = 0
+        self.first_frame = None
+        self.first_frame_at = None
+        self.frame_times = FrameTimes()
+        self.range_start = None
+        self.last_frame_at = None
+
     def on_render_status_changed(self, event):
         self.set_status(event["status"])
 
     def on_render_progress_changed(self, event):
-        self.set_status(const.Running, fit(event["progress"], 0, 100, 20, 100))
+        if self.render_started and self.flow:
+            # Time from launching aerender to the first rendered frame.
+            self.flow.add_span(
+                "aerender startup",
+                self.render_started,
+                time.monotonic(),
+                "task",
+            )
+            self.mark("first frame")
+            self.render_started = None
+        self.record_frame_time(event)
+        self.frame = event["frame"]
+        self.frames_total = self.frames_total or event["frames"]
+        if self.first_frame_at is None:
+            self.first_frame_at = time.monotonic()
+            self.first_frame = self.frames_done + self.frame
+        progress = fit(event["progress"], 0, 100, *self.render_progress)
+        self.set_status(const.Running, progress)
+
+    def record_frame_time(self, event):
+        # aerender reports whole seconds per frame, so time frames by the interval
+        # between progress lines. The first frame of a range includes aerender's
+        # startup, so it uses the reported seconds instead.
+        # aerender counts frames from 1, so they are offset by the first frame of
+        # the range being rendered. Whole comps start at the first frame of
+        # frame_range, or of the comp's work area when frame_range is unknown.
+        now = time.monotonic()
+        if event["frame"] > self.frame:
+            if self.last_frame_at is None:
+                seconds = event["seconds"]
+            else:
+                seconds = now - self.last_frame_at
+            frame = event["frame"]
+            if self.range_start is not None:
+                frame += self.range_start - 1
+            elif self.frame_range:
+                frame += self.frame_range[0] - 1
+            elif self.context.get("start_frame") is not None:
+                frame += self.context["start_frame"] - 1
+            self.frame_times.add(frame, seconds)
+        self.last_frame_at = now
+
+    def get_frame_ranges(self):
+        """Get the frame ranges of an image sequence that need to be rendered.
+
+        Frames of an interrupted render of the same project, comp and templates are
+        kept, so only missing or truncated frames are rendered again. The state of a
+        render is removed when it succeeds, so finished renders are rendered again in
+        full.
+
+        Returns:
+            list: (first, last) frame ranges. (None, None) renders the whole comp.
+        """
+
+        if not self.frame_range:
+            return [(None, None)]
+
+        state_path = fingerprint.get_render_state_path(self.output_path, self.comp)
+        render_fingerprint = fingerprint.generate_fingerprint(
+            {
+                "project": self.project,
+                "comp": self.comp,
+                "output_module": self.output_module,
+                "render_settings": self.render_settings,
+                "output_path": self.output_path,
+                "frame_range": self.frame_range,
+            }
+        )
+        self.state_path = state_path
+        state = fingerprint.read_json(state_path)
+        if not state or state.get("fingerprint") != render_fingerprint:
+            fingerprint.write_json(
+                state_path,
+                {"fingerprint": render_fingerprint, "started": time.time()},
+            )
+            return [(None, None)]
+
+        missing = files.find_missing_frames(
+            self.output_path,
+            *self.frame_range,
+            since=state["started"],
+        )
+        if missing is None:
+            self.log.debug("Existing frames do not match the comp's frame range.")
+            return [(None, None)]
+        return files.get_frame_ranges(missing)
 
     def request(self, status):
         self.log.debug("%s requested..." % status.upper())
@@ -132,44 +491,154 @@ class BackgroundAERenderComp(Task):
         if self.status_request == const.Cancelled:
             return self.accept(const.Cancelled)
 
-        self.render = AERenderSubprocess(
-            project=self.project,
-            comp=self.comp,
-            omtemplate=self.output_module,
-            rstemplate=self.render_settings,
-            output=os.path.normpath(self.output_path),
-            version=self.context["host_version"],
-        )
-        self.log.debug(
-            "Render Arguments: %s" % ([self.render.executable] + self.render.arguments)
-        )
-        self.render.status_changed.connect(self.on_render_status_changed)
-        self.render.progress_changed.connect(self.on_render_progress_changed)
-        self.render.start()
-        self.set_status(const.Running, 20)
-
-        # AERenderSubprocess - uses subprocess.Popen
-        status = self.render.wait()
-        if status == const.Cancelled:
-            return self.accept(const.Cancelled)
-
-        # # AERenderProcess - uses QProcess
-        # # Check for cancel request while waiting for render to finish.
-        # while not self.render.wait(1000):
-        #     if self.status_request == const.Cancelled:
-        #         self.render.kill()
-        #         return self.accept(const.Cancelled)
-
-        # Raise Error if render process failed.
-        state = self.render.finished_state()
-        if state["status"] == const.Failed:
-            raise RuntimeError(state["message"])
+        frame_ranges = self.get_frame_ranges()
+        if not frame_ranges:
+            self.log.debug("All frames already rendered.")
+            self.rendered_frames = 0
+        elif frame_ranges[0][0] is not None:
+            self.rendered_frames = sum(end - start + 1 for start, end in frame_ranges)
+            self.log.debug(
+                "Rendering missing frames: %s",
+                ", ".join("%d-%d" % frame_range for frame_range in frame_ranges),
+            )
+
+        # Split progress between ranges by their number of frames.
+        counts = [
+            1 if start is None else end - start + 1 for start, end in frame_ranges
+        ]
+        self.reset_frames()
+        if frame_ranges and frame_ranges[0][0] is not None:
+            self.frames_total = sum(counts)
+        progress = 20
+        for (start, end), count in zip(frame_ranges, counts):
+            self.render_progress = (progress, progress + 80.0 * count / sum(counts))
+            progress = self.render_progress[1]
+            self.range_start = start
+            self.last_frame_at = None
+
+            self.render = AERenderSubprocess(
+                project=self.project,
+                comp=self.comp,
+                omtemplate=self.output_module,
+                rstemplate=self.render_settings,
+                output=os.path.normpath(self.output_path),
+                version=self.context["host_version"],
+                start=start,
+                end=end,
+            )
+            self.log.debug(
+                "Render Arguments: %s"
+                % ([self.render.executable] + self.render.arguments)
+            )
+            self.render.status_changed.connect(self.on_render_status_changed)
+            self.render.progress_changed.connect(self.on_render_progress_changed)
+
+            # AERenderSubprocess - uses subprocess.Popen
+            # The aerender span is opened first, so the aerender startup span
+            # recorded at the first frame is nested within it.
+            with self.trace("aerender", {"start": start, "end": end}):
+                self.render_started = time.monotonic()
+                self.render.start()
+                self.set_status(const.Running, self.render_progress[0])
+                status = self.render.wait()
+            if status == const.Cancelled:
+                return self.accept(const.Cancelled)
+            self.frames_done += self.frame
+            self.frame = 0
+
+            # # AERenderProcess - uses QProcess
+            # # Check for cancel request while waiting for render to finish.
+            # while not self.render.wait(1000):
+            #     if self.status_request == const.Cancelled:
+            #         self.render.kill()
+            #         return self.accept(const.Cancelled)
+
+            # Raise Error if render process failed.
+            state = self.render.finished_state()
+            if state["status"] == const.Failed:
+                raise RuntimeError(state["message"])
+
+        # The render is complete, so a rerun must not treat it as interrupted.
+        if self.state_path and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+        if self.frame_times:
+            self.log.info("Frame times:\n%s", self.frame_times.format())
 
         # Ensure progress reaches 100
         self.set_status(const.Success, 100)
 
         return self.output_path
 
+    def get_stats(self):
+        stats = get_render_stats(self, self.rendered_frames, self.duration)
+        summary = self.frame_times.summary()
+        if summary:
+            stats.update(
+                frame_p50=summary["p50"],
+                frame_p95=summary["p95"],
+                frame_max=summary["max"],
+                frame_histogram=summary["histogram"],
+                slowest_frames=summary["slowest"],
+            )
+        return stats
+
+    def estimate_duration(self, history):
+        return estimate_render_duration(self, history)
+
+    def remaining(self):
+        # Extrapolate from the frames aerender reported since the first frame.
+        frames = self.frames_done + self.frame
+        if (
+            self.status in const.DoneList
+            or not self.frames_total
+            or self.first_frame_at is None
+            or frames <= self.first_frame
+        ):
+            return super(BackgroundAERenderComp, self).remaining()
+
+        seconds_per_frame = (time.monotonic() - self.first_frame_at) / (
+            frames - self.first_frame
+        )
+        return seconds_per_frame * max(self.frames_total - frames, 0)
+
+
+def estimate_render_duration(task, history):
+    """Estimate the seconds a render task takes from the History.
+
+    Uses the median seconds per frame of its output module when the frames of
+    the comp are in its Flow's context, else the median render seconds of the task.
+    """
+
+    name = task.__class__.__name__
+    frames = task.flow.context.get("frames") if task.flow else None
+    if frames:
+        seconds_per_frame = history.seconds_per_frame(name).get(task.output_module)
+        if seconds_per_frame:
+            return seconds_per_frame * frames
+    return history.median_duration(
+        name, column="seconds", output_module=task.output_module
+    )
+
+
+def get_render_stats(task, frames=None, seconds=None):
+    """Get the stats of a render task to record in the History.
+
+    Image sequences count their rendered frames unless frames is given. seconds is
+    the time spent rendering, or None when it is unknown.
+    """
+
+    outputs = fingerprint.list_outputs(task.output_path)
+    if frames is None and files.is_sequence(task.output_path):
+        frames = len(outputs)
+    return {
+        "frames": frames or None,
+        "seconds": seconds,
+        "output_size": sum(outputs.values()),
+        "output_module": task.output_module,
+        "render_settings": task.render_settings,
+    }
+
 
 def backup(file, is_sequence=False):
     backup = file + ".tmp"
@@ -2,11 +2,14 @@ import os
 import shutil
 
 from .. import const
-from .core import Task
+from .core import TRANSIENT_ERRNOS, TRANSIENT_ERRORS, Task
 
 
 class Copy(Task):
     step = const.Copying
+    max_attempts = 4
+    retry_exceptions = TRANSIENT_ERRORS
+    retry_errnos = TRANSIENT_ERRNOS
 
     def __init__(self, src_file, dst_file, *args, **kwargs):
         self.src_file = src_file
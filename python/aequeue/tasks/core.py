@@ -1,15 +1,19 @@
+import errno
 import logging
-import re
+import os
 import sys
 import threading
-import traceback
+import time
 import uuid
 from collections import defaultdict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
 from itertools import zip_longest
-from queue import Queue
 
 from .. import const
-from ..vendor.qtpy import QtCore, QtWidgets
+from ..vendor.qtpy import QtCore
+from .events import EventLog, Log
+from .trace import Tracer
 
 __all__ = [
     "call_in_main",
@@ -18,15 +22,31 @@ __all__ = [
     "fit",
     "fit100",
     "Flow",
+    "format_html_record",
+    "format_live_html_record",
     "generate_report",
     "generate_html_report",
+    "generate_summary",
+    "iter_html_report",
+    "iter_report",
     "LogFormatter",
     "LogStreamReporter",
+    "percentile",
+    "post_in_main",
     "Runner",
     "Task",
+    "TRANSIENT_ERRNOS",
+    "TRANSIENT_ERRORS",
 ]
 
 
+logger = logging.getLogger(__name__)
+
+# Exceptions and OSError errnos raised by failures that may pass when retried, like a
+# dropped network share or a file briefly locked by another process.
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError)
+TRANSIENT_ERRNOS = (errno.EAGAIN, errno.EBUSY, errno.EIO)
+
 _stack = defaultdict(deque)
 
 
@@ -50,86 +70,83 @@ def current(stack):
         return _stack[stack][-1]
 
 
-class LogHandler(logging.Handler):
-    def __init__(self, signals, record_type):
-        super(LogHandler, self).__init__()
-        self.signals = signals
-        self.record_type = record_type
-
-    def filter(self, record):
-        record.type = self.record_type
-        self.signals.prepare_record.emit(record)
-        return super(LogHandler, self).filter(record)
-
-    def emit(self, record):
-        self.signals.emit_record.emit(record)
+class LogFormatter(object):
+    """Formats Records using %-style format strings.
 
+    Formats have access to the fields of a Record, its message and levelname, and a
+    context token holding as much context as possible.
+    """
 
-class LogFormatter(logging.Formatter):
     default_format = "%(context)s - %(message)s"
 
     def __init__(self, format=None):
-        super(LogFormatter, self).__init__(format or self.default_format)
-
-    def format(self, record):
-        # Add special token to record with as much context as possible.
-        runner_name = getattr(record, "runner_name", None)
-        flow_name = getattr(record, "flow_name", None)
-        flow_progress = getattr(record, "flow_progress", None)
-        flow_step = getattr(record, "flow_step", None)
-        task_progress = getattr(record, "task_progress", None)
+        self.format_string = format or self.default_format
 
+    def format_context(self, record):
         context = []
-        if runner_name is not None:
-            context.append(runner_name)
-        if flow_name is not None:
-            context.append(flow_name)
-        if flow_progress is not None:
-            context.append("{:>3d}%".format(int(flow_progress)))
-        if flow_step is not None:
-            context.append(flow_step)
-        if task_progress is not None:
-            context.append("{:>3d}%".format(int(task_progress)))
-        record.context = " - ".join(context)
-
-        return super(LogFormatter, self).format(record)
-
-
-class LogStreamReporter(QtCore.QObject):
-    emit_record = QtCore.Signal(object)
-
-    def __init__(self, log, parent=None):
-        super(LogStreamReporter, self).__init__(parent)
-
+        if record.runner_name is not None:
+            context.append(record.runner_name)
+        if record.flow_name is not None:
+            context.append(record.flow_name)
+        if record.flow_progress is not None:
+            context.append("{:>3d}%".format(int(record.flow_progress)))
+        if record.flow_step is not None:
+            context.append(record.flow_step)
+        if record.task_progress is not None:
+            context.append("{:>3d}%".format(int(record.task_progress)))
+        if record.task_attempt and record.task_attempt > 1:
+            context.append("attempt {}".format(record.task_attempt))
+        return " - ".join(context)
+
+    def format(self, record, **extra):
+        values = record.to_dict()
+        values["message"] = record.getMessage()
+        values["levelname"] = record.levelname
+        values["context"] = self.format_context(record)
+        values.update(extra)
+        return self.format_string % values
+
+
+class LogStreamReporter(object):
+    """Writes the Records of a Runner to stdout as they are logged."""
+
+    def __init__(self, runner):
         self.formatter = LogFormatter()
-        self.log = log
-        self.log.emit_record.connect(self.emit_record)
-        self.emit_record.connect(self.report)
+        runner.add_listener(self.report)
 
     def report(self, record):
-        sys.stdout.write(self.formatter.format(record) + "\n")
+        text = self.formatter.format(record)
+        if record.exc_text:
+            text += "\n" + record.exc_text
+        sys.stdout.write(text + "\n")
         sys.stdout.flush()
 
 
-class Log(QtCore.QObject):
-    prepare_record = QtCore.Signal(object)
-    emit_record = QtCore.Signal(object)
+class StatusStore(object):
+    """Latest step and progress of each Flow of a Runner.
 
-    def __init__(self, name, record_type, parent=None):
-        super(Log, self).__init__(parent)
+    Flows write to the store from their worker threads. The Runner reads the
+    changes at a fixed rate in the MainThread, so progress updates never flood the
+    MainThread's event queue.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.states = {}
+        self.changes = {}
 
-        self.handler = LogHandler(self, record_type)
-        self.logger = logging.getLogger(name)
-        self.logger.addFilter(self.handler)
-        self.logger.addHandler(self.handler)
-        self.setLevel(logging.DEBUG)
+    def set(self, key, state):
+        with self.lock:
+            if self.states.get(key) != state:
+                self.states[key] = state
+                self.changes[key] = state
 
-    def setLevel(self, level):
-        self.logger.setLevel(level)
-        self.handler.setLevel(level)
+    def pop_changes(self):
+        """Get the states that changed since the last call."""
 
-    def __getattr__(self, attr):
-        return getattr(self.logger, attr)
+        with self.lock:
+            changes, self.changes = self.changes, {}
+        return changes
 
 
 class TaskSignals(QtCore.QObject):
@@ -139,11 +156,26 @@ class TaskSignals(QtCore.QObject):
 
 
 class Task(QtCore.QRunnable):
-    """A single chunk of work."""
+    """A single chunk of work.
+
+    Tasks failing with one of retry_exceptions, or an OSError with one of
+    retry_errnos, are executed again, up to max_attempts times. Attempts are
+    delayed by retry_backoff seconds, doubling per attempt up to max_retry_backoff.
+
+    Flows weight the progress of their Tasks by their expected durations. Tasks
+    are expected to take default_estimate seconds, unless an estimate is set,
+    usually from the render History by estimate_duration.
+    """
 
     step = "Task"
     execute_in_main = False
     pool = None
+    max_attempts = 1
+    retry_backoff = 2.0
+    max_retry_backoff = 60.0
+    retry_exceptions = ()
+    retry_errnos = ()
+    default_estimate = 5.0
 
     def __init__(self, step=None, flow=None, parent=None):
         super(Task, self).__init__(parent)
@@ -156,11 +188,16 @@ class Task(QtCore.QRunnable):
         self.result = None
         self.error = None
         self.progress = 0
+        self.attempt = 0
+        self.queued_at = None
+        self.started_at = None
+        self.duration = None
+        self.estimate = None
+        self.stats = {}
         self.step = step or self.step
         self.context = {}
 
-        self.log = Log(str(self), record_type="task")
-        self.log.prepare_record.connect(self.prepare_record)
+        self.log = Log(self, record_type="task")
 
         self.flow = flow or current("flow")
         if self.flow:
@@ -172,18 +209,36 @@ class Task(QtCore.QRunnable):
         return "<{}:{}>".format(self.__class__.__name__, self.id)
 
     def prepare_record(self, record):
-        record.task = self
         record.task_id = self.id
         record.task_status = self.status
-        record.task_status_request = self.status_request
         record.task_progress = self.progress
-        record.task_result = self.result
-        record.task_error = self.error
+        record.task_attempt = self.attempt
         record.task_step = self.step
+        if self.flow:
+            self.flow.prepare_record(record)
+
+    def emit_record(self, record):
+        if self.flow:
+            self.flow.emit_record(record)
+        else:
+            logger.log(record.levelno, "%s - %s", self, record.getMessage())
 
     def set_context(self, context):
         self.context = context
 
+    def trace(self, name, args=None):
+        """Context recording a span of the Task in its Runner's trace."""
+
+        if self.flow:
+            return self.flow.trace(name, "task", args)
+        return nullcontext({})
+
+    def mark(self, name, args=None):
+        """Record an instant event of the Task in its Runner's trace."""
+
+        if self.flow:
+            self.flow.mark(name, "task", args)
+
     def set_status(self, status, progress=None):
         event = {
             "type": "status_changed",
@@ -193,9 +248,18 @@ class Task(QtCore.QRunnable):
             "status": status,
             "progress": progress or self.progress,
         }
-        self.status = event["status"]
         self.progress = event["progress"]
-        self.signals.status_changed.emit(event)
+        if status in const.DoneList and self.started_at:
+            self.duration = time.monotonic() - self.started_at
+        if self.flow:
+            # Report straight to the Flow instead of queueing a signal per update.
+            # The Flow moves on as soon as it sees the new status, so report first,
+            # or this task's step could overwrite the Flow's next step or Done.
+            self.flow.task_status_changed(event)
+            self.status = event["status"]
+        else:
+            self.status = event["status"]
+            self.signals.status_changed.emit(event)
         if event["status"] != event["prev_status"]:
             self.log.debug(
                 "Status changed from %s to %s."
@@ -216,24 +280,139 @@ class Task(QtCore.QRunnable):
                 return self.status
             sleep()
 
+    def is_retryable(self, error):
+        """Check if an exception, or the exception it was raised from, is retryable."""
+
+        while error:
+            if isinstance(error, self.retry_exceptions):
+                return True
+            if isinstance(error, OSError) and error.errno in self.retry_errnos:
+                return True
+            error = error.__cause__
+        return False
+
+    def get_retry_delay(self):
+        return min(self.retry_backoff * 2 ** (self.attempt - 1), self.max_retry_backoff)
+
+    def await_retry(self, delay):
+        """Wait to retry. Returns False if the Task was cancelled while waiting."""
+
+        deadline = time.time() + delay
+        while time.time() < deadline:
+            if self.status_request == const.Cancelled:
+                return False
+            time.sleep(0.1)
+        return True
+
     def run(self):
+        self.started_at = time.monotonic()
+        if self.queued_at and self.flow:
+            self.flow.add_span("queued", self.queued_at, self.started_at, "task")
+        with self.trace(self.step, {"task": self.__class__.__name__}) as args:
+            self.run_attempts()
+            args.update(status=self.status, attempts=self.attempt)
+
+    def run_attempts(self):
         self.set_status(const.Running)
-        try:
-            if self.status_request == const.Cancelled:
-                return self.accept(const.Cancelled)
-            if self.execute_in_main:
-                self.result = call_in_main(self.execute)
-            else:
-                self.result = self.execute()
-            self.set_status(const.Success)
-        except Exception:
-            self.error = sys.exc_info()
-            self.log.exception("Task failed to execute...")
-            self.set_status(const.Failed)
+        while True:
+            self.attempt += 1
+            try:
+                if self.status_request == const.Cancelled:
+                    return self.accept(const.Cancelled)
+                if self.execute_in_main:
+                    self.result = call_in_main(self.execute)
+                else:
+                    self.result = self.execute()
+                self.stats = self.collect_stats()
+                self.set_status(const.Success)
+                return
+            except Exception as e:
+                if self.attempt < self.max_attempts and self.is_retryable(e):
+                    delay = self.get_retry_delay()
+                    self.log.warning(
+                        "Attempt %d of %d failed, retrying in %0.1fs: %s",
+                        self.attempt,
+                        self.max_attempts,
+                        delay,
+                        e,
+                    )
+                    if self.await_retry(delay):
+                        continue
+                    return self.accept(const.Cancelled)
+
+                self.error = sys.exc_info()
+                self.log.exception("Task failed to execute...")
+                self.set_status(const.Failed)
+                return
 
     def execute(self):
         return NotImplemented
 
+    def get_stats(self):
+        """Get stats of a successful Task to record in the render history.
+
+        Returns:
+            dict: Any of the columns of the history's tasks table, like frames,
+                output_size, output_module or quality.
+        """
+
+        return {}
+
+    def collect_stats(self):
+        try:
+            return self.get_stats()
+        except Exception as e:
+            self.log.warning("Failed to get stats: %s", e)
+            return {}
+
+    def estimate_duration(self, history):
+        """Estimate the seconds this Task will take from a render History.
+
+        Returns:
+            float: Estimated seconds or None when there is no history.
+        """
+
+        return history.median_duration(self.__class__.__name__, step=self.step)
+
+    def remaining(self):
+        """Estimated seconds until this Task is done.
+
+        Running Tasks extrapolate their elapsed time by their progress, trusting
+        it more than their estimate as progress grows.
+        """
+
+        if self.status in const.DoneList:
+            return 0.0
+
+        estimate = self.estimate or self.default_estimate
+        if not self.started_at:
+            return estimate
+
+        elapsed = time.monotonic() - self.started_at
+        remaining = max(estimate - elapsed, 0.0)
+        if 0 < self.progress < 100:
+            weight = self.progress / 100.0
+            live = elapsed * (100 - self.progress) / self.progress
+            remaining = live * weight + remaining * (1 - weight)
+        return remaining
+
+    def predecessor(self):
+        """Task that must finish before this Task can, like an earlier comp of a
+        render batch, or None."""
+
+        return None
+
+    def expected_duration(self):
+        """Expected total seconds of this Task, used to weight its progress."""
+
+        if self.status in const.DoneList:
+            if self.duration is not None:
+                return self.duration
+            return self.estimate or self.default_estimate
+        if not self.started_at:
+            return self.estimate or self.default_estimate
+        return time.monotonic() - self.started_at + self.remaining()
+
 
 class SyncTask(Task):
     execute_in_main = True
@@ -260,10 +439,8 @@ class Flow(QtCore.QThread):
         self.current_task = None
         self.pool = QtCore.QThreadPool.globalInstance()
 
-        self.log_records = []
-        self.log = Log(str(self), record_type="flow")
-        self.log.prepare_record.connect(self.prepare_record)
-        self.log.emit_record.connect(self.emit_record)
+        self.events = EventLog()
+        self.log = Log(self, record_type="flow")
 
         self.runner = runner or current("runner")
         if self.runner:
@@ -297,34 +474,49 @@ class Flow(QtCore.QThread):
         self.context.update(context)
 
     def emit_record(self, record):
-        self.log_records.append(record)
+        self.events.append(record)
+        if self.runner:
+            self.runner.emit_record(record)
 
     def prepare_record(self, record):
-        record.flow = self
         record.flow_id = self.id
         record.flow_name = self.name
         record.flow_step = self.step
         record.flow_progress = self.progress
+        if self.runner:
+            self.runner.prepare_record(record)
 
     def add_task(self, task):
-        task.signals.status_changed.connect(self.task_status_changed)
-        task.log.prepare_record.connect(self.log.prepare_record)
-        task.log.emit_record.connect(self.log.emit_record)
+        task.flow = self
         self.tasks.append(task)
         self.tasks_by_id[task.id] = task
 
     def task_status_changed(self, event):
-        # convert task percent to flow percent
-        task = self.tasks_by_id[event["task"]]
-        task_index = self.tasks.index(task)
-        progress_per_step = 100.0 / len(self.tasks)
-        self.progress = fit100(
-            event["progress"],
-            task_index * progress_per_step,
-            (task_index * progress_per_step) + progress_per_step,
-        )
+        # Late updates from a task must not replace the final step of the Flow.
+        if self.status in const.DoneList:
+            return
+
+        # Weight the progress of each task by its expected duration, so a quick
+        # copy after a long render doesn't jump the Flow to 50 percent.
+        done = total = 0.0
+        for task in self.tasks:
+            duration = task.expected_duration()
+            status = event["status"] if task.id == event["task"] else task.status
+            progress = 100 if status == const.Success else task.progress
+            done += duration * min(progress, 100) / 100.0
+            total += duration
+        if total:
+            # Estimates change as tasks run, but progress only moves forward.
+            self.progress = max(self.progress, min(done * 100.0 / total, 100))
         self.set_step(event["step"])
 
+    def remaining(self):
+        """Estimated seconds until all Tasks of this Flow are done."""
+
+        if self.status in const.DoneList:
+            return 0.0
+        return sum(task.remaining() for task in self.tasks)
+
     def depends_on(self, dependencies):
         if not isinstance(dependencies, (list, tuple)):
             dependencies = [dependencies]
@@ -347,17 +539,40 @@ class Flow(QtCore.QThread):
 
     def set_step(self, step):
         self.step = step
-        self.step_changed.emit(
-            {
-                "flow": self.name,
-                "step": self.step,
-                "progress": self.progress,
-            }
-        )
+        event = {
+            "flow": self.name,
+            "step": self.step,
+            "progress": self.progress,
+            "eta": self.remaining(),
+        }
+        if self.runner:
+            # Runner emits step_changed for the latest state of each Flow.
+            self.runner.status_store.set(self.name, event)
+        else:
+            self.step_changed.emit(event)
 
     def get_result(self, step):
         return self.context["results_by_step"].get(step)
 
+    def trace(self, name, category="flow", args=None):
+        """Context recording a span on the Flow's track of its Runner's trace."""
+
+        if self.runner:
+            return self.runner.tracer.span(name, self.name, category, args)
+        return nullcontext({})
+
+    def add_span(self, name, start, end, category="flow", args=None):
+        if self.runner:
+            self.runner.tracer.add_span(name, self.name, start, end, category, args)
+
+    def mark(self, name, category="flow", args=None):
+        if self.runner:
+            self.runner.tracer.instant(name, self.name, category, args)
+
+    def record_task(self, task, status=None):
+        if self.runner and self.runner.journal:
+            self.runner.journal.record_task(self, task, status)
+
     def request(self, status):
         self.log.debug("%s requested..." % status.upper())
         self.status_request = status
@@ -403,8 +618,14 @@ class Flow(QtCore.QThread):
             sleep()
 
     def run(self):
+        with self.trace(self.name) as args:
+            self.run_tasks()
+            args["status"] = self.status
+
+    def run_tasks(self):
         # Wait for all dependencies to finish
-        dependencies_satisfied = self.await_dependencies()
+        with self.trace("waiting on dependencies"):
+            dependencies_satisfied = self.await_dependencies()
         if not dependencies_satisfied:
             # When an upstream dependency has Failed, Cancelled, or Revoked
             # this flow should be revoked.
@@ -426,16 +647,24 @@ class Flow(QtCore.QThread):
             self.context["task"] = task
             task.set_context(self.context)
 
-            self.log.debug("Starting...")
-            pool = task.pool or self.pool
-            pool.start(task)
-
-            # Wait for task to finish
-            upstream_status = self.await_task(task)
-            if upstream_status == const.Failed:
-                self.set_status(const.Failed)
-                self.set_step(const.Failed)
-                return
+            if task.status == const.Success:
+                # Restored from a journal by a resumed render.
+                self.log.debug("Already succeeded, skipping...")
+                task.set_status(const.Success, 100)
+            else:
+                self.log.debug("Starting...")
+                self.record_task(task, const.Running)
+                pool = task.pool or self.pool
+                task.queued_at = time.monotonic()
+                pool.start(task)
+
+                # Wait for task to finish
+                upstream_status = self.await_task(task)
+                self.record_task(task)
+                if upstream_status == const.Failed:
+                    self.set_status(const.Failed)
+                    self.set_step(const.Failed)
+                    return
 
             self.context["results"][task.id] = task.result
             self.context["results_by_step"][task.step] = task.result
@@ -455,6 +684,10 @@ class Runner(QtCore.QThread):
 
     status_changed = QtCore.Signal(str)
     step_changed = QtCore.Signal(dict)
+    eta_changed = QtCore.Signal(float)
+
+    # Rate at which step_changed is emitted for Flows with new steps or progress.
+    status_rate = 20
 
     def __init__(self, name, flows=None, parent=None):
         super(Runner, self).__init__(parent)
@@ -464,11 +697,22 @@ class Runner(QtCore.QThread):
         self.status = const.Waiting
         self.status_request = None
         self.pool = QtCore.QThreadPool.globalInstance()
-
-        self.log_records = []
-        self.log = Log(str(self), record_type="runner")
-        self.log.prepare_record.connect(self.prepare_record)
-        self.log.emit_record.connect(self.emit_record)
+        self.journal = None
+        self.listeners = []
+        self.tracer = Tracer(name)
+        self.tracer.track(name)
+
+        self.status_store = StatusStore()
+        self.status_timer = QtCore.QTimer(self)
+        self.status_timer.setInterval(int(1000 / self.status_rate))
+        self.status_timer.timeout.connect(self.emit_status_changes)
+        # Emit final changes before Runner status changes are handled.
+        self.status_changed.connect(self.emit_status_changes)
+        self.finished.connect(self.status_timer.stop)
+
+        self.events = EventLog()
+        self.spill_folder = None
+        self.log = Log(self, record_type="runner")
 
         if flows:
             for flow in flows:
@@ -483,11 +727,21 @@ class Runner(QtCore.QThread):
     def __exit__(self, exc_type, exc_value, exc_traceback):
         pop("runner", self)
 
+    def add_listener(self, listener):
+        """Call listener with every Record logged by the Runner, its Flows and Tasks.
+
+        Listeners are called in the thread that logged the Record.
+        """
+
+        self.listeners.append(listener)
+
     def emit_record(self, record):
-        self.log_records.append(record)
+        if record.type == "runner":
+            self.events.append(record)
+        for listener in self.listeners:
+            listener(record)
 
     def prepare_record(self, record):
-        record.runner = self
         record.runner_id = self.id
         record.runner_name = self.name
 
@@ -500,11 +754,20 @@ class Runner(QtCore.QThread):
         self.log.debug("Adding flow %s", flow)
         if requirements:
             flow.requires(requirements)
+        flow.runner = self
         flow.pool = self.pool
-        flow.log.prepare_record.connect(self.log.prepare_record.emit)
-        flow.log.emit_record.connect(self.log.emit_record.emit)
-        flow.step_changed.connect(self.step_changed.emit)
+        if self.spill_folder:
+            flow.events.spill_path = os.path.join(self.spill_folder, flow.id + ".jsonl")
         self.flows.append(flow)
+        self.tracer.track(flow.name)
+
+    def set_spill_folder(self, folder):
+        """Spill Records that don't fit in memory to JSON lines files in folder."""
+
+        self.spill_folder = folder
+        self.events.spill_path = os.path.join(folder, self.id + ".jsonl")
+        for flow in self.flows:
+            flow.events.spill_path = os.path.join(folder, flow.id + ".jsonl")
 
     def request(self, status):
         self.log.debug("%s requested..." % status.upper())
@@ -520,12 +783,103 @@ class Runner(QtCore.QThread):
                 "Status changed from %s to %s." % (self.status.upper(), status.upper())
             )
         self.status = status
+        if self.journal:
+            self.journal.record_runner(self)
         self.status_changed.emit(status)
 
+    def emit_status_changes(self):
+        changes = self.status_store.pop_changes()
+        for event in changes.values():
+            self.step_changed.emit(event)
+        if changes:
+            self.eta_changed.emit(self.remaining())
+
+    def estimate_durations(self, history):
+        """Set the estimate of each Task from a render History.
+
+        Each query of the History runs once, however many Tasks share it.
+        """
+
+        history = history.cached()
+        for flow in self.flows:
+            for task in flow.tasks:
+                try:
+                    task.estimate = task.estimate_duration(history)
+                except Exception as e:
+                    self.log.warning("Failed to estimate %s: %s", task, e)
+
+    def remaining(self):
+        """Estimated seconds until all Flows are done.
+
+        Flows run in parallel unless they depend on each other, so this is the
+        longest chain of remaining work through the dependencies of the Flows, and
+        through the predecessors of Tasks that run one at a time, like the comps of
+        a render batch.
+        """
+
+        finished = {}
+
+        def flow_finished(flow):
+            if flow.id not in finished:
+                finished[flow.id] = 0.0  # Guards against dependency cycles.
+                if flow.tasks:
+                    finished[flow.id] = task_finished(flow.tasks[-1])
+                else:
+                    finished[flow.id] = flow_started(flow)
+            return finished[flow.id]
+
+        def flow_started(flow):
+            return max([dependency_finished(dep) for dep in flow.dependencies] or [0])
+
+        def task_finished(task):
+            if task.id not in finished:
+                finished[task.id] = 0.0  # Guards against dependency cycles.
+                started = 0.0
+                if task.flow:
+                    index = task.flow.tasks.index(task)
+                    if index:
+                        started = task_finished(task.flow.tasks[index - 1])
+                    else:
+                        started = flow_started(task.flow)
+                predecessor = task.predecessor()
+                if predecessor:
+                    started = max(started, task_finished(predecessor))
+                if task.flow and task.flow.status in const.DoneList:
+                    finished[task.id] = started
+                else:
+                    finished[task.id] = started + task.remaining()
+            return finished[task.id]
+
+        def dependency_finished(dep):
+            if isinstance(dep, Flow):
+                return flow_finished(dep)
+            return task_finished(dep)
+
+        return max([flow_finished(flow) for flow in self.flows] or [0])
+
+    def start(self, *args, **kwargs):
+        self.status_timer.start()
+        super(Runner, self).start(*args, **kwargs)
+
     def wait_for_finished_flows(self, time=0.01):
         return all([flow.wait(time) for flow in self.flows])
 
     def run(self):
+        try:
+            with self.tracer.span(self.name, self.name, "runner") as args:
+                self.run_flows()
+                args["status"] = self.status
+        finally:
+            self.close_events()
+
+    def close_events(self):
+        """Close the spill files of the Runner and its Flows."""
+
+        self.events.close()
+        for flow in self.flows:
+            flow.events.close()
+
+    def run_flows(self):
         self.set_status(const.Running)
 
         # Start all flows
@@ -548,95 +902,138 @@ class Runner(QtCore.QThread):
             self.set_status(const.Success)
 
 
+REPORT_FORMATTERS = {
+    "flow": LogFormatter("  %(flow_step)s [%(flow_progress)3d%%] %(message)s"),
+    "task": LogFormatter("    %(task_status)s [%(task_progress)3d%%] %(message)s"),
+}
+
+
+def iter_report(runner):
+    """Yield the lines of a well formatted report for a Runner."""
+
+    for flow in runner.flows:
+        yield f"{flow.name}"
+        if flow.events.discarded:
+            yield f"  ... {flow.events.discarded} earlier records dropped"
+        for record in flow.events:
+            formatter = REPORT_FORMATTERS[record.type]
+            if record.exc_text:
+                yield formatter.format(record, message=record.exc_message)
+                yield f"\n{record.exc_text}\n"
+            else:
+                yield formatter.format(record)
+
+
 def generate_report(runner):
     """Generate a well formatted report for a Runner."""
 
-    formatters = {
-        "flow": LogFormatter("  %(flow_step)s [%(flow_progress)3d%%] %(message)s"),
-        "task": LogFormatter("    %(task_status)s [%(task_progress)3d%%] %(message)s"),
-    }
+    return "\n".join(iter_report(runner))
+
 
-    report = []
+def generate_summary(runner, max_size=8000, max_message=400):
+    """Generate a short plain text summary of a Runner.
+
+    Lists the final step of each Flow, followed by the errors it logged. Error
+    messages longer than max_message characters and summaries longer than max_size
+    characters are truncated.
+    """
+
+    lines = []
     for flow in runner.flows:
-        report.append(f"{flow.name}")
-        for record in flow.log_records:
-            if record.exc_info:
-                # Temporarily modify record so we can nicely format the exception...
-                einfo, etext, stk = record.exc_info, record.exc_text, record.stack_info
-                record.exc_info = record.exc_text = record.stack_info = None
-                record.message = str(einfo[1])
-
-                formatted_exc = "".join(traceback.format_exception(*einfo))
-                report.append(formatters[record.type].format(record))
-                report.append(f"\n{formatted_exc}\n")
-
-                # Restore record
-                record.exc_info, record.exc_text, record.stack_info = einfo, etext, stk
-            else:
-                report.append(formatters[record.type].format(record))
-    return "\n".join(report)
+        lines.append(f"{flow.name} - {flow.step} [{int(flow.progress):3d}%]")
+        if flow.events.discarded:
+            lines.append(f"  {flow.events.discarded} records dropped from the log")
+        for record in flow.events:
+            if record.exc_text:
+                step = record.task_step or record.flow_step
+                message = record.exc_message
+                if len(message) > max_message:
+                    message = message[:max_message] + "..."
+                lines.append(f"  {step}: {message}")
+
+    summary = "\n".join(lines)
+    if len(summary) > max_size:
+        truncated = "\n... truncated, see the attached report."
+        summary = summary[: max_size - len(truncated)] + truncated
+    return summary
+
+
+HTML_FORMATTERS = {
+    "flow": LogFormatter(
+        '<pre style="margin: 0px;">  %(flow_step)s [%(flow_progress)3d%%] %(message)s</pre>'
+    ),
+    "task": LogFormatter(
+        '<pre style="margin: 0px;">   %(branch)s %(task_status)s [%(task_progress)3d%%] %(message)s</pre>'
+    ),
+}
+LIVE_HTML_FORMATTERS = {
+    "flow": LogFormatter(
+        '<pre style="margin: 0px;">  %(flow_name)s  %(flow_step)s [%(flow_progress)3d%%] %(message)s</pre>'
+    ),
+    "task": LogFormatter(
+        '<pre style="margin: 0px;">  %(flow_name)s  %(task_status)s [%(task_progress)3d%%] %(message)s</pre>'
+    ),
+}
+
+
+def format_html_record(record, branch="├", formatters=HTML_FORMATTERS):
+    """Format a flow or task Record as html lines."""
+
+    formatter = formatters[record.type]
+    lines = []
+    # Apply base formatting
+    if record.exc_text:
+        lines.append(
+            formatter.format(record, branch=branch, message=record.exc_message)
+        )
+        lines.append(f'<pre style="color: #EB5757;">{record.exc_text}</pre>')
+    else:
+        lines.append(formatter.format(record, branch=branch))
 
+    # Apply color and emphasis to status labels
+    if record.type == "flow":
+        pattern = record.flow_step
+        color = "#CFCFCF"
+    else:
+        pattern = record.task_status
+        color = "#AFAFAF"
+    repl = f'<em style="color: {color};">{pattern}</em>'
+    lines[0] = lines[0].replace(pattern, repl, 1)
+    return lines
 
-def generate_html_report(runner):
-    """Generate a well formatted html report for a Runner."""
 
-    formatters = {
-        "flow": LogFormatter(
-            '<pre style="margin: 0px;">  %(flow_step)s [%(flow_progress)3d%%] %(message)s</pre>'
-        ),
-        "task": LogFormatter(
-            '<pre style="margin: 0px;">   %(branch)s %(task_status)s [%(task_progress)3d%%] %(message)s</pre>'
-        ),
-    }
-
-    def format_record(record, next_record):
-        formatter = formatters[record.type]
-        record.branch = "├"
-        if record.type == "task":
-            if not next_record or next_record.type != "task":
-                record.branch = "└"
-        lines = []
-        # Apply base formatting
-        if record.exc_info:
-            # Temporarily modify record so we can nicely format the exception...
-            einfo, etext, stk = record.exc_info, record.exc_text, record.stack_info
-            record.exc_info = record.exc_text = record.stack_info = None
-            record.message = str(einfo[1])
-
-            formatted_exc = "".join(traceback.format_exception(*einfo))
-            lines.append(formatter.format(record))
-            lines.append(f'<pre style="color: #EB5757;">{formatted_exc}</pre>')
-
-            # Restore record
-            record.exc_info, record.exc_text, record.stack_info = einfo, etext, stk
-        else:
-            lines.append(formatters[record.type].format(record))
+def format_live_html_record(record):
+    """Format a Record as html lines for a live log, prefixed by its flow's name."""
+
+    return format_html_record(record, formatters=LIVE_HTML_FORMATTERS)
 
-        # Apply color and emphasis to status labels
-        if record.type == "flow":
-            pattern = record.flow_step
-            status = pattern.split()[0].lower()
-            color = "#CFCFCF"
-        else:
-            pattern = record.task_status
-            status = pattern.split()[0].lower()
-            color = "#AFAFAF"
-        repl = f'<em style="color: {color};">{pattern}</em>'
-        for i, line in enumerate(lines):
-            lines[i] = re.sub(pattern, repl, line)
 
-        return lines
+def iter_html_report(runner):
+    """Yield the lines of a well formatted html report for a Runner."""
 
-    report = ['<pre style="line-height:0%;">  </pre>']
+    yield '<pre style="line-height:0%;">  </pre>'
     for flow in runner.flows:
-        report.append(
+        yield (
             f'<pre style="font-family: Roboto; font-size: 14px;color: #DDDDDD;">  {flow.name}</pre>'
         )
-        records = list(flow.log_records)
+        if flow.events.discarded:
+            yield (
+                '<pre style="margin: 0px;color: #AFAFAF;">'
+                f"  ... {flow.events.discarded} earlier records dropped</pre>"
+            )
+        records = flow.events.records()
         for record, next_record in zip_longest(records, records[1:]):
-            report.extend(format_record(record, next_record))
+            branch = "├"
+            if record.type == "task":
+                if not next_record or next_record.type != "task":
+                    branch = "└"
+            yield from format_html_record(record, branch)
+
+
+def generate_html_report(runner):
+    """Generate a well formatted html report for a Runner."""
 
-    return "\n".join(report)
+    return "\n".join(iter_html_report(runner))
 
 
 def clamp(value, mn, mx):
@@ -658,73 +1055,191 @@ def fit100(value, mn, mx):
     return fit(value, 0, 100, mn, mx)
 
 
-class FunctionEvent(QtCore.QEvent):
-    """QEvent wrapping a function and arguments.
-
-    Has a result queue that can be used to await a result of the Events acceptance and
-    execution.
-    """
-
-    _type = QtCore.QEvent.Type(QtCore.QEvent.registerEventType())
+def percentile(values, percent):
+    """Get the nearest-rank <percent> percentile of <values>, or 0 when empty."""
 
-    def __init__(self, fn, args, kwargs):
-        super(FunctionEvent, self).__init__(self._type)
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[int(round(percent / 100.0 * (len(values) - 1)))]
 
-        self.result = Queue()
-        self.fn = fn
-        self.args = args
-        self.kwargs = kwargs
 
+class MainThreadDispatcher(QtCore.QObject):
+    """Calls functions in the MainThread on behalf of worker threads.
 
-class FunctionCaller(QtCore.QObject):
-    """QObject whose sole purpose is handling FunctionEvents.
+    Calls are queued with their Future, and a single dispatch is requested for all
+    calls queued before the MainThread gets to it, so bursts of calls are handled in
+    one event. Each dispatch runs calls for at most max_batch_time seconds before
+    requesting another, keeping the UI responsive. The time each call waited in the
+    queue is recorded, see stats.
 
-    Calls a FunctionEvent's function and puts the result and exc_info on the
-    FunctionEvent's result queue.
+    Calls submitted within batch are held by the submitting thread until the batch
+    exits, so batches on one thread never delay calls from other threads.
     """
 
-    event_processed = QtCore.Signal()
+    max_batch_time = 0.05
+
+    def __init__(self, parent=None):
+        super(MainThreadDispatcher, self).__init__(parent)
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.posted = False
+        self.local = threading.local()
+        self.calls = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=1000)
+        self.max_latency = 0
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue a function to be called in the MainThread.
+
+        Returns:
+            Future: Resolves to the result of the function.
+        """
+
+        future = Future()
+        call = (time.monotonic(), future, fn, args, kwargs)
+        held = getattr(self.local, "held", None)
+        if held is not None:
+            held.append(call)
+        else:
+            self.enqueue([call])
+        return future
+
+    def call(self, fn, *args, **kwargs):
+        """Call a function in the MainThread and wait for its result.
+
+        Calls held by this thread's batch are queued first, so they still run in
+        order, and waiting within a batch doesn't deadlock.
+        """
+
+        self.flush()
+        future = Future()
+        self.enqueue([(time.monotonic(), future, fn, args, kwargs)])
+        return future.result()
+
+    def enqueue(self, calls):
+        with self.lock:
+            self.pending.extend(calls)
+            post = not self.posted
+            self.posted = True
+        if post:
+            self.post()
+
+    def flush(self):
+        """Queue the calls held by this thread's batch."""
+
+        held = getattr(self.local, "held", None)
+        if held:
+            self.enqueue(list(held))
+            del held[:]
+
+    @contextmanager
+    def batch(self):
+        """Context holding calls submitted within it, to dispatch them in one event."""
+
+        if getattr(self.local, "held", None) is not None:
+            # Nested batches are part of the outer batch.
+            yield self
+            return
 
-    def event(self, event):
-        event.accept()
-        result = None
-        exc_info = None
+        self.local.held = []
         try:
-            result = event.fn(*event.args, **event.kwargs)
-        except Exception:
-            exc_info = sys.exc_info()
+            yield self
         finally:
-            event.result.put((result, exc_info))
+            held, self.local.held = self.local.held, None
+            if held:
+                self.enqueue(held)
+
+    def post(self):
+        QtCore.QMetaObject.invokeMethod(self, "dispatch", QtCore.Qt.QueuedConnection)
+
+    @QtCore.Slot()
+    def dispatch(self):
+        self.batches += 1
+        deadline = time.monotonic() + self.max_batch_time
+        while True:
+            with self.lock:
+                if not self.pending or time.monotonic() > deadline:
+                    # Request another dispatch for calls left over or queued.
+                    self.posted = bool(self.pending)
+                    break
+                queued, future, fn, args, kwargs = self.pending.popleft()
+            self.run(queued, future, fn, args, kwargs)
+
+        if self.posted:
+            self.post()
+
+    def run(self, queued, future, fn, args, kwargs):
+        latency = time.monotonic() - queued
+        self.calls += 1
+        self.latencies.append(latency)
+        self.max_latency = max(self.max_latency, latency)
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def stats(self):
+        """Get the number of calls and batches, and the queue latency in seconds.
 
-        self.event_processed.emit()
+        Percentiles are of the most recent 1000 calls.
+        """
+
+        latencies = list(self.latencies)
+        return {
+            "calls": self.calls,
+            "batches": self.batches,
+            "pending": len(self.pending),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": self.max_latency,
+        }
 
 
-function_caller = FunctionCaller()
+dispatcher = MainThreadDispatcher()
 
 
 def call_in_main(fn, *args, **kwargs):
     """Calls a function in the MainThread and returns the result."""
 
-    from sgtk.platform import current_engine
+    if threading.current_thread().name == "MainThread":
+        return fn(*args, **kwargs)
 
-    engine = current_engine()
+    return dispatcher.call(fn, *args, **kwargs)
 
-    if threading.current_thread().name == "MainThread":
+
+def post_in_main(fn, *args, **kwargs):
+    """Schedules a function to be called in the MainThread without waiting.
+
+    Returns a Future that can be used to await the result.
+    """
+
+    return dispatcher.submit(fn, *args, **kwargs)
+
+
+def call_in_background(fn, *args, **kwargs):
+    """Calls a function in a worker thread and returns the result.
+
+    The MainThread keeps processing events while it waits, so slow work like
+    hashing a large file doesn't freeze the UI.
+    """
+
+    if threading.current_thread().name != "MainThread":
         return fn(*args, **kwargs)
 
-    # Post event for function_caller to execute in main thread
-    event = FunctionEvent(fn, args, kwargs)
-    app = QtWidgets.QApplication.instance()
-    app.postEvent(function_caller, event)
-
-    # Await event_processed signal
-    event_loop = QtCore.QEventLoop()
-    function_caller.event_processed.connect(event_loop.quit)
-    event_loop.exec_()
-
-    # Get result
-    result, exc_info = event.result.get()
-    if exc_info:
-        exc_type, exc_value, exc_traceback = exc_info
-        raise exc_value.with_traceback(exc_traceback)
-    return result
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    loop = QtCore.QEventLoop()
+    future.add_done_callback(lambda _: post_in_main(loop.quit))
+    threading.Thread(target=run, daemon=True).start()
+    loop.exec_()
+    return future.result()
@@ -1,6 +1,10 @@
-from .. import const
+import os
+import time
+
+from .. import const, files
 from ..vendor import ffmpeg_lib
-from .core import Task
+from .core import TRANSIENT_ERRNOS, TRANSIENT_ERRORS, Task
+from .events import ProgressSampler
 
 
 class EncodeError(Exception):
@@ -8,7 +12,17 @@ class EncodeError(Exception):
 
 
 class EncodeMP4(Task):
+    """Encode a render as an mp4.
+
+    When the flow context has an ArtifactCache, the mp4 is encoded once per source
+    and encode settings, and copied from the cache afterwards.
+    """
+
     step = const.Encoding + " MP4"
+    max_attempts = 3
+    retry_exceptions = TRANSIENT_ERRORS
+    retry_errnos = TRANSIENT_ERRNOS
+    default_estimate = 10.0
 
     def __init__(self, src_file, dst_file, quality, resolution, framerate, *args, **kwargs):
         self.src_file = src_file
@@ -16,20 +30,25 @@ class EncodeMP4(Task):
         self.quality = quality
         self.resolution = resolution
         self.framerate = framerate
+        self.preset = None
+        self.encode_seconds = None
+        self.encoded_frames = None
         super(EncodeMP4, self).__init__(*args, **kwargs)
 
     def on_start(self, proc):
         self.log.debug("Encoding MP4 [%s]", self.quality)
         self.log.debug(" ".join(proc.args))
+        self.frames = ProgressSampler(self.log)
 
     def on_frame(self, proc):
         self.set_status(const.Running, proc.progress)
-        self.log.debug(f"Frame {proc.frame:>4d} of {proc.num_frames + 1:>4d}.")
+        self.frames.update(proc.frame, proc.num_frames + 1)
 
     def on_error(self, proc):
         raise EncodeError("Failed to encode mp4...\n" + proc.error)
 
     def on_done(self, proc):
+        self.frames.finish()
         self.log.debug("Finished encoding mp4!")
 
     def execute(self):
@@ -60,6 +79,34 @@ class EncodeMP4(Task):
         if src_file_info["is_sequence"]:
             padding = "%0{}d".format(src_file_info["padding"])
             src_file = src_file.replace(src_file_info["padding_str"], padding)
+
+        cache = self.context.get("cache")
+        if not cache:
+            self.encode(src_file, src_file_info, crf, preset, scale, self.dst_file)
+            return self.dst_file
+
+        params = {
+            "encode": "mp4",
+            "crf": crf,
+            "preset": preset,
+            "scale": scale_filter,
+            "framerate": self.framerate,
+        }
+        with cache.get_or_create(
+            src_file,
+            params,
+            ".mp4",
+            lambda out_file: self.encode(
+                src_file, src_file_info, crf, preset, scale, out_file
+            ),
+        ) as cached_file:
+            self.log.debug("Copying mp4 from cache %s", cached_file)
+            files.copy_file(cached_file, self.dst_file)
+        return self.dst_file
+
+    def encode(self, src_file, src_file_info, crf, preset, scale, out_file):
+        self.preset = preset
+        if src_file_info["is_sequence"]:
             start_number = ffmpeg_lib.get_frame_range(src_file)[0]
             proc = ffmpeg_lib.encode(
                 '-y',
@@ -76,7 +123,7 @@ class EncodeMP4(Task):
                 "-tune", "stillimage",
                 '-crf', crf,
                 '-preset', preset,
-                self.dst_file
+                out_file,
             )
         else:
             proc = ffmpeg_lib.encode(
@@ -92,20 +139,47 @@ class EncodeMP4(Task):
                 "-tune", "stillimage",
                 "-crf", crf,
                 "-preset", preset,
-                self.dst_file,
+                out_file,
             )
-        ffmpeg_lib.watch(
-            proc,
-            on_start=self.on_start,
-            on_frame=self.on_frame,
-            on_error=self.on_error,
-            on_done=self.on_done,
-        )
-        return self.dst_file
+        started = time.monotonic()
+        with self.trace("encode"):
+            ffmpeg_lib.watch(
+                proc,
+                on_start=self.on_start,
+                on_frame=self.on_frame,
+                on_error=self.on_error,
+                on_done=self.on_done,
+            )
+        self.encode_seconds = time.monotonic() - started
+        self.encoded_frames = self.frames.value
+
+    def get_stats(self):
+        # Encode seconds and frames are only known when not copied from the cache.
+        return {
+            "seconds": self.encode_seconds,
+            "frames": self.encoded_frames,
+            "output_size": os.path.getsize(self.dst_file),
+            "quality": self.quality,
+            "resolution": str(self.resolution),
+            "preset": self.preset,
+        }
+
+    def estimate_duration(self, history):
+        return estimate_encode_duration(self, history)
 
 
 class EncodeGIF(Task):
+    """Encode a render as a gif.
+
+    When the flow context has an ArtifactCache, the gif is encoded once per source
+    and encode settings, and copied from the cache afterwards.
+    """
+
     step = const.Encoding + " GIF"
+    max_attempts = 3
+    retry_exceptions = TRANSIENT_ERRORS
+    retry_errnos = TRANSIENT_ERRNOS
+    default_estimate = 10.0
 
     def __init__(self, src_file, dst_file, quality, resolution, framerate, *args, **kwargs):
         self.src_file = src_file
@@ -113,21 +187,24 @@ class EncodeGIF(Task):
         self.quality = quality
         self.resolution = resolution
         self.framerate = int(framerate)
+        self.encode_seconds = None
+        self.encoded_frames = None
         super(EncodeGIF, self).__init__(*args, **kwargs)
 
     def on_start(self, proc):
         self.log.debug("Encoding GIF [%s]", self.quality)
         self.log.debug(" ".join(proc.args))
+        self.frames = ProgressSampler(self.log)
 
     def on_frame(self, proc):
         self.set_status(const.Running, proc.progress)
-        self.log.debug(f"Frame {proc.frame:>4d} of {proc.num_frames + 1:>4d}.")
+        self.frames.update(proc.frame, proc.num_frames + 1)
 
     def on_error(self, proc):
-        self.set_status(const.Failed, proc.progress)
-        raise EncodeError("Failed to encode mp4...\n" + proc.error)
+        raise EncodeError("Failed to encode gif...\n" + proc.error)
 
     def on_done(self, proc):
+        self.frames.finish()
         self.log.debug("Finished encoding mp4!")
 
     def execute(self):
@@ -155,6 +232,23 @@ class EncodeGIF(Task):
             f"[a] palettegen=max_colors={colors}:stats_mode=diff [p]",
             f"[b][p] paletteuse={dither}diff_mode=rectangle",
         ]
+
+        cache = self.context.get("cache")
+        if not cache:
+            self.encode(src_file, filters, self.dst_file)
+            return self.dst_file
+
+        with cache.get_or_create(
+            src_file,
+            {"encode": "gif", "filters": filters},
+            ".gif",
+            lambda out_file: self.encode(src_file, filters, out_file),
+        ) as cached_file:
+            self.log.debug("Copying gif from cache %s", cached_file)
+            files.copy_file(cached_file, self.dst_file)
+        return self.dst_file
+
+    def encode(self, src_file, filters, out_file):
         proc = ffmpeg_lib.encode(
             "-y",
             "-i", src_file,
@@ -162,16 +256,48 @@ class EncodeGIF(Task):
             "-loop", "0",
             "-gifflags", "+transdiff",
             "-y",
-            self.dst_file,
-        )
-        ffmpeg_lib.watch(
-            proc,
-            on_start=self.on_start,
-            on_frame=self.on_frame,
-            on_error=self.on_error,
-            on_done=self.on_done,
+            out_file,
         )
-        return self.dst_file
+        started = time.monotonic()
+        with self.trace("encode"):
+            ffmpeg_lib.watch(
+                proc,
+                on_start=self.on_start,
+                on_frame=self.on_frame,
+                on_error=self.on_error,
+                on_done=self.on_done,
+            )
+        self.encode_seconds = time.monotonic() - started
+        self.encoded_frames = self.frames.value
+
+    def get_stats(self):
+        # Encode seconds and frames are only known when not copied from the cache.
+        return {
+            "seconds": self.encode_seconds,
+            "frames": self.encoded_frames,
+            "output_size": os.path.getsize(self.dst_file),
+            "quality": self.quality,
+            "resolution": str(self.resolution),
+        }
+
+    def estimate_duration(self, history):
+        return estimate_encode_duration(self, history)
+
+
+def estimate_encode_duration(task, history):
+    """Estimate the seconds an encode task takes from the History.
+
+    Uses the median frames encoded per second at its quality when the frames of
+    the comp are in its Flow's context, else the median duration of the task.
+    """
+
+    name = task.__class__.__name__
+    frames = task.flow.context.get("frames") if task.flow else None
+    if frames:
+        fps = history.encode_fps(name, group_by="quality").get(task.quality)
+        if fps:
+            return frames / fps
+    return history.median_duration(name, quality=task.quality)
 
 
 def get_scale_filter(resolution="Full"):
@@ -0,0 +1,382 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from array import array
+from collections import deque
+from itertools import islice
+
+__all__ = [
+    "EventLog",
+    "FrameTimes",
+    "Log",
+    "ProgressSampler",
+    "Record",
+]
+
+_PRIMITIVES = (str, int, float, bool, type(None))
+
+
+class Record(object):
+    """A log record of a Runner, Flow or Task.
+
+    Records hold the ids and state of their Runner, Flow and Task at the time they
+    were logged, never references to the objects themselves. Messages are only
+    formatted when a Record is reported.
+    """
+
+    __slots__ = (
+        "type",
+        "created",
+        "levelno",
+        "msg",
+        "args",
+        "exc_message",
+        "exc_text",
+        "runner_id",
+        "runner_name",
+        "flow_id",
+        "flow_name",
+        "flow_step",
+        "flow_progress",
+        "task_id",
+        "task_step",
+        "task_status",
+        "task_progress",
+        "task_attempt",
+    )
+
+    def __init__(self, type, levelno, msg, args=(), **fields):
+        for slot in self.__slots__:
+            setattr(self, slot, fields.get(slot))
+        self.type = type
+        self.created = fields.get("created") or time.time()
+        self.levelno = levelno
+        self.msg = msg
+        # Keep primitive args only, so Records never hold references to objects.
+        self.args = tuple(
+            arg if isinstance(arg, _PRIMITIVES) else repr(arg) for arg in args
+        )
+
+    @property
+    def levelname(self):
+        return logging.getLevelName(self.levelno)
+
+    def getMessage(self):
+        if self.args:
+            return str(self.msg) % self.args
+        return str(self.msg)
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        return cls(data.pop("type"), data.pop("levelno"), data.pop("msg"), **data)
+
+
+class EventLog(object):
+    """Bounded buffer of Records.
+
+    When the buffer is full, the oldest half of the Records is spilled to a JSON
+    lines file at spill_path, or discarded when there is no spill_path or it can't
+    be written. The spill file is kept open until close is called. The number of
+    discarded Records is kept, so reports can say that Records are missing.
+
+    Arguments:
+        maxlen (int): Maximum number of Records kept in memory.
+        spill_path (str): Optional path to spill Records to.
+    """
+
+    def __init__(self, maxlen=5000, spill_path=None):
+        self.buffer = deque(maxlen=maxlen)
+        self.spill_path = spill_path
+        self.spill_file = None
+        self.spilled = 0
+        self.discarded = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.spilled + self.discarded + len(self.buffer)
+
+    def __iter__(self):
+        return iter(self.records())
+
+    def append(self, record):
+        with self.lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                count = max(1, self.buffer.maxlen // 2)
+                self.spill([self.buffer.popleft() for _ in range(count)])
+            self.buffer.append(record)
+
+    def spill(self, records):
+        if not self.spill_path:
+            self.discarded += len(records)
+            return
+
+        lines = [json.dumps(record.to_dict(), default=str) + "\n" for record in records]
+        try:
+            if not self.spill_file:
+                os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+                self.spill_file = open(self.spill_path, "a")
+            self.spill_file.write("".join(lines))
+        except OSError:
+            self.discarded += len(records)
+            return
+        self.spilled += len(records)
+
+    def close(self):
+        """Close the spill file. It is opened again if more Records are spilled."""
+
+        with self.lock:
+            if self.spill_file:
+                self.spill_file.close()
+                self.spill_file = None
+
+    def records(self):
+        """Get all Records including those spilled to disk."""
+
+        with self.lock:
+            buffered = list(self.buffer)
+            spilled = self.spilled
+            if self.spill_file:
+                self.spill_file.flush()
+
+        records = []
+        if spilled:
+            try:
+                with open(self.spill_path, "r") as f:
+                    for line in islice(f, spilled):
+                        records.append(Record.from_dict(json.loads(line)))
+            except OSError:
+                pass
+        return records + buffered
+
+
+class Log(object):
+    """Logger-like object creating Records for a Runner, Flow or Task.
+
+    The owner fills in the Record with its state using prepare_record, and then
+    stores it using emit_record.
+    """
+
+    __slots__ = ("owner", "record_type")
+
+    def __init__(self, owner, record_type):
+        self.owner = owner
+        self.record_type = record_type
+
+    def log(self, level, msg, *args, exc_info=None, **kwargs):
+        record = Record(self.record_type, level, msg, args)
+        if exc_info:
+            if not isinstance(exc_info, tuple):
+                exc_info = sys.exc_info()
+            record.exc_message = str(exc_info[1])
+            record.exc_text = "".join(traceback.format_exception(*exc_info))
+        self.owner.prepare_record(record)
+        self.owner.emit_record(record)
+
+    def debug(self, msg, *args, **kwargs):
+        self.log(logging.DEBUG, msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self.log(logging.INFO, msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self.log(logging.WARNING, msg, *args, **kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+    def critical(self, msg, *args, **kwargs):
+        self.log(logging.CRITICAL, msg, *args, **kwargs)
+
+    def exception(self, msg, *args, exc_info=True, **kwargs):
+        self.log(logging.ERROR, msg, *args, exc_info=exc_info, **kwargs)
+
+
+class ProgressSampler(object):
+    """Aggregates frequent progress updates, like the frames of an encode, into a
+    timeline of a few log records.
+
+    A record is logged every <step> percent or <interval> seconds, holding the frame
+    rate and the min and max frame times since the previous record. finish logs a
+    summary of all frames.
+
+    Updates may skip values, like ffmpeg's stats lines which are only printed every
+    few frames, so frames are counted by how far the value advanced, and the time
+    between updates is split evenly between the frames it advanced.
+
+    Arguments:
+        log (Log): Log used to record samples.
+        label (str): Label of the sampled values.
+        step (float): Percent of progress between records.
+        interval (float): Maximum seconds between records.
+    """
+
+    def __init__(self, log, label="Frame", step=10, interval=5.0):
+        self.log = log
+        self.label = label
+        self.step = step
+        self.interval = interval
+        self.value = 0
+        self.total = 0
+        self.started = time.monotonic()
+        self.last_update = self.started
+        self.count = 0
+        self.timeline = []
+        self.reset_window(self.started)
+
+    def reset_window(self, now):
+        self.window_start = now
+        self.window_count = 0
+        self.window_min = None
+        self.window_max = None
+        self.next_percent = self.percent() + self.step
+        self.next_time = now + self.interval
+
+    def percent(self):
+        if not self.total:
+            return 0
+        return self.value * 100.0 / self.total
+
+    def update(self, value, total):
+        self.total = total
+        advanced = value - self.value
+        if advanced <= 0:
+            return
+
+        now = time.monotonic()
+        each = (now - self.last_update) / advanced
+        self.last_update = now
+        self.value = value
+        self.count += advanced
+        self.window_count += advanced
+        if self.window_min is None or each < self.window_min:
+            self.window_min = each
+        if self.window_max is None or each > self.window_max:
+            self.window_max = each
+
+        if self.percent() >= self.next_percent or now >= self.next_time:
+            self.sample(now)
+
+    def sample(self, now):
+        if not self.window_count:
+            return
+
+        rate = self.window_count / max(now - self.window_start, 1e-6)
+        self.timeline.append((now - self.started, self.value, rate))
+        self.log.debug(
+            "%s %d of %d [%d%%]: %0.1f per second, %0.3fs to %0.3fs each.",
+            self.label,
+            self.value,
+            self.total,
+            self.percent(),
+            rate,
+            self.window_min,
+            self.window_max,
+        )
+        self.reset_window(now)
+
+    def finish(self):
+        now = time.monotonic()
+        self.sample(now)
+        if self.count:
+            elapsed = now - self.started
+            self.log.debug(
+                "%d %ss in %0.1fs, %0.1f per second.",
+                self.count,
+                self.label.lower(),
+                elapsed,
+                self.count / max(elapsed, 1e-6),
+            )
+
+
+class FrameTimes(object):
+    """Render seconds of each frame of a render, stored in compact arrays.
+
+    A long render only costs a few bytes per frame, and the summary shows which
+    frames were slow, to find the layers or effects that make a comp slow.
+    """
+
+    def __init__(self):
+        self.frames = array("l")
+        self.seconds = array("f")
+
+    def __len__(self):
+        return len(self.frames)
+
+    def add(self, frame, seconds):
+        self.frames.append(frame)
+        self.seconds.append(seconds)
+
+    def summary(self, slowest=5, bins=10):
+        """Get the percentiles, histogram and slowest frames of the render.
+
+        Returns:
+            dict: With count, total, p50, p95 and max seconds, a histogram of
+                [start, end, count] bins and the [frame, seconds] of the slowest
+                frames.
+        """
+
+        if not self.frames:
+            return {}
+
+        ordered = sorted(self.seconds)
+
+        def percentile(percent):
+            return ordered[int(round(percent / 100.0 * (len(ordered) - 1)))]
+
+        low, high = ordered[0], ordered[-1]
+        width = (high - low) / bins or 1.0
+        counts = [0] * bins
+        for seconds in self.seconds:
+            counts[min(int((seconds - low) / width), bins - 1)] += 1
+        histogram = [
+            [round(low + width * i, 3), round(low + width * (i + 1), 3), count]
+            for i, count in enumerate(counts)
+        ]
+
+        slowest_frames = sorted(
+            zip(self.frames, self.seconds), key=lambda item: item[1], reverse=True
+        )[:slowest]
+        return {
+            "count": len(ordered),
+            "total": round(sum(ordered), 3),
+            "p50": round(percentile(50), 3),
+            "p95": round(percentile(95), 3),
+            "max": round(high, 3),
+            "histogram": histogram,
+            "slowest": [[frame, round(seconds, 3)] for frame, seconds in slowest_frames],
+        }
+
+    def format(self, width=30):
+        """Format the summary as lines of text for the report."""
+
+        summary = self.summary()
+        if not summary:
+            return "No frame times recorded."
+
+        lines = [
+            "%d frames in %0.1fs. Seconds per frame p50 %0.2f, p95 %0.2f, max %0.2f."
+            % (
+                summary["count"],
+                summary["total"],
+                summary["p50"],
+                summary["p95"],
+                summary["max"],
+            ),
+        ]
+        most = max(count for _, _, count in summary["histogram"])
+        for start, end, count in summary["histogram"]:
+            bar = "#" * int(round(width * count / most))
+            lines.append("  %7.2fs - %7.2fs | %-*s %d" % (start, end, width, bar, count))
+        lines.append(
+            "Slowest frames: "
+            + ", ".join("%d (%0.2fs)" % tuple(item) for item in summary["slowest"])
+        )
+        return "\n".join(lines)
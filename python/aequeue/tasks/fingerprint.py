@@ -0,0 +1,39 @@
+from .. import const, fingerprint
+from .core import Task
+
+
+class SkipRender(Task):
+    """Stands in for a render task when a comp's output is up to date."""
+
+    step = const.Rendering
+
+    def __init__(self, output_path, *args, **kwargs):
+        self.output_path = output_path
+        super(SkipRender, self).__init__(*args, **kwargs)
+
+    def execute(self):
+        self.log.debug("Output is up to date. Skipping render: %s", self.output_path)
+        self.set_status(const.Running, 100)
+        return self.output_path
+
+
+class RecordFingerprint(Task):
+    """Record the fingerprint and rendered files of a comp next to its output."""
+
+    step = const.Rendering
+
+    def __init__(self, output_path, manifest_path, fingerprint, *args, **kwargs):
+        self.output_path = output_path
+        self.manifest_path = manifest_path
+        self.fingerprint = fingerprint
+        super(RecordFingerprint, self).__init__(*args, **kwargs)
+
+    def execute(self):
+        self.log.debug("Recording fingerprint %s...", self.fingerprint)
+        fingerprint.write_manifest(
+            self.manifest_path,
+            self.fingerprint,
+            self.output_path,
+        )
+        self.set_status(const.Running, 100)
+        return self.output_path
@@ -1,31 +1,272 @@
 import os
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
-from .. import const
+from .. import const, files, shotgun, spool
 from ..vendor import ffmpeg_lib
 from .core import Task
 
 
-def get_shotgun():
-    from sgtk.util.shotgun import create_sg_connection
-
-    return create_sg_connection()
-
-
 def register_publish(*args, **kwargs):
     from sgtk.util import register_publish
 
     return register_publish(*args, **kwargs)
 
 
+PUBLISH_RETURN_FIELDS = [
+    "id",
+    "code",
+    "project",
+    "task",
+    "entity",
+    "version_number",
+    "path",
+]
+
+
+def find_or_register_publish(sg, publish_data, log):
+    """Get an existing PublishedFile and link it to a Version, or register a new one."""
+
+    log.debug("Checking if Publish already exists...")
+    prepublish_data = register_publish(**dict(dry_run=True, **publish_data))
+    publish = sg.find_one(
+        "PublishedFile",
+        filters=[
+            ["project", "is", prepublish_data["project"]],
+            ["code", "is", prepublish_data["code"]],
+            ["version_number", "is", prepublish_data["version_number"]],
+            ["task", "is", prepublish_data["task"]],
+            ["entity", "is", prepublish_data["entity"]],
+        ],
+        fields=PUBLISH_RETURN_FIELDS,
+    )
+
+    if not publish:
+        log.debug("Creating new Publish in ShotGrid...")
+        publish = register_publish(**publish_data)
+    else:
+        log.debug("Updated existing Publish in ShotGrid...")
+        sg.update(
+            "PublishedFile",
+            publish["id"],
+            {"version": publish_data["version_entity"]},
+        )
+
+    return publish
+
+
+def create_thumbnail(in_file, out_file, cache=None):
+    if not cache:
+        return ffmpeg_lib.create_thumbnail(in_file, out_file, frame="middle")
+
+    with cache.get_or_create(
+        in_file,
+        {"create": "thumbnail", "frame": "middle"},
+        ".jpeg",
+        lambda path: ffmpeg_lib.create_thumbnail(in_file, path, frame="middle"),
+    ) as cached_file:
+        files.copy_file(cached_file, out_file)
+    return out_file
+
+
+def create_filmstrip(in_file, out_file, cache=None):
+    if not cache:
+        return ffmpeg_lib.create_filmstrip(in_file, out_file)
+
+    with cache.get_or_create(
+        in_file,
+        {"create": "filmstrip"},
+        ".jpeg",
+        lambda path: ffmpeg_lib.create_filmstrip(in_file, path),
+    ) as cached_file:
+        files.copy_file(cached_file, out_file)
+    return out_file
+
+
+def create_thumbnail_and_filmstrip(executor, in_file, tempdir, cache=None):
+    """Start creating a thumbnail and filmstrip of in_file in parallel.
+
+    Returns futures resolving to the paths of the thumbnail and filmstrip. When an
+    ArtifactCache is given, cached images are reused and copied to tempdir.
+    """
+
+    name = os.path.splitext(os.path.basename(in_file))[0]
+    return (
+        executor.submit(
+            create_thumbnail,
+            in_file,
+            os.path.join(tempdir, name + ".jpeg"),
+            cache,
+        ),
+        executor.submit(
+            create_filmstrip,
+            in_file,
+            os.path.join(tempdir, name + "_filmstrip.jpeg"),
+            cache,
+        ),
+    )
+
+
+def upload_thumbnail_and_filmstrip(executor, sg, publish, images, log, on_progress):
+    """Upload a thumbnail and filmstrip to a PublishedFile concurrently.
+
+    ShotGrid connections are not thread safe, so the filmstrip is uploaded from a
+    worker thread using a pooled connection of its own.
+    """
+
+    thumbnail, filmstrip = images
+
+    def upload_filmstrip():
+        path = filmstrip.result()
+        log.debug("Uploading filmstrip...")
+        with shotgun.connection() as filmstrip_sg:
+            filmstrip_sg.upload_filmstrip_thumbnail(
+                "PublishedFile",
+                publish["id"],
+                path,
+            )
+
+    uploading_filmstrip = executor.submit(upload_filmstrip)
+
+    path = thumbnail.result()
+    log.debug("Uploading thumbnail...")
+    sg.upload_thumbnail("PublishedFile", publish["id"], path)
+    on_progress(70)
+
+    uploading_filmstrip.result()
+    on_progress(90)
+
+
+def share_version_thumbnail_and_filmstrip(sg, publish, version, log):
+    """Share the thumbnail and filmstrip of a Version with a PublishedFile.
+
+    Returns False when the Version has no thumbnail and filmstrip ready to share.
+    """
+
+    try:
+        sg.share_thumbnail([publish], source_entity=version)
+        sg.share_thumbnail([publish], source_entity=version, filmstrip_thumbnail=True)
+    except Exception as e:
+        log.debug("Can't reuse thumbnail of Version: %s", e)
+        return False
+    return True
+
+
+def publish_with_thumbnail(
+    sg,
+    publish_data,
+    thumbnail_src_file,
+    log,
+    reuse_version_thumbnail=False,
+    on_progress=None,
+    cache=None,
+):
+    """Register a Publish and give it a thumbnail and filmstrip.
+
+    The thumbnail and filmstrip are created while the Publish is registered, then
+    uploaded concurrently. When reuse_version_thumbnail is True, the thumbnail and
+    filmstrip of the Version are shared with the Publish instead, if they are ready.
+    """
+
+    on_progress = on_progress or (lambda percent: None)
+    with tempfile.TemporaryDirectory() as tempdir:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            images = None
+            if not reuse_version_thumbnail:
+                log.debug("Creating thumbnail and filmstrip...")
+                images = create_thumbnail_and_filmstrip(
+                    executor,
+                    thumbnail_src_file,
+                    tempdir,
+                    cache,
+                )
+
+            publish = find_or_register_publish(sg, publish_data, log)
+            on_progress(50)
+
+            if reuse_version_thumbnail:
+                log.debug("Sharing thumbnail and filmstrip of Version...")
+                if share_version_thumbnail_and_filmstrip(
+                    sg,
+                    publish,
+                    publish_data["version_entity"],
+                    log,
+                ):
+                    on_progress(90)
+                    return publish
+
+                log.debug("Creating thumbnail and filmstrip...")
+                images = create_thumbnail_and_filmstrip(
+                    executor,
+                    thumbnail_src_file,
+                    tempdir,
+                    cache,
+                )
+
+            upload_thumbnail_and_filmstrip(
+                executor,
+                sg,
+                publish,
+                images,
+                log,
+                on_progress,
+            )
+
+    return publish
+
+
+@spool.handler("PublishedFile")
+def drain_publish(drainer, sg, job):
+    """Register a spooled Publish once its Version exists in ShotGrid."""
+
+    import sgtk
+
+    payload = job["payload"]
+    version = payload["version"]
+    if "spool_job" in version:
+        version_job = drainer.spool.get(version["spool_job"])
+        if not version_job or version_job["status"] == const.Failed:
+            raise RuntimeError("Spooled Version failed: %s" % version["code"])
+        if version_job["status"] != const.Success:
+            raise spool.Deferred()
+        version = version_job["result"]
+
+    publish_data = dict(
+        payload["publish_data"],
+        tk=drainer.tk,
+        context=sgtk.Context.deserialize(payload["context"]),
+        version_entity=version,
+    )
+    publish = publish_with_thumbnail(
+        sg,
+        publish_data,
+        payload["thumbnail_src_file"],
+        drainer.log,
+    )
+    return {"id": publish["id"], "type": "PublishedFile"}
+
+
 class SGPublish(Task):
+    """Register a Publish linked to the Version of a SGUploadVersion task.
+
+    The thumbnail and filmstrip are created while the Publish is registered. When
+    the Version's media was not uploaded again, because it is unchanged, the
+    Version's thumbnail and filmstrip are reused.
+
+    When a Spool is given, the Publish is written to the Spool and registered in the
+    background, after the spooled Version is created.
+    """
+
     step = const.Publishing
+    max_attempts = 5
+    retry_exceptions = shotgun.NETWORK_ERRORS
 
     def __init__(self, file, sg_ctx, version_task, *args, **kwargs):
         self.file = file
         self.thumbnail_src_file = kwargs.pop("thumbnail_src_file", None)
         self.sg_ctx = sg_ctx
         self.version_task = version_task
+        self.spool = kwargs.pop("spool", None)
         super(SGPublish, self).__init__(*args, **kwargs)
 
     def execute(self):
@@ -66,81 +307,44 @@ class SGPublish(Task):
         if self.status_request == const.Cancelled:
             return self.accept(const.Cancelled)
 
-        # Get an instance of SG for this thread
-        sg = get_shotgun()
-
-        publish = self.create_publish(sg, publish_data)
-        self.set_status(const.Running, 50)
-
-        self.upload_thumbnail_and_filmstrip(
-            sg,
-            publish,
-            self.thumbnail_src_file or file,
-        )
-        self.set_status(const.Running, 100)
-
-        return version
-
-    def create_publish(self, sg, publish_data):
-        """Get existing version or create a new one."""
-
-        self.log.debug("Checking if Publish already exists...")
-        return_fields = [
-            "id",
-            "code",
-            "project",
-            "task",
-            "entity",
-            "version_number",
-            "path",
-        ]
-        prepublish_data = register_publish(**dict(dry_run=True, **publish_data))
-        publish = sg.find_one(
-            "PublishedFile",
-            filters=[
-                ["project", "is", prepublish_data["project"]],
-                ["code", "is", prepublish_data["code"]],
-                ["version_number", "is", prepublish_data["version_number"]],
-                ["task", "is", prepublish_data["task"]],
-                ["entity", "is", prepublish_data["entity"]],
-            ],
-            fields=return_fields,
-        )
-
-        if not publish:
-            self.log.debug("Creating new Publish in ShotGrid...")
-            app = self.context["app"]
-            publish = register_publish(**publish_data)
-        else:
-            self.log.debug("Updated existing Publish in ShotGrid...")
-            sg.update(
+        if self.spool:
+            # The thumbnail source may be a cached mp4 that is evicted before the
+            # job runs, so the spool keeps a copy of it.
+            thumbnail_src_file = self.thumbnail_src_file or file
+            job_files = []
+            if thumbnail_src_file != file:
+                thumbnail_src_file = self.spool.keep_file(thumbnail_src_file)
+                job_files.append(thumbnail_src_file)
+            job_id = self.spool.put(
                 "PublishedFile",
-                publish["id"],
-                {"version": publish_data["version_entity"]},
+                name,
+                {
+                    "context": self.sg_ctx.serialize(),
+                    "version": version,
+                    "thumbnail_src_file": thumbnail_src_file,
+                    "publish_data": {
+                        key: value
+                        for key, value in publish_data.items()
+                        if key not in ("tk", "context", "version_entity")
+                    },
+                },
+                files=job_files,
             )
+            self.log.debug("Spooled Publish as job %d.", job_id)
+            self.set_status(const.Running, 100)
+            return version
 
-        return publish
-
-    def upload_thumbnail_and_filmstrip(self, sg, publish, in_file):
-        name = os.path.splitext(os.path.basename(in_file))[0]
-
-        with tempfile.TemporaryDirectory() as tempdir:
-            self.log.debug("Creating and uploading thumbnail...")
-            thumbnail = os.path.join(tempdir, name + ".jpeg")
-            ffmpeg_lib.create_thumbnail(in_file, thumbnail, frame="middle")
-            sg.upload_thumbnail(
-                "PublishedFile",
-                publish["id"],
-                thumbnail,
+        # Get a pooled instance of SG for this thread
+        with shotgun.connection() as sg:
+            publish_with_thumbnail(
+                sg,
+                publish_data,
+                self.thumbnail_src_file or file,
+                self.log,
+                reuse_version_thumbnail=self.version_task.uploaded_media is False,
+                on_progress=lambda percent: self.set_status(const.Running, percent),
+                cache=self.context.get("cache"),
             )
-            self.set_status(const.Running, 70)
+            self.set_status(const.Running, 100)
 
-            self.log.debug("Creating and uploading filmstrip...")
-            filmstrip = os.path.join(tempdir, name + "_filmstrip.jpeg")
-            ffmpeg_lib.create_filmstrip(in_file, filmstrip)
-            sg.upload_filmstrip_thumbnail(
-                "PublishedFile",
-                publish["id"],
-                filmstrip,
-            )
-            self.set_status(const.Running, 90)
+        return version
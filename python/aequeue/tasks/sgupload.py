@@ -1,30 +1,276 @@
 import os
+import shutil
+import sys
 import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
 
-from .. import const
+from .. import const, files, shotgun, spool
 from ..vendor import ffmpeg_lib
-from .core import Task
+from .core import Task, fit
 
+VERSION_RETURN_FIELDS = [
+    "id",
+    "code",
+    "description",
+    "entity",
+    "project",
+    "sg_path_to_frames",
+    "sg_status_list",
+    "sg_task",
+    "user",
+]
 
-def get_shotgun():
-    from sgtk.util.shotgun import create_sg_connection
 
-    return create_sg_connection()
+def get_version_return_fields(hash_field=None):
+    """Get the fields returned when looking up or creating a Version."""
+
+    if hash_field:
+        return VERSION_RETURN_FIELDS + [hash_field]
+    return list(VERSION_RETURN_FIELDS)
+
+
+def get_version_update_data(version_data):
+    """Get the fields updated when a Version already exists."""
+
+    return {
+        "description": version_data["description"],
+        "sg_status_list": version_data["sg_status_list"],
+        "sg_path_to_frames": version_data["sg_path_to_frames"],
+    }
+
+
+def get_version_key(version):
+    """Get a key matching a Version by code, task and entity."""
+
+    return (
+        version["code"],
+        (version.get("sg_task") or {}).get("id"),
+        (version.get("entity") or {}).get("id"),
+    )
+
+
+def find_or_create_version(sg, version_data, return_fields=None):
+    """Get an existing Version and update it, or create a new one."""
+
+    return_fields = return_fields or VERSION_RETURN_FIELDS
+    version = sg.find_one(
+        "Version",
+        filters=[
+            ["project", "is", version_data["project"]],
+            ["code", "is", version_data["code"]],
+            ["sg_task", "is", version_data["sg_task"]],
+            ["entity", "is", version_data["entity"]],
+        ],
+        fields=return_fields,
+    )
+
+    if not version:
+        version = sg.create("Version", version_data, return_fields=return_fields)
+    else:
+        update_data = get_version_update_data(version_data)
+        version.update(update_data)
+        sg.update("Version", version["id"], update_data)
+
+    return version
+
+
+def upload_version_media(sg, version, file, buckets=None, on_read=None):
+    """Upload file to the sg_uploaded_movie field of a Version.
+
+    Arguments:
+        sg (shotgun_api3.Shotgun): ShotGrid connection.
+        version (dict): Version entity.
+        file (str): Path to the media to upload.
+        buckets (list): TokenBuckets limiting the upload bandwidth.
+        on_read (callable): Called with the number of bytes sent.
+    """
+
+    buckets = [bucket for bucket in buckets or [] if bucket and bucket.rate]
+    with shotgun.throttled_uploads(sg, buckets, on_read):
+        return sg.upload(
+            "Version",
+            version["id"],
+            path=file,
+            field_name="sg_uploaded_movie",
+        )
+
+
+@spool.handler("Version")
+def drain_version(drainer, sg, job):
+    """Create or update a spooled Version and upload its media."""
+
+    payload = job["payload"]
+    hash_field = payload["hash_field"]
+    media_hash = payload["media_hash"]
+    version = find_or_create_version(
+        sg,
+        payload["version_data"],
+        get_version_return_fields(hash_field),
+    )
+    if media_hash and version.get(hash_field) == media_hash:
+        return version
+
+    upload_version_media(
+        sg,
+        version,
+        payload["upload_file"],
+        [shotgun.machine_bandwidth],
+    )
+    if media_hash:
+        sg.update("Version", version["id"], {hash_field: media_hash})
+        version[hash_field] = media_hash
+    return version
+
+
+class SGVersionBatch(object):
+    """Creates or updates the Versions of SGUploadVersion tasks together.
+
+    Tasks request their Version once they reach the upload step, so a Version is
+    only touched after its comp rendered and encoded. The first request waits
+    <delay> seconds for requests from other flows, then creates or updates all of
+    them with a single find per project and sg.batch requests of up to <max_size>
+    Versions.
+
+    Arguments:
+        max_size (int): Maximum number of Versions per batch request.
+        delay (float): Seconds to collect requests before sending them.
+        return_fields (list): Version fields to return.
+    """
+
+    def __init__(self, max_size=100, delay=0.5, return_fields=None):
+        self.max_size = max_size
+        self.delay = delay
+        self.return_fields = return_fields or list(VERSION_RETURN_FIELDS)
+        self.lock = threading.Lock()
+        self.pending = []
+        self.collecting = False
+
+    def get_version(self, sg, version_data):
+        """Create or update a Version along with the Versions of other flows.
+
+        Raises the error of the batch request when it fails.
+        """
+
+        request = {
+            "data": version_data,
+            "result": None,
+            "error": None,
+            "done": threading.Event(),
+        }
+        with self.lock:
+            self.pending.append(request)
+            collect = not self.collecting
+            self.collecting = True
+
+        if collect:
+            time.sleep(self.delay)
+            with self.lock:
+                requests, self.pending = self.pending, []
+                self.collecting = False
+            self.send(sg, requests)
+
+        request["done"].wait()
+        if request["error"]:
+            raise request["error"][1]
+        return request["result"]
+
+    def send(self, sg, requests):
+        try:
+            for i in range(0, len(requests), self.max_size):
+                self.flush(sg, requests[i : i + self.max_size])
+        except Exception:
+            error = sys.exc_info()
+            for request in requests:
+                if request["result"] is None:
+                    request["error"] = error
+        finally:
+            for request in requests:
+                request["done"].set()
+
+    def flush(self, sg, requests):
+        # Lookup existing versions for all requests
+        existing = {}
+        projects = {}
+        for request in requests:
+            project = request["data"]["project"]
+            projects.setdefault(project["id"], project)
+        codes = [request["data"]["code"] for request in requests]
+        for project in projects.values():
+            for version in sg.find(
+                "Version",
+                filters=[
+                    ["project", "is", project],
+                    ["code", "in", codes],
+                ],
+                fields=self.return_fields,
+            ):
+                existing[get_version_key(version)] = version
+
+        # Create or update all versions in one batch
+        batch = []
+        versions = []
+        for request in requests:
+            version_data = request["data"]
+            version = existing.get(get_version_key(version_data))
+            if version:
+                update_data = get_version_update_data(version_data)
+                version.update(update_data)
+                batch.append(
+                    {
+                        "request_type": "update",
+                        "entity_type": "Version",
+                        "entity_id": version["id"],
+                        "data": update_data,
+                    }
+                )
+            else:
+                batch.append(
+                    {
+                        "request_type": "create",
+                        "entity_type": "Version",
+                        "data": version_data,
+                        "return_fields": self.return_fields,
+                    }
+                )
+            versions.append(version)
+
+        results = sg.batch(batch)
+        for request, version, result in zip(requests, versions, results):
+            request["result"] = version or result
 
 
 class SGUploadVersion(Task):
+    """Create or update a Version and upload its media.
+
+    When hash_field is set, a content hash of the media is stored in that Version
+    field. Media is not encoded or uploaded again while the hash is unchanged.
+
+    When a Spool is given, the Version and its media are written to the Spool and
+    sent to ShotGrid in the background. The result is then the version data along
+    with the id of the spooled job.
+    """
+
     step = const.Uploading
+    max_attempts = 5
+    retry_exceptions = shotgun.NETWORK_ERRORS
 
     def __init__(self, src_file, sg_ctx, comment, *args, **kwargs):
         self.sg_ctx = sg_ctx
         self.comment = comment
         self.src_file = src_file
+        self.version_batch = kwargs.pop("version_batch", None)
+        self.bandwidth = kwargs.pop("bandwidth", None)
+        self.upload_executor = kwargs.pop("upload_executor", None)
+        self.hash_field = kwargs.pop("hash_field", None)
+        self.spool = kwargs.pop("spool", None)
+        self.uploaded_media = None
         super(SGUploadVersion, self).__init__(*args, **kwargs)
 
-    def execute(self):
-        # Get necessary data from task context
-        app = self.context["app"]
-        options = self.context["options"]
+    def get_src_file(self, app):
+        """Get the source media path, with %02d style padding for sequences."""
+
         src_file = self.src_file
         src_file_info = app.engine.get_ae_path_info(src_file)
         if src_file_info["is_sequence"]:
@@ -32,13 +278,15 @@ class SGUploadVersion(Task):
                 src_file_info["padding_str"],
                 "%{:0>2}d".format(src_file_info["padding"]),
             )
+        return src_file, src_file_info
 
-        self.log.debug("Preparing version data for ShotGrid...")
-        dirname, basename = os.path.split(src_file)
-        filename, ext = os.path.splitext(basename)
-        code = filename.split(".")[0]
-        version_data = {
-            "code": code,
+    def get_version_data(self, app):
+        """Get the data of the Version to create or update."""
+
+        src_file, _ = self.get_src_file(app)
+        filename = os.path.splitext(os.path.basename(src_file))[0]
+        return {
+            "code": filename.split(".")[0],
             "description": self.comment,
             "entity": self.sg_ctx.entity,
             "project": self.sg_ctx.project,
@@ -47,97 +295,183 @@ class SGUploadVersion(Task):
             "sg_task": self.sg_ctx.task,
             "user": self.sg_ctx.user,
         }
-        self.set_status(const.Running, 25)
 
-        # Check for cancelled before encoding.
-        if self.status_request == const.Cancelled:
-            return self.accept(const.Cancelled)
+    def execute(self):
+        # Get necessary data from task context
+        app = self.context["app"]
+        options = self.context["options"]
+        src_file, src_file_info = self.get_src_file(app)
+        filename = os.path.splitext(os.path.basename(src_file))[0]
 
+        self.log.debug("Preparing version data for ShotGrid...")
+        version_data = self.get_version_data(app)
+        code = version_data["code"]
         upload_file = src_file
+        encode_sequence = False
         if src_file_info["is_sequence"]:
             if options.mp4:
                 upload_file = self.context["flow"].get_result(const.Encoding + " MP4")
             else:
-                self.log.debug("Encoding sequence as mp4 for ShotGrid...")
-                upload_file = self.encode_sequence(
-                    src_file,
-                    os.path.join(tempfile.gettempdir(), filename + ".mp4"),
-                )
-        self.set_status(const.Running, 50)
+                encode_sequence = True
 
-        # Check for cancelled before uploading.
+        media_hash = None
+        if self.hash_field:
+            self.log.debug("Hashing media...")
+            if encode_sequence:
+                media_hash = files.hash_media(src_file)
+            else:
+                media_hash = files.hash_file(upload_file)
+        self.set_status(const.Running, 25)
+
+        # Check for cancelled before creating the version.
         if self.status_request == const.Cancelled:
             return self.accept(const.Cancelled)
 
-        # Get an instance of sg for this thread
-        sg = get_shotgun()
+        if self.spool:
+            # The render may delete or replace upload_file before the job runs.
+            if encode_sequence:
+                self.log.debug("Encoding sequence as mp4 for ShotGrid...")
+                with self.encode_sequence(src_file, filename) as encoded_file:
+                    upload_file = self.spool.keep_file(encoded_file)
+            else:
+                upload_file = self.spool.keep_file(upload_file)
+            job_id = self.spool.put(
+                "Version",
+                code,
+                {
+                    "version_data": version_data,
+                    "upload_file": upload_file,
+                    "media_hash": media_hash,
+                    "hash_field": self.hash_field,
+                },
+                files=[upload_file],
+            )
+            self.log.debug("Spooled Version and media upload as job %d.", job_id)
+            self.set_status(const.Running, 100)
+            return dict(version_data, spool_job=job_id)
+
+        # Get a pooled instance of sg for this thread
+        with shotgun.connection() as sg:
+            self.log.debug("Creating or updating Version in ShotGrid...")
+            version = None
+            if self.version_batch:
+                try:
+                    version = self.version_batch.get_version(sg, version_data)
+                except Exception as e:
+                    self.log.warning("Failed to batch create Versions: %s", e)
+            if not version:
+                version = self.create_version(sg, version_data)
+            self.set_status(const.Running, 50)
+
+            if media_hash and version.get(self.hash_field) == media_hash:
+                self.log.debug("Media is unchanged. Skipping upload.")
+                self.uploaded_media = False
+                self.set_status(const.Running, 100)
+                return version
+
+            # Check for cancelled before encoding.
+            if self.status_request == const.Cancelled:
+                return self.accept(const.Cancelled)
+
+            with ExitStack() as stack:
+                if encode_sequence:
+                    self.log.debug("Encoding sequence as mp4 for ShotGrid...")
+                    upload_file = stack.enter_context(
+                        self.encode_sequence(src_file, filename)
+                    )
+                self.set_status(const.Running, 75)
 
-        self.log.debug("Creating or updating Version in ShotGrid...")
-        version = self.create_version(sg, version_data)
-        self.set_status(const.Running, 75)
+                # Check for cancelled before uploading.
+                if self.status_request == const.Cancelled:
+                    return self.accept(const.Cancelled)
 
-        self.log.debug("Uploading media to ShotGrid...")
-        self.upload_media(sg, version, upload_file)
-        self.set_status(const.Running, 100)
+                self.upload_media(sg, version, upload_file)
+            self.uploaded_media = True
+            if media_hash:
+                sg.update("Version", version["id"], {self.hash_field: media_hash})
+                version[self.hash_field] = media_hash
+            self.set_status(const.Running, 100)
         return version
 
     def create_version(self, sg, version_data):
         """Get existing version or create a new one."""
 
-        return_fields = [
-            "id",
-            "code",
-            "description",
-            "entity",
-            "project",
-            "sg_path_to_frames",
-            "sg_status_list",
-            "sg_task",
-            "user",
-        ]
-
-        version = sg.find_one(
-            "Version",
-            filters=[
-                ["project", "is", version_data["project"]],
-                ["code", "is", version_data["code"]],
-                ["sg_task", "is", version_data["sg_task"]],
-                ["entity", "is", version_data["entity"]],
-            ],
-            fields=return_fields,
+        return find_or_create_version(
+            sg,
+            version_data,
+            get_version_return_fields(self.hash_field),
         )
 
-        if not version:
-            version = sg.create(
-                "Version",
-                version_data,
-                return_fields=return_fields,
-            )
-        else:
-            update_data = {
-                "description": version_data["description"],
-                "sg_status_list": version_data["sg_status_list"],
-                "sg_path_to_frames": version_data["sg_path_to_frames"],
-            }
-            version.update(update_data)
-            sg.update("Version", version["id"], update_data)
+    def upload_media(self, sg, version, file):
+        """Upload file to sg_uploaded_media field of a Version entity.
 
-        return version
+        Uploads are limited by the runner and machine-wide bandwidth buckets, and
+        progress is reported from 75 to 100 as bytes are sent. When the task has an
+        upload_executor, only the upload itself runs in it, so the number of
+        concurrent uploads is limited without holding back the rest of the task.
+        """
 
-    def upload_media(self, sg, version, file):
-        """Upload file to sg_uploaded_media field of a Version entity."""
+        if self.upload_executor:
+            return self.upload_executor.submit(
+                self.send_media, sg, version, file
+            ).result()
+        return self.send_media(sg, version, file)
 
-        media = sg.upload(
-            "Version",
-            version["id"],
-            path=file,
-            field_name="sg_uploaded_movie",
+    def send_media(self, sg, version, file):
+
+        size = os.path.getsize(file)
+        progress = {"sent": 0, "percent": 75}
+
+        def on_read(nbytes):
+            progress["sent"] += nbytes
+            percent = int(fit(progress["sent"], 0, max(size, 1), 75, 100))
+            if percent > progress["percent"]:
+                progress["percent"] = percent
+                self.set_status(const.Running, percent)
+
+        self.log.debug("Uploading %d bytes of media to ShotGrid...", size)
+        start = time.time()
+        media = upload_version_media(
+            sg,
+            version,
+            file,
+            [self.bandwidth, shotgun.machine_bandwidth],
+            on_read,
+        )
+        self.log.debug(
+            "Uploaded %d bytes in %0.2fs.",
+            progress["sent"] or size,
+            time.time() - start,
         )
         return media
 
-    def encode_sequence(self, in_file, out_file):
-        """Encode an image sequence as an mp4."""
+    @contextmanager
+    def encode_sequence(self, in_file, name):
+        """Context yielding an mp4 encoded from an image sequence to upload.
+
+        Uses the ArtifactCache in the flow context when available. Otherwise encodes
+        to a new temporary directory, so flows never write to the same file, and
+        removes it when the context exits.
+        """
+
+        cache = self.context.get("cache")
+        if cache:
+            with cache.get_or_create(
+                in_file,
+                {"encode": "sequence_mp4", "framerate": 24},
+                ".mp4",
+                lambda out_file: self.encode_sequence_to(in_file, out_file),
+            ) as out_file:
+                yield out_file
+            return
+
+        tempdir = tempfile.mkdtemp(prefix="aeq_")
+        try:
+            yield self.encode_sequence_to(in_file, os.path.join(tempdir, name + ".mp4"))
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
 
+    def encode_sequence_to(self, in_file, out_file):
         proc = ffmpeg_lib.encode_sequence(in_file, out_file, framerate=24)
         success = ffmpeg_lib.watch(proc)
         if not success:
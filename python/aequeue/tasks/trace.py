@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+__all__ = [
+    "Tracer",
+]
+
+
+class Tracer(object):
+    """Records the spans of a Runner, its Flows and Tasks as Chrome trace events.
+
+    Each Flow gets a track of its own, on which its Tasks and their sub-spans are
+    nested by time. The trace can be opened in chrome://tracing or ui.perfetto.dev.
+
+    Arguments:
+        name (str): Name of the process in the trace, usually the Runner's name.
+    """
+
+    pid = 1
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.origin = time.monotonic()
+        self.started = time.time()
+        self.tracks = {}
+        self.events = [
+            {
+                "ph": "M",
+                "name": "process_name",
+                "pid": self.pid,
+                "args": {"name": name},
+            }
+        ]
+
+    def now(self):
+        return time.monotonic()
+
+    def timestamp(self, value):
+        """Convert a time.monotonic value to microseconds since the trace started."""
+
+        return round((value - self.origin) * 1000000)
+
+    def track(self, name):
+        """Get the id of the track with the given name, adding it if necessary."""
+
+        with self.lock:
+            tid = self.tracks.get(name)
+            if tid is None:
+                tid = self.tracks[name] = len(self.tracks) + 1
+                self.events.append(
+                    {
+                        "ph": "M",
+                        "name": "thread_name",
+                        "pid": self.pid,
+                        "tid": tid,
+                        "args": {"name": name},
+                    }
+                )
+                self.events.append(
+                    {
+                        "ph": "M",
+                        "name": "thread_sort_index",
+                        "pid": self.pid,
+                        "tid": tid,
+                        "args": {"sort_index": tid},
+                    }
+                )
+        return tid
+
+    def add_span(self, name, track, start, end, category="", args=None):
+        """Add a span between two time.monotonic values."""
+
+        event = {
+            "ph": "X",
+            "name": name,
+            "cat": category,
+            "pid": self.pid,
+            "tid": self.track(track),
+            "ts": self.timestamp(start),
+            "dur": max(self.timestamp(end) - self.timestamp(start), 0),
+        }
+        if args:
+            event["args"] = args
+        with self.lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name, track, category="", args=None):
+        """Context recording a span around its block.
+
+        Yields a dict of args that can be updated within the block.
+        """
+
+        args = dict(args or {})
+        start = self.now()
+        try:
+            yield args
+        finally:
+            self.add_span(name, track, start, self.now(), category, args)
+
+    def instant(self, name, track, category="", args=None):
+        event = {
+            "ph": "i",
+            "s": "t",
+            "name": name,
+            "cat": category,
+            "pid": self.pid,
+            "tid": self.track(track),
+            "ts": self.timestamp(self.now()),
+        }
+        if args:
+            event["args"] = args
+        with self.lock:
+            self.events.append(event)
+
+    def to_dict(self):
+        with self.lock:
+            events = list(self.events)
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"name": self.name, "started": self.started},
+        }
+
+    def write(self, path):
+        """Write the trace as Chrome trace event JSON."""
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f, default=str)
+        os.replace(tmp, path)
+        return path
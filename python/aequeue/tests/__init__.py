@@ -100,3 +100,36 @@ def show_ae_dragndrop():
     app = TestApplication()
     app.show()
     return app
+
+
+@application('sg_pool_app')
+def show_sg_pool_app():
+    '''Test pooled SG connections against a local stand-in SG server.'''
+
+    from .sg_pool_app import TestApplication
+
+    app = TestApplication(nitems=12)
+    app.show()
+    return app
+
+
+@application('sg_upload_app')
+def show_sg_upload_app():
+    '''Test throttled concurrent media uploads against a local stand-in SG server.'''
+
+    from .sg_upload_app import TestApplication
+
+    app = TestApplication(nitems=6)
+    app.show()
+    return app
+
+
+@application('dispatch_app')
+def show_dispatch_app():
+    '''Stress test calls to the MainThread from many worker threads.'''
+
+    from .dispatch_app import TestApplication
+
+    app = TestApplication(nitems=8, calls=10000)
+    app.show()
+    return app
@@ -0,0 +1,173 @@
+import threading
+import time
+import tracemalloc
+
+from ..vendor.qtpy import QtCore, QtWidgets
+
+from .. import const
+from ..widgets import Window
+from ..tasks.core import (
+    Runner,
+    Flow,
+    call_in_main,
+    dispatcher,
+    percentile,
+    post_in_main,
+)
+from ..tasks.generic import FunctionTask
+
+
+class CallRecorder(object):
+    '''Records the round trip time of calls in chunks of chunk_size calls.'''
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.times = []
+        self.chunks = []
+
+    def add(self, seconds):
+        with self.lock:
+            self.times.append(seconds)
+            if len(self.times) < self.chunk_size:
+                return
+            times, self.times = self.times, []
+        self.chunks.append({
+            'p95': percentile(times, 95),
+            'memory': tracemalloc.get_traced_memory()[0],
+        })
+
+
+def main_thread_work(value):
+    return value + 1
+
+
+def issue_calls(task, calls, batch_size, recorder):
+    '''Alternate blocking calls with batches of posted calls.'''
+
+    for i in range(0, calls, batch_size * 2):
+        for j in range(batch_size):
+            start = time.monotonic()
+            assert call_in_main(main_thread_work, j) == j + 1
+            recorder.add(time.monotonic() - start)
+
+        start = time.monotonic()
+        with dispatcher.batch():
+            futures = [post_in_main(main_thread_work, j) for j in range(batch_size)]
+        for j, future in enumerate(futures):
+            assert future.result() == j + 1
+            recorder.add((time.monotonic() - start) / batch_size)
+
+        task.set_status(const.Running, (i + batch_size * 2) * 100.0 / calls)
+
+
+class TestApplication(QtCore.QObject):
+
+    def __init__(self, nitems, calls=10000, batch_size=25, parent=None):
+        super(TestApplication, self).__init__(parent)
+
+        self.items = ['Worker {:0>2d}'.format(i) for i in range(nitems)]
+        self.calls = calls
+        self.batch_size = batch_size
+        self.runner = None
+        self.recorder = None
+        self.started = None
+
+        # Create UI
+        self.ui = Window()
+        self.ui.queue_button.clicked.connect(self.load_queue)
+        self.ui.reset_button.clicked.connect(self.reset_queue)
+        self.ui.render_button.clicked.connect(self.render)
+        self.ui.closeEvent = self.closeEvent
+
+    def closeEvent(self, event):
+        if self.runner and self.runner.status == const.Running:
+            self.ui.show_error("Can't close while rendering.")
+            event.ignore()
+        else:
+            return QtWidgets.QWidget.closeEvent(self.ui, event)
+
+    def show(self):
+        self.ui.show()
+
+    def reset_queue(self):
+        self.ui.queue.clear()
+        self.set_render_status(const.Waiting)
+
+    def load_queue(self):
+        self.ui.queue.clear()
+        for item in self.items:
+            self.ui.queue.add_item(item, const.Queued, 0)
+        self.set_render_status(const.Waiting)
+
+    def render(self):
+        if not self.ui.queue.count():
+            self.ui.show_error('Load items into the queue first.')
+            return
+
+        tracemalloc.start()
+        self.recorder = CallRecorder()
+        self.started = time.monotonic()
+        with Runner('Main Thread Dispatch') as runner:
+            for item in self.items:
+                with Flow(item):
+                    FunctionTask(
+                        issue_calls,
+                        func_kwargs={
+                            'calls': self.calls // len(self.items),
+                            'batch_size': self.batch_size,
+                            'recorder': self.recorder,
+                        },
+                        step=const.Running,
+                    )
+
+        self.runner = runner
+        self.runner.step_changed.connect(self.step_changed)
+        self.runner.status_changed.connect(self.set_render_status)
+        self.runner.start()
+
+    def step_changed(self, event):
+        self.ui.queue.update_item(
+            label=event['flow'],
+            status=event['step'],
+            percent=event['progress'],
+        )
+
+    def set_render_status(self, status):
+        chunks = self.recorder.chunks if self.recorder else []
+        if status in const.DoneList and len(chunks) > 2:
+            tracemalloc.stop()
+            stats = dispatcher.stats()
+            # Skip the first chunk, it includes startup allocations.
+            first, last = chunks[1], chunks[-1]
+            memory_growth = last['memory'] - first['memory']
+            latency_growth = last['p95'] - first['p95']
+            message = (
+                '%d calls in %d events over %0.1fs. Queue latency p50 %0.2fms, '
+                'p95 %0.2fms, max %0.2fms. Memory grew %0.1fKB.'
+            ) % (
+                stats['calls'],
+                stats['batches'],
+                time.monotonic() - self.started,
+                stats['p50'] * 1000,
+                stats['p95'] * 1000,
+                stats['max'] * 1000,
+                memory_growth / 1024,
+            )
+            print(message)
+            for i, chunk in enumerate(chunks):
+                print('Chunk %02d: p95 %0.2fms, memory %0.1fKB' % (
+                    i,
+                    chunk['p95'] * 1000,
+                    chunk['memory'] / 1024,
+                ))
+            if (
+                status != const.Success
+                or stats['pending']
+                or memory_growth > 256 * 1024
+                or latency_growth > max(first['p95'] * 2, 0.01)
+            ):
+                self.ui.show_error(message)
+            else:
+                self.ui.show_info(message)
+        self.ui.set_status(status)
@@ -0,0 +1,106 @@
+import threading
+
+from ..vendor.qtpy import QtCore, QtWidgets
+
+from .. import const
+from ..shotgun import ConnectionPool
+from ..widgets import Window
+from ..tasks.core import Runner, Flow
+from ..tasks.generic import FunctionTask
+from .sg_server import StandInShotgunServer
+
+
+def upload_version(task, pool, threads):
+    threads.add(threading.get_ident())
+    with pool.connection() as sg:
+        version = sg.find_one(
+            'Version',
+            filters=[['code', 'is', task.flow.name]],
+            fields=['code'],
+        )
+        task.set_status(const.Running, 50)
+        if not version:
+            version = sg.create('Version', {'code': task.flow.name})
+        sg.update('Version', version['id'], {'description': 'Pooled!'})
+    return version
+
+
+class TestApplication(QtCore.QObject):
+
+    def __init__(self, nitems, parent=None):
+        super(TestApplication, self).__init__(parent)
+
+        self.items = ['Comp {:0>2d}'.format(i) for i in range(nitems)]
+        self.runner = None
+        self.threads = set()
+        self.server = StandInShotgunServer(latency=0.05).start()
+        self.pool = ConnectionPool(factory=self.server.connect)
+
+        # Create UI
+        self.ui = Window()
+        self.ui.queue_button.clicked.connect(self.load_queue)
+        self.ui.reset_button.clicked.connect(self.reset_queue)
+        self.ui.render_button.clicked.connect(self.render)
+        self.ui.closeEvent = self.closeEvent
+
+    def closeEvent(self, event):
+        if self.runner and self.runner.status == const.Running:
+            self.ui.show_error("Can't close while rendering.")
+            event.ignore()
+        else:
+            self.server.stop()
+            return QtWidgets.QWidget.closeEvent(self.ui, event)
+
+    def show(self):
+        self.ui.show()
+
+    def reset_queue(self):
+        self.ui.queue.clear()
+        self.set_render_status(const.Waiting)
+
+    def load_queue(self):
+        self.ui.queue.clear()
+        for item in self.items:
+            self.ui.queue.add_item(item, const.Queued, 0)
+        self.set_render_status(const.Waiting)
+
+    def render(self):
+        if not self.ui.queue.count():
+            self.ui.show_error('Load items into the queue first.')
+            return
+
+        with Runner('SG Connection Pool') as runner:
+            for item in self.items:
+                with Flow(item):
+                    for step in [const.Uploading, const.Publishing]:
+                        FunctionTask(
+                            upload_version,
+                            func_kwargs={'pool': self.pool, 'threads': self.threads},
+                            step=step,
+                        )
+
+        self.runner = runner
+        self.runner.step_changed.connect(self.step_changed)
+        self.runner.status_changed.connect(self.set_render_status)
+        self.runner.start()
+
+    def step_changed(self, event):
+        self.ui.queue.update_item(
+            label=event['flow'],
+            status=event['step'],
+            percent=event['progress'],
+        )
+
+    def set_render_status(self, status):
+        if status in const.DoneList:
+            message = '%d handshakes for %d worker threads.' % (
+                self.server.handshakes,
+                len(self.threads),
+            )
+            print(message)
+            print('Calls: %s' % self.server.calls)
+            if self.server.handshakes > len(self.threads):
+                self.ui.show_error(message)
+            else:
+                self.ui.show_info(message)
+        self.ui.set_status(status)
@@ -0,0 +1,211 @@
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInShotgunHandler(BaseHTTPRequestHandler):
+    """Handles the subset of the ShotGrid json api used by AEQueue."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_text(self, text, status=200, headers=None):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        length = int(self.headers.get("Content-Length", 0))
+        start = time.monotonic()
+        remaining = length
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 65536))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+        self.server.count_call("put")
+        upload_id = self.server.record_upload(length - remaining, start)
+        self.send_text("", headers={"Etag": '"%s"' % upload_id})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if self.path.startswith("/upload/"):
+            self.rfile.read(length)
+            self.server.count_call(self.path)
+            return self.send_text(self.server.upload_form(self.path))
+
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        method = payload.get("method_name")
+        params = payload.get("params") or [{}, {}]
+        args = params[-1] if len(params) > 1 else {}
+        self.server.count_call(method)
+        try:
+            results = self.server.call(method, args)
+        except Exception as e:
+            return self.send_json({"exception": True, "message": str(e)})
+        self.send_json({"results": results})
+
+
+class StandInShotgunServer(ThreadingHTTPServer):
+    """A local stand-in for a ShotGrid site.
+
+    Stores entities in memory and counts the connections made to it, so tests can
+    verify how many handshakes a real site would have seen. Media uploads are sent to
+    the server as if it were cloud storage, and the bytes and duration of each upload
+    are recorded in uploads.
+
+    Arguments:
+        latency (float): Seconds to delay each api call.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0):
+        super(StandInShotgunServer, self).__init__(
+            ("127.0.0.1", 0),
+            StandInShotgunHandler,
+        )
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.entities = {}
+        self.handshakes = 0
+        self.calls = {}
+        self.uploads = []
+        self.thread = None
+
+    @property
+    def url(self):
+        return "http://%s:%d" % self.server_address
+
+    def get_request(self):
+        request = super(StandInShotgunServer, self).get_request()
+        with self.lock:
+            self.handshakes += 1
+        return request
+
+    def count_call(self, method):
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def connect(self):
+        """Create a shotgun_api3 connection to this server."""
+
+        import shotgun_api3
+
+        return shotgun_api3.Shotgun(self.url, "stand_in", "stand_in_key")
+
+    def call(self, method, args):
+        if self.latency:
+            threading.Event().wait(self.latency)
+
+        if method == "info":
+            return {
+                "version": [9, 0, 0],
+                "s3_uploads_enabled": True,
+                "s3_direct_uploads_enabled": True,
+                "s3_enabled_upload_types": {"Version": ["sg_uploaded_movie"]},
+            }
+        if method == "read":
+            return self.read(args)
+        if method == "create":
+            return self.create(args)
+        if method == "update":
+            return self.update(args)
+        if method == "batch":
+            results = []
+            for request in args:
+                request_type = request.pop("request_type")
+                results.append(getattr(self, request_type)(request))
+            return results
+        raise RuntimeError("Unsupported method: %s" % method)
+
+    def record_upload(self, nbytes, start):
+        with self.lock:
+            self.uploads.append(
+                {"bytes": nbytes, "start": start, "end": time.monotonic()}
+            )
+            return len(self.uploads)
+
+    def upload_form(self, path):
+        if path == "/upload/api_get_upload_link_info":
+            upload_id = next(self.ids)
+            return "\n".join(
+                [
+                    "1",
+                    "%s/storage/%d" % (self.url, upload_id),
+                    str(int(time.time())),
+                    "Attachment",
+                    str(upload_id),
+                ]
+            )
+        if path == "/upload/api_link_file":
+            return "1:%d\n" % next(self.ids)
+        return "0"
+
+    def fields(self, args):
+        return {field["field_name"]: field["value"] for field in args["fields"]}
+
+    def matches(self, entity, filters):
+        for condition in filters.get("conditions", []):
+            value = entity.get(condition["path"])
+            if isinstance(value, dict):
+                value = value.get("id")
+            values = [
+                v.get("id") if isinstance(v, dict) else v for v in condition["values"]
+            ]
+            if condition["relation"] == "is" and value != values[0]:
+                return False
+            if condition["relation"] == "in" and value not in values:
+                return False
+        return True
+
+    def read(self, args):
+        with self.lock:
+            entities = [
+                dict(entity)
+                for entity in self.entities.get(args["type"], {}).values()
+                if self.matches(entity, args.get("filters", {}))
+            ]
+        return {
+            "entities": entities,
+            "paging_info": {"entity_count": len(entities), "has_next_page": False},
+        }
+
+    def create(self, args):
+        entity = dict(self.fields(args), type=args["type"], id=next(self.ids))
+        with self.lock:
+            self.entities.setdefault(args["type"], {})[entity["id"]] = entity
+        return dict(entity)
+
+    def update(self, args):
+        data = self.fields(args)
+        with self.lock:
+            self.entities[args["type"]][args["id"]].update(data)
+        return dict(data, type=args["type"], id=args["id"])
@@ -0,0 +1,130 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from ..vendor.qtpy import QtCore, QtWidgets
+
+from .. import const
+from ..shotgun import ConnectionPool, TokenBucket
+from ..widgets import Window
+from ..tasks.core import Runner, Flow
+from ..tasks.sgupload import SGUploadVersion
+from .sg_server import StandInShotgunServer
+
+
+class UploadMedia(SGUploadVersion):
+    '''Creates a Version and uploads media using SGUploadVersion.upload_media.'''
+
+    def __init__(self, src_file, sg_pool, *args, **kwargs):
+        self.sg_pool = sg_pool
+        super(UploadMedia, self).__init__(src_file, None, 'Throttled!', *args, **kwargs)
+
+    def execute(self):
+        with self.sg_pool.connection() as sg:
+            version = sg.create('Version', {'code': self.flow.name})
+            self.set_status(const.Running, 75)
+            self.upload_media(sg, version, self.src_file)
+        return version
+
+
+class TestApplication(QtCore.QObject):
+
+    def __init__(self, nitems, threads=2, size_mb=4, mbps=64, parent=None):
+        super(TestApplication, self).__init__(parent)
+
+        self.items = ['Comp {:0>2d}'.format(i) for i in range(nitems)]
+        self.runner = None
+        self.threads = threads
+        self.rate = mbps * 125000
+        self.server = StandInShotgunServer().start()
+        self.sg_pool = ConnectionPool(factory=self.server.connect)
+
+        # Create media to upload
+        self.media = os.path.join(tempfile.gettempdir(), 'aeq_upload_test.bin')
+        with open(self.media, 'wb') as f:
+            f.write(os.urandom(size_mb * 1024 * 1024))
+
+        # Create UI
+        self.ui = Window()
+        self.ui.queue_button.clicked.connect(self.load_queue)
+        self.ui.reset_button.clicked.connect(self.reset_queue)
+        self.ui.render_button.clicked.connect(self.render)
+        self.ui.closeEvent = self.closeEvent
+
+    def closeEvent(self, event):
+        if self.runner and self.runner.status == const.Running:
+            self.ui.show_error("Can't close while rendering.")
+            event.ignore()
+        else:
+            self.server.stop()
+            if os.path.exists(self.media):
+                os.remove(self.media)
+            return QtWidgets.QWidget.closeEvent(self.ui, event)
+
+    def show(self):
+        self.ui.show()
+
+    def reset_queue(self):
+        self.ui.queue.clear()
+        self.set_render_status(const.Waiting)
+
+    def load_queue(self):
+        self.ui.queue.clear()
+        for item in self.items:
+            self.ui.queue.add_item(item, const.Queued, 0)
+        self.set_render_status(const.Waiting)
+
+    def render(self):
+        if not self.ui.queue.count():
+            self.ui.show_error('Load items into the queue first.')
+            return
+
+        self.server.uploads[:] = []
+        upload_executor = ThreadPoolExecutor(self.threads)
+        bandwidth = TokenBucket(self.rate)
+
+        with Runner('SG Upload Pipeline') as runner:
+            for item in self.items:
+                with Flow(item):
+                    UploadMedia(
+                        self.media,
+                        self.sg_pool,
+                        bandwidth=bandwidth,
+                        upload_executor=upload_executor,
+                    )
+
+        self.runner = runner
+        self.runner.step_changed.connect(self.step_changed)
+        self.runner.status_changed.connect(self.set_render_status)
+        self.runner.start()
+
+    def step_changed(self, event):
+        self.ui.queue.update_item(
+            label=event['flow'],
+            status=event['step'],
+            percent=event['progress'],
+        )
+
+    def set_render_status(self, status):
+        uploads = self.server.uploads
+        if status in const.DoneList and uploads:
+            total = sum(upload['bytes'] for upload in uploads)
+            start = min(upload['start'] for upload in uploads)
+            end = max(upload['end'] for upload in uploads)
+            concurrent = max(
+                len([u for u in uploads if u['start'] <= upload['start'] < u['end']])
+                for upload in uploads
+            )
+            rate = total / max(end - start, 0.001)
+            message = '%d uploads at %0.1f Mbps (limit %0.1f) with %d concurrent.' % (
+                len(uploads),
+                rate / 125000,
+                self.rate / 125000,
+                concurrent,
+            )
+            print(message)
+            if rate > self.rate * 1.1 or concurrent > self.threads:
+                self.ui.show_error(message)
+            else:
+                self.ui.show_info(message)
+        self.ui.set_status(status)
@@ -2,8 +2,9 @@ from ..vendor.qtpy import QtWidgets, QtCore
 
 from .. import const, resources
 from ..options import RenderOptions
+from ..report import LiveReport
 from ..widgets import Window
-from ..tasks.core import Runner, Flow, generate_report, generate_html_report
+from ..tasks.core import Runner, Flow, generate_report
 from ..tasks.generic import LongRunningTask, ErrorTask
 
 
@@ -77,6 +78,10 @@ class TestApplication(QtCore.QObject):
         self.runner = runner
         self.runner.step_changed.connect(self.step_changed)
         self.runner.status_changed.connect(self.set_render_status)
+        self.ui.report.clear()
+        self.live_report = LiveReport(self.ui.report, parent=self)
+        self.runner.add_listener(self.live_report.append)
+        self.live_report.start()
         self.runner.start()
 
     def step_changed(self, event):
@@ -88,5 +93,5 @@ class TestApplication(QtCore.QObject):
 
     def set_render_status(self, status):
         if status in const.DoneList:
-            self.ui.report.setText(generate_html_report(self.runner))
+            self.live_report.stop()
         self.ui.set_status(status)
@@ -13,6 +13,21 @@ def lerp(a, b, t):
     return (1 - t) * a + t * b
 
 
+def format_eta(seconds):
+    """Format estimated seconds remaining, like 1h 05m, 3m 20s or 45s."""
+
+    if not seconds or seconds < 1:
+        return ""
+
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return "%dh %02dm" % (hours, minutes)
+    if minutes:
+        return "%dm %02ds" % (minutes, seconds)
+    return "%ds" % seconds
+
+
 class ValueAnimation(QtCore.QVariantAnimation):
     value_changed = QtCore.Signal(object)
 
@@ -646,10 +661,15 @@ class Status(QtWidgets.QWidget):
         self.set(status, percent)
 
     def set(self, status, percent):
-        self.bar.setProperty("status", status.lower().split()[0])
-        self.bar.setFixedWidth(percent)
-        self.label.setText(status.title())
-        self.setStyleSheet(self.css)
+        # Styling is expensive, so only restyle when the status changes.
+        bar_status = status.lower().split()[0]
+        if bar_status != self.bar.property("status"):
+            self.bar.setProperty("status", bar_status)
+            self.label.setText(status.title())
+            self.setStyleSheet(self.css)
+        elif self.label.text() != status.title():
+            self.label.setText(status.title())
+        self.bar.setFixedWidth(int(percent))
 
 
 class Menu(QtWidgets.QMenu):
@@ -805,6 +825,11 @@ class RenderQueueItemWidget(QtWidgets.QWidget):
             $h1;
             color: $light_highlight;
         }
+        QLabel#eta {
+            $p;
+            color: $light;
+            padding-right: 8px;
+        }
     """
     )
 
@@ -812,6 +837,9 @@ class RenderQueueItemWidget(QtWidgets.QWidget):
         super(RenderQueueItemWidget, self).__init__(parent)
 
         self.label = QtWidgets.QLabel(label)
+        self.eta = QtWidgets.QLabel("")
+        self.eta.setObjectName("eta")
+        self.eta.setToolTip("Estimated time remaining.")
         self.status = Status(status, percent)
         self.menu = KebabMenu()
         self.menu.hide()
@@ -823,6 +851,7 @@ class RenderQueueItemWidget(QtWidgets.QWidget):
 
         self.layout.addWidget(self.label)
         self.layout.addStretch()
+        self.layout.addWidget(self.eta)
         self.layout.addWidget(self.status)
         self.layout.addWidget(self.menu)
 
@@ -831,6 +860,11 @@ class RenderQueueItemWidget(QtWidgets.QWidget):
         self.setAttribute(QtCore.Qt.WA_StyledBackground)
         self.setStyleSheet(self.css)
 
+    def set_eta(self, seconds):
+        text = format_eta(seconds)
+        if text != self.eta.text():
+            self.eta.setText(text)
+
     def set_margin_for_scrollbar_state(self, state):
         if state == "visible":
             self.layout.setContentsMargins(14, 0, 4, 0)
@@ -986,9 +1020,10 @@ class RenderQueue(QtWidgets.QListWidget):
         self.setItemWidget(item, item.widget)
         return item
 
-    def update_item(self, label, status, percent):
+    def update_item(self, label, status, percent, eta=None):
         item = self.get_item(label)
         item.widget.status.set(status, percent)
+        item.widget.set_eta(eta)
 
     def remove_item(self, label):
         item = self.items.get(label)
@@ -1006,10 +1041,14 @@ class RenderQueue(QtWidgets.QListWidget):
         item.widget.menu.hide()
 
 
-class LogReport(QtWidgets.QTextEdit):
+class LogReport(QtWidgets.QPlainTextEdit):
+    """Append only log view keeping at most max_blocks lines."""
+
+    save_requested = QtCore.Signal()
+    max_blocks = 5000
     css = Theme.StyleSheet(
         """
-        QTextEdit {
+        QPlainTextEdit {
             $p;
             $border;
             background: $dark;
@@ -1074,8 +1113,26 @@ class LogReport(QtWidgets.QTextEdit):
         self.setStyleSheet(self.css)
         self.verticalScrollBar().setStyle(QtWidgets.QCommonStyle())
         self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
-        self.setLineWrapMode(QtWidgets.QTextEdit.NoWrap)
+        self.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
         self.setTextInteractionFlags(QtCore.Qt.TextBrowserInteraction)
+        self.setMaximumBlockCount(self.max_blocks)
+
+    def append_html(self, html):
+        """Append html to the end of the log, following it if it was scrolled to
+        the end.
+        """
+
+        scrollbar = self.verticalScrollBar()
+        at_end = scrollbar.value() == scrollbar.maximum()
+        self.appendHtml(html)
+        if at_end:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def contextMenuEvent(self, event):
+        menu = self.createStandardContextMenu()
+        menu.addSeparator()
+        menu.addAction("Save Report...", self.save_requested.emit)
+        menu.exec_(event.globalPos())
 
 
 class Label(QtWidgets.QLabel):
@@ -1226,6 +1283,18 @@ class Options(QtWidgets.QWidget):
         self.async_layout.addWidget(self.async_render)
         self.async_layout.addWidget(self.async_note)
 
+        skip_tip = (
+            "Skip rendering comps that are unchanged since their last render.\n"
+            "Saves the project before rendering. Any change to the project\n"
+            "renders all comps again."
+        )
+        self.skip_unchanged = CheckBox()
+        self.skip_unchanged.setToolTip(skip_tip)
+        self.skip_layout = QtWidgets.QHBoxLayout()
+        self.skip_layout.setSpacing(12)
+        self.skip_layout.setStretch(1, 1)
+        self.skip_layout.addWidget(self.skip_unchanged)
+
         self.layout = QtWidgets.QFormLayout()
         self.layout.setContentsMargins(20, 4, 20, 4)
         self.layout.setVerticalSpacing(12)
@@ -1238,6 +1307,7 @@ class Options(QtWidgets.QWidget):
         self.layout.addRow(Label("Upload to ShotGrid"), self.sg_layout)
         # Comment out next line to disable Async Rendering option.
         self.layout.addRow(Label("Async Render"), self.async_layout)
+        self.layout.addRow(Label("Skip Unchanged"), self.skip_layout)
         # Comment out next line to disable BG Rendering.
         # self.layout.addRow(Label("BG Render"), self.bg_layout)
         self.setLayout(self.layout)
@@ -1262,6 +1332,7 @@ class Options(QtWidgets.QWidget):
             "bg": self.bg.isChecked(),
             "bg_threads": self.bg_threads.value(),
             "async_render": self.async_render.isChecked(),
+            "skip_unchanged": self.skip_unchanged.isChecked(),
         }
 
     def set(self, **options):
@@ -1553,10 +1624,18 @@ class Window(QtWidgets.QDialog):
         self.reset_button.setVisible(False)
         self.queue_button = Tool(resources.get_path("arrow_download.png"))
         self.queue_button.setToolTip("Add selected comps to queue...")
+        self.resume_button = Tool(resources.get_path("play.png"))
+        self.resume_button.setToolTip("Resume interrupted render...")
+        self.resume_button.setVisible(False)
+        self.retry_button = Tool(resources.get_path("arrow_clockwise.png"))
+        self.retry_button.setToolTip("Retry unfinished comps...")
+        self.retry_button.setVisible(False)
         self.cancel_button = Tool(resources.get_path("pause.png"))
         self.cancel_button.setToolTip("Cancel!")
         self.cancel_button.setVisible(False)
         self.queue_header = SectionHeader("QUEUE")
+        self.queue_header.right.addWidget(self.resume_button)
+        self.queue_header.right.addWidget(self.retry_button)
         self.queue_header.right.addWidget(self.queue_button)
         self.queue_header.right.addWidget(self.reset_button)
         self.queue_header.right.addWidget(self.cancel_button)
@@ -1590,11 +1669,16 @@ class Window(QtWidgets.QDialog):
             bg=False,
             bg_threads=4,
             async_render=False,
+            skip_unchanged=False,
         )
+        self.eta_label = QtWidgets.QLabel("")
+        self.eta_label.setToolTip("Estimated time remaining.")
+        self.eta_label.setVisible(False)
         self.options_header = SectionHeader("OPTIONS")
         self.options_header.right.addWidget(self.status_indicator)
         self.options_header.right.addWidget(self.send_button)
         self.options_header.right.addWidget(self.report_button)
+        self.options_header.right.addWidget(self.eta_label)
 
         # Footer
         self.render_button = BigButton("RENDER")
@@ -1635,14 +1719,24 @@ class Window(QtWidgets.QDialog):
         self.setWindowFlags(self.windowFlags() | QtCore.Qt.WindowStaysOnTopHint)
         self.resize(360, 540)
 
+    def set_eta(self, seconds):
+        """Show the estimated seconds remaining of the whole queue."""
+
+        text = format_eta(seconds)
+        self.eta_label.setText(text)
+        self.eta_label.setVisible(bool(text))
+
     def set_status(self, status):
         self.status_indicator.set_status(status)
         self.options_header.set_status(status)
+        if status != const.Running:
+            self.set_eta(None)
         if status == const.Waiting:
             self.options_header.set_label("OPTIONS")
             self.options.setEnabled(True)
             self.render_button.setEnabled(True)
             self.queue_button.setVisible(True)
+            self.retry_button.setVisible(False)
             self.reset_button.setVisible(False)
             self.cancel_button.setVisible(False)
             self.status_indicator.setVisible(False)
@@ -1655,6 +1749,8 @@ class Window(QtWidgets.QDialog):
             self.options.setEnabled(False)
             self.render_button.setEnabled(False)
             self.queue_button.setVisible(False)
+            self.resume_button.setVisible(False)
+            self.retry_button.setVisible(False)
             self.reset_button.setVisible(False)
             self.cancel_button.setVisible(True)
             self.status_indicator.setVisible(True)
@@ -1665,6 +1761,8 @@ class Window(QtWidgets.QDialog):
             self.options_header.transition_label("CANCELLED")
             self.options.setEnabled(False)
             self.render_button.setEnabled(False)
+            self.resume_button.setVisible(False)
+            self.retry_button.setVisible(False)
             self.reset_button.setVisible(True)
             self.cancel_button.setVisible(False)
             self.status_indicator.setVisible(True)
@@ -1676,6 +1774,8 @@ class Window(QtWidgets.QDialog):
             self.options_header.transition_label("SUCCESS")
             self.options.setEnabled(False)
             self.render_button.setEnabled(False)
+            self.resume_button.setVisible(False)
+            self.retry_button.setVisible(False)
             self.reset_button.setVisible(True)
             self.cancel_button.setVisible(False)
             self.status_indicator.setVisible(True)
@@ -1687,6 +1787,8 @@ class Window(QtWidgets.QDialog):
             self.options_header.transition_label("FAILED")
             self.options.setEnabled(False)
             self.render_button.setEnabled(False)
+            self.resume_button.setVisible(False)
+            self.retry_button.setVisible(True)
             self.reset_button.setVisible(True)
             self.cancel_button.setVisible(False)
             self.status_indicator.setVisible(True)